@@ -6,18 +6,25 @@ Automatically logs in, retrieves OTP from Gmail, applies filters, and displays p
 
 import os
 import re
+import atexit
 import base64
 import time
 import sys
 import json
+import hashlib
+import threading
+import traceback
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 from pathlib import Path
-from datetime import datetime, timedelta
+from urllib.parse import urljoin
+from datetime import datetime, timedelta, timezone
 from html.parser import HTMLParser
 from html import unescape
 
 # Check and import required packages with helpful error messages
 try:
-    from playwright.sync_api import sync_playwright, TimeoutError as PWTimeoutError
+    from playwright.sync_api import sync_playwright, Error as PWError, TimeoutError as PWTimeoutError
 except ImportError as e:
     print("\n" + "="*70)
     print("[ERROR] Playwright is not installed!")
@@ -96,6 +103,46 @@ if not AMAZON_PASSWORD:
 GMAIL_SCOPES = ['https://www.googleapis.com/auth/gmail.readonly']
 GMAIL_CREDENTIALS_FILE = Path('data/client_secret_446842116198-nke8rjis6iaeuagepsp9p5gvbsu2cte4.apps.googleusercontent.com.json')
 GMAIL_TOKEN_FILE = Path('token.json')
+GMAIL_TOKEN_REFRESH_MARGIN = timedelta(minutes=5)  # Refresh tokens this close to expiry (they live 60 min)
+GMAIL_STATE_FILE = Path('gmail_state.json')  # Last historyId seen after a successful OTP read
+
+# Partial-response masks for messages().get() - only what OTP extraction reads
+GMAIL_METADATA_FIELDS = 'id,historyId,internalDate,snippet,payload/headers'
+GMAIL_BODY_FIELDS = (
+    'id,historyId,payload(mimeType,body/data,'
+    'parts(mimeType,body/data,parts(mimeType,body/data,parts(mimeType,body/data))))'
+)
+
+# Gmail search filter for Amazon sign-in verification mails (evaluated server-side)
+GMAIL_OTP_QUERY = 'from:amazon.co.jp subject:(確認コード OR 認証 OR サインイン OR "verification code" OR OTP)'
+GMAIL_OTP_MAX_RESULTS = 3
+GMAIL_BATCH_LIMIT = 100  # Maximum calls per Gmail batch HTTP request
+OTP_POLL_DEADLINE_SECONDS = 120  # Total time to wait for the OTP mail before giving up
+
+# Plain-text OTP patterns (compiled once, tried in order)
+OTP_TEXT_PATTERNS = [
+    re.compile(p, re.IGNORECASE | re.MULTILINE) for p in (
+        r'確認コード(?:は|:|：)?(?:次のとおりです)?\s*[:：]?\s*(\d{6})',
+        r'verification\s+code(?:\s+is)?\s*[:：]?\s*(\d{6})',
+        r'コード(?:\s*[:：]\s*)(\d{6})',
+        r'(?:^|\s)(\d{6})(?:\s|$)',  # Standalone 6-digit number
+    )
+]
+
+# Patterns trusted on the short message snippet (the standalone-number fallback is not)
+OTP_SNIPPET_PATTERNS = OTP_TEXT_PATTERNS[:-1]
+
+# Cheap pre-check: OTP mails always mention a code; promotional mail is rejected
+# with one scan instead of the full HTML parse + regex cascade
+OTP_KEYWORD_PATTERN = re.compile(r'確認|認証|コード|verification|security\s+code|one[-\s]?time|otp', re.IGNORECASE)
+
+# Price/percentage parsing used by extract_number (compiled once)
+CURRENCY_CHARS_PATTERN = re.compile(r'[¥,円JPY\s]')
+NUMBER_PATTERN = re.compile(r'\d+(?:\.\d+)?')
+
+# Detects HTML mail bodies without lowercasing a copy of the whole body
+HTML_MARKER_PATTERN = re.compile(r'<(?:html|body|table)', re.IGNORECASE)
+HTML_MARKER_BYTES_PATTERN = re.compile(rb'<(?:html|body|table)', re.IGNORECASE)
 
 # Google Sheets API settings
 SHEETS_SCOPES = [
@@ -104,11 +151,25 @@ SHEETS_SCOPES = [
 ]
 SHEETS_CREDENTIALS_FILE = GMAIL_CREDENTIALS_FILE  # Use same OAuth credentials
 SHEETS_TOKEN_FILE = Path('sheets_token.json')
+# Optional service-account key (share the spreadsheet with its email); used instead of OAuth when present
+SHEETS_SERVICE_ACCOUNT_FILE = Path('data/service_account.json')
 SPREADSHEET_URL = "https://docs.google.com/spreadsheets/d/1t_HjbOjlcgwZACo2glY8w-OfUVAGa3TEcX2h5wIwejk/edit?hl=ja&gid=0#gid=0"
 SPREADSHEET_ID = "1t_HjbOjlcgwZACo2glY8w-OfUVAGa3TEcX2h5wIwejk"  # Extracted from URL
+SHEETS_BATCH_ROWS = 100  # Rows buffered before a single append_rows call
+SHEETS_FLUSH_SECONDS = 10  # ...or send earlier once the oldest buffered row is this old
+SHEETS_INIT_TIMEOUT_SECONDS = 30  # Wait for the background Sheets setup at most this long once scraping is due (not counting OAuth consent)
+# Next product number and header state from the last run; trusted instead of re-reading the sheet while fresh
+SHEETS_STATE_CACHE_FILE = Path('data/sheet_cache.json')
+SHEETS_STATE_CACHE_TTL_SECONDS = 300
+
+# ASINs already sent today, per listing URL, so a restarted run skips them
+ASIN_CACHE_DIR = Path('.cache')
 
 # Session file
 SESSION_FILE = "amazon_session.json"
+# Amazon sign-in cookies (amazon.co.jp uses the -acbjp names); a saved session without
+# one of them unexpired cannot be logged in, so the online session check is skipped
+SESSION_AUTH_COOKIES = {'at-acbjp', 'sess-at-acbjp', 'x-acbjp', 'at-main', 'sess-at-main', 'x-main'}
 
 # Amazon URLs (Japanese site)
 AMAZON_LOGIN_URL = "https://www.amazon.co.jp/ap/signin?openid.pape.max_auth_age=900&openid.return_to=https%3A%2F%2Fwww.amazon.co.jp%2Fgp%2Fyourstore%2Fhome%3Fpath%3D%252Fgp%252Fyourstore%252Fhome%26signIn%3D1%26useRedirectOnSuccess%3D1%26action%3Dsign-out%26ref_%3Dabn_yadd_sign_out&openid.assoc_handle=jpflex&openid.mode=checkid_setup&openid.ns=http%3A%2F%2Fspecs.openid.net%2Fauth%2F2.0"
@@ -122,54 +183,88 @@ SELECTED_CATEGORIES = [
 ]
 MIN_DISCOUNT_PERCENT = 5
 
+# Browser mode: visible by default because the passkey dialog is closed by hand.
+# Set HEADLESS=true in .env for unattended runs with a valid saved session.
+HEADLESS = os.getenv('HEADLESS', 'false').strip().lower() in ('1', 'true', 'yes')
+# Green "SCRAPING..." highlight per product; nobody sees it headless, so off there by default
+ENABLE_HIGHLIGHT = os.getenv('ENABLE_HIGHLIGHT', '0' if HEADLESS else '1').strip().lower() in ('1', 'true', 'yes')
+# Full tracebacks for per-product failures only when LOG_LEVEL=DEBUG (one-line errors otherwise)
+DEBUG_TRACEBACKS = os.getenv('LOG_LEVEL', '').strip().upper() == 'DEBUG'
+
 # Timeouts and delays
-TIMEOUT_MS = 30000
+TIMEOUT_MS = 30000  # Page navigation
+ACTION_TIMEOUT_MS = 5000  # Passed to clicks/waits on elements that should already be there
+OTP_FIELD_TIMEOUT_MS = 10000  # Amazon's 2FA page can be slow to render
+CVF_WAIT_TIMEOUT_MS = 120000  # Manual security verification (cvf/approval, cvf/verify)
 DELAY_AFTER_CLICK = 2
 
+# Chrome flags: automation/locale setup plus background work a scraping run never needs.
+# Images are disabled in Blink itself so no request is even issued (the route handler
+# below still drops media, fonts and ad hosts).
+CHROME_LAUNCH_ARGS = [
+    "--disable-blink-features=AutomationControlled",
+    "--no-sandbox",
+    "--start-maximized",
+    "--lang=ja-JP",
+    "--blink-settings=imagesEnabled=false",
+    "--disable-extensions",
+    "--disable-background-networking",
+    "--disable-default-apps",
+    "--disable-sync",
+    "--disable-features=Translate",
+    "--disable-dev-shm-usage",
+    "--mute-audio",
+]
+# Nothing is painted for a person headless, so the GPU process is only overhead there
+CHROME_HEADLESS_ARGS = ["--disable-gpu"]
+
+# Resource types aborted by the browser context (never read by the automation).
+# Stylesheets are kept: visibility checks, lazy loading and the manual passkey
+# dialog close all depend on the page layout.
+BLOCKED_RESOURCE_TYPES = {'image', 'media', 'font'}
+# Third-party ad/analytics hosts aborted regardless of type (Amazon's own scripts are
+# left alone: sign-in fraud checks load from them)
+BLOCKED_URL_PATTERN = re.compile(
+    r'^https?://[^/]*(?:amazon-adsystem\.com|doubleclick\.net|google-analytics\.com|googletagmanager\.com)[/:]'
+)
+
 # Selectors for Amazon login (Japanese site)
+# Stable form ids first; the generic fallbacks cover Amazon's alternate sign-in layouts
 EMAIL_SELECTORS = [
-    "xpath=/html/body/div[1]/div[1]/div[2]/div/div/div/div/span/form/div[1]/input",
-    "#ap_email", 
-    "input[name='email']", 
-    "input[type='email']", 
-    "input#ap_email"
+    "#ap_email",
+    "input[name='email']",
+    "input[type='email']"
 ]
 CONTINUE_SELECTORS = [
+    "#continue",
     "input[aria-labelledby='continue-announce']",
-    "#continue", 
-    "input#continue", 
     "input[type='submit']"
 ]
 PASSWORD_SELECTORS = [
-    "xpath=/html/body/div[1]/div[1]/div[2]/div/div[2]/div/div[2]/div/form/div/div[1]/input",
-    "#ap_password", 
-    "input[name='password']", 
-    "input[type='password']", 
-    "input#ap_password"
+    "#ap_password",
+    "input[name='password']",
+    "input[type='password']"
 ]
 SIGNIN_SELECTORS = [
-    "xpath=/html/body/div[1]/div[1]/div[2]/div/div[2]/div/div[2]/div/form/div/div[2]/span/span/input",
-    "#signInSubmit", 
-    "input#signInSubmit", 
-    "input[type='submit']", 
+    "#signInSubmit",
+    "input[type='submit']",
     "button[type='submit']"
 ]
+PASSWORD_CSS = ", ".join(PASSWORD_SELECTORS)  # Any password field, for a single wait_for()
+EMAIL_CSS = ", ".join(EMAIL_SELECTORS)
+PASSKEY_CLOSE_CSS = 'button:has-text("閉じる"), [aria-label="閉じる"], button:has-text("Close")'
 OTP_SELECTORS = [
-    "xpath=/html/body/div[1]/div[2]/div/div/div[3]/form/div[1]/div/div/span[1]/div/input",
-    "#auth-mfa-otpcode", 
-    "input[name='otpCode']", 
+    "#auth-mfa-otpcode",
+    "input[name='otpCode']",
     "input[autocomplete='one-time-code']",
     "input[name='code']",
     "input[type='tel']",
-    "input#auth-mfa-otpcode",
     "input[inputmode='numeric']"
 ]
 OTP_SUBMIT_SELECTORS = [
-    "xpath=/html/body/div[1]/div[2]/div/div/div[3]/form/div[7]/span/span/input",
-    "#auth-signin-button", 
-    "input[type='submit']", 
-    "button[type='submit']", 
-    "input#auth-signin-button"
+    "#auth-signin-button",
+    "input[type='submit']",
+    "button[type='submit']"
 ]
 
 # Selectors for filtering (exact XPaths provided by user)
@@ -195,39 +290,77 @@ DISCOUNT_SHOW_RESULTS_BUTTON = "xpath=/html/body/div[1]/div[1]/div/div/div[3]/se
 SORT_DROPDOWN_BUTTON = "xpath=/html/body/div[1]/div[1]/div/div/div[3]/section/div/div/div/div/div[1]/div[2]/span/span/span/span/span/span[1]"
 SORT_BUSINESS_DISCOUNT_DESC = "xpath=/html/body/div[3]/div/div/ul/li[3]/a"
 
+# Product card on the results page; its reappearance marks a finished filter/sort reload
+RESULTS_CARD_SELECTOR = "div.a-cardui._dmFsd_cardItem_1LFgv"
+
 
 # ============================================================================
 # GMAIL API FUNCTIONS
 # ============================================================================
 
-def get_gmail_service():
+# Credentials shared by every Gmail call in this process (guarded by _gmail_creds_lock)
+_gmail_creds = None
+_gmail_creds_lock = threading.Lock()
+
+# One Gmail service per thread, so each thread keeps reusing its own HTTPS connection
+_gmail_thread_local = threading.local()
+
+# Held while a browser OAuth consent (Gmail or Sheets) runs; their setups start in
+# parallel, and two consents at once would open two tabs and mix their prompts
+_oauth_consent_lock = threading.Lock()
+
+
+def _gmail_token_fresh(creds):
+    """True if creds are valid and not within GMAIL_TOKEN_REFRESH_MARGIN of expiring"""
+    if not creds or not creds.valid:
+        return False
+    if creds.expiry is None:
+        return True
+    # google-auth keeps expiry as naive UTC
+    now_utc = datetime.now(timezone.utc).replace(tzinfo=None)
+    return creds.expiry - now_utc > GMAIL_TOKEN_REFRESH_MARGIN
+
+
+def get_gmail_credentials():
     """
-    Authenticate and return Gmail API service
+    Return Gmail OAuth credentials, touching disk/network only when needed
+    
+    Order: in-memory credentials -> token file -> refresh_token refresh (one
+    HTTPS call) -> full InstalledAppFlow consent as the last resort.
     
     Returns:
-        Gmail API service object
+        google.oauth2.credentials.Credentials
     """
-    creds = None
+    global _gmail_creds
+    with _gmail_creds_lock:
+        if _gmail_token_fresh(_gmail_creds):
+            return _gmail_creds
+        _gmail_creds = _load_gmail_credentials(_gmail_creds)
+        return _gmail_creds
+
+
+def _load_gmail_credentials(creds=None):
+    """Load, refresh or (first time) authorize Gmail credentials and save the token"""
     
     # Load existing token if available
-    if GMAIL_TOKEN_FILE.exists():
+    if creds is None and GMAIL_TOKEN_FILE.exists():
         try:
             creds = Credentials.from_authorized_user_file(str(GMAIL_TOKEN_FILE), GMAIL_SCOPES)
         except Exception as e:
             print(f"[WARNING] Could not load token: {e}")
             creds = None
     
-    # If no valid credentials, do OAuth flow (one-time)
-    if not creds or not creds.valid:
-        if creds and creds.expired and creds.refresh_token:
-            print("[INFO] Refreshing expired token...")
+    # If no fresh credentials, refresh or do OAuth flow (one-time)
+    if not _gmail_token_fresh(creds):
+        if creds and creds.refresh_token:
+            print("[INFO] Refreshing Gmail token...")
             try:
                 creds.refresh(Request())
             except Exception as e:
                 print(f"[WARNING] Token refresh failed: {e}")
                 creds = None
         
-        if not creds:
+        if not creds or not creds.valid:
             if not GMAIL_CREDENTIALS_FILE.exists():
                 raise FileNotFoundError(
                     f"\n[ERROR] Gmail credentials file not found: {GMAIL_CREDENTIALS_FILE}\n"
@@ -235,29 +368,89 @@ def get_gmail_service():
                     "and place it in the 'data' folder."
                 )
             
-            print("\n" + "="*60)
-            print("GMAIL API AUTHORIZATION REQUIRED")
-            print("="*60)
-            print("A browser window will open for Google authorization.")
-            print("This is required only the first time (token.json is saved).")
-            print("="*60 + "\n")
-            
-            flow = InstalledAppFlow.from_client_secrets_file(
-                str(GMAIL_CREDENTIALS_FILE), GMAIL_SCOPES)
-            creds = flow.run_local_server(port=0)
+            with _oauth_consent_lock:
+                print("\n" + "="*60)
+                print("GMAIL API AUTHORIZATION REQUIRED")
+                print("="*60)
+                print("A browser window will open for Google authorization.")
+                print("This is required only the first time (token.json is saved).")
+                print("="*60 + "\n")
+                
+                flow = InstalledAppFlow.from_client_secrets_file(
+                    str(GMAIL_CREDENTIALS_FILE), GMAIL_SCOPES)
+                creds = flow.run_local_server(port=0)
         
         # Save credentials for next time
         with open(GMAIL_TOKEN_FILE, 'w') as token:
             token.write(creds.to_json())
         print(f"[SUCCESS] Gmail authentication saved to {GMAIL_TOKEN_FILE}")
     
-    return build('gmail', 'v1', credentials=creds)
+    return creds
+
+
+def get_gmail_service():
+    """
+    Authenticate and return Gmail API service
+    
+    The service is built once per thread (the underlying httplib2 client is
+    not thread-safe) on top of the shared, cached credentials, and reused so
+    later calls skip the TCP/TLS handshake. It is rebuilt when the
+    credentials were reloaded.
+    
+    Returns:
+        Gmail API service object
+    """
+    creds = get_gmail_credentials()
+    cached = getattr(_gmail_thread_local, 'service', None)
+    if cached is not None and cached[0] is creds:
+        return cached[1]
+    # The Gmail discovery document ships with the client; skip the file cache lookup
+    service = build('gmail', 'v1', credentials=creds, cache_discovery=False)
+    _gmail_thread_local.service = (creds, service)
+    return service
+
+
+class _OTPFound(Exception):
+    """Raised by OTPHTMLParser to stop parsing at the first OTP"""
+
+
+class OTPHTMLParser(HTMLParser):
+    """
+    Single-pass HTML walker that finds the first <span> inside a <table>
+    whose text is exactly a 6-digit code (the layout Amazon OTP mails use)
+    """
+    
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.table_depth = 0
+        self.span_texts = []  # Text buffers for the currently open spans
+        self.otp = None
+    
+    def handle_starttag(self, tag, attrs):
+        if tag == 'table':
+            self.table_depth += 1
+        elif tag == 'span':
+            self.span_texts.append([])
+    
+    def handle_endtag(self, tag):
+        if tag == 'table':
+            self.table_depth = max(0, self.table_depth - 1)
+        elif tag == 'span' and self.span_texts:
+            text = ''.join(self.span_texts.pop()).strip()
+            if self.table_depth > 0 and len(text) == 6 and text.isdigit():
+                self.otp = text
+                raise _OTPFound()
+    
+    def handle_data(self, data):
+        if self.span_texts:
+            self.span_texts[-1].append(data)
 
 
 def extract_otp_from_html(html_text):
     """
-    Extract 6-digit OTP code from HTML email using XPath-like structure
-    The OTP is in: /html/body/div[6]/.../table/tbody/tr[4]/td/div/span
+    Extract 6-digit OTP code from HTML email
+    The OTP is in a span inside the mail's table layout:
+    /html/body/div[6]/.../table/tbody/tr[4]/td/div/span
     
     Args:
         html_text: Email HTML body
@@ -268,33 +461,16 @@ def extract_otp_from_html(html_text):
     if not html_text:
         return None
     
+    parser = OTPHTMLParser()
     try:
-        # Method 1: Try to find the specific table structure from XPath
-        # Look for table > tbody > tr[4] > td > div > span pattern
-        # This matches the XPath: /table/tbody/tr[4]/td/div/span
-        table_pattern = r'<table[^>]*>.*?<tbody[^>]*>.*?<tr[^>]*>.*?<tr[^>]*>.*?<tr[^>]*>.*?<tr[^>]*>.*?<td[^>]*>.*?<div[^>]*>.*?<span[^>]*>(\d{6})</span>'
-        match = re.search(table_pattern, html_text, re.DOTALL | re.IGNORECASE)
-        if match:
-            otp = match.group(1)
-            if len(otp) == 6 and otp.isdigit():
-                return otp
-        
-        # Method 2: Find all spans with 6-digit numbers and check context
-        span_pattern = r'<span[^>]*>(\d{6})</span>'
-        spans = re.findall(span_pattern, html_text, re.IGNORECASE)
-        for span_text in spans:
-            if len(span_text) == 6 and span_text.isdigit():
-                # Check if it's in a table structure (more likely to be OTP)
-                span_index = html_text.find(f'<span>{span_text}</span>')
-                if span_index > 0:
-                    context = html_text[max(0, span_index-500):span_index+100]
-                    if 'table' in context.lower() and 'tbody' in context.lower():
-                        return span_text
-        
+        parser.feed(html_text)
+        parser.close()
+    except _OTPFound:
+        pass
     except Exception as e:
         print(f"    [WARNING] HTML parsing error: {e}")
     
-    return None
+    return parser.otp
 
 
 def extract_otp_from_text(text):
@@ -310,22 +486,19 @@ def extract_otp_from_text(text):
     if not text:
         return None
     
+    # Skip bodies that never mention a verification code
+    if not OTP_KEYWORD_PATTERN.search(text):
+        return None
+    
     # First try HTML extraction (for the specific XPath structure)
-    if '<html' in text.lower() or '<body' in text.lower() or '<table' in text.lower():
+    if HTML_MARKER_PATTERN.search(text):
         html_otp = extract_otp_from_html(text)
         if html_otp:
             return html_otp
     
     # Then try regex patterns for plain text
-    patterns = [
-        r'確認コード(?:は|:|：)(?:次のとおりです)?(?:\s*[:：]\s*)?(\d{6})',
-        r'verification\s+code(?:\s+is)?(?:\s*[:：]\s*)?(\d{6})',
-        r'コード(?:\s*[:：]\s*)(\d{6})',
-        r'(?:^|\s)(\d{6})(?:\s|$)',  # Standalone 6-digit number
-    ]
-    
-    for pattern in patterns:
-        match = re.search(pattern, text, re.IGNORECASE | re.MULTILINE)
+    for pattern in OTP_TEXT_PATTERNS:
+        match = pattern.search(text)
         if match:
             otp = match.group(1)
             if len(otp) == 6 and otp.isdigit():
@@ -334,10 +507,29 @@ def extract_otp_from_text(text):
     return None
 
 
+def extract_otp_from_snippet(snippet):
+    """
+    Extract the OTP from a Gmail message snippet (first ~200 chars of the text)
+    
+    Only the keyword-anchored patterns are used, so a stray 6-digit number
+    in the snippet never counts; None means "read the body instead".
+    """
+    if not snippet:
+        return None
+    # Snippets come HTML-escaped (&quot;, &#39;, ...)
+    text = unescape(snippet)
+    for pattern in OTP_SNIPPET_PATTERNS:
+        match = pattern.search(text)
+        if match:
+            return match.group(1)
+    return None
+
+
 def decode_email_body(payload):
     """
     Decode email body from Gmail API message payload
     Prioritizes HTML over plain text for better OTP extraction
+    Walks the MIME tree iteratively, touching each part once
     
     Args:
         payload: Message payload from Gmail API
@@ -345,58 +537,239 @@ def decode_email_body(payload):
     Returns:
         Decoded email body text (HTML preferred)
     """
-    html_body = ""
-    text_body = ""
+    html_parts = []
+    text_parts = []
     
-    # Check if body is in payload.body.data
-    if 'body' in payload and 'data' in payload['body']:
-        body_data = payload['body']['data']
-        decoded = base64.urlsafe_b64decode(body_data).decode('utf-8', errors='ignore')
-        # Check if it's HTML
-        if '<html' in decoded.lower() or '<body' in decoded.lower() or '<table' in decoded.lower():
-            html_body = decoded
-        else:
-            text_body = decoded
+    # Depth-first walk in document order without recursion
+    stack = deque([payload])
+    while stack:
+        part = stack.popleft()
+        if 'parts' in part:
+            stack.extendleft(reversed(part['parts']))
+        
+        body_data = part.get('body', {}).get('data')
+        if not body_data:
+            continue
+        
+        raw = base64.urlsafe_b64decode(body_data)
+        mime_type = part.get('mimeType', '')
+        
+        if mime_type == 'text/html':
+            html_parts.append(raw)
+        elif mime_type == 'text/plain':
+            text_parts.append(raw)
+        elif part is payload:
+            # Single-part message: check if it's HTML (on the raw bytes)
+            if HTML_MARKER_BYTES_PATTERN.search(raw):
+                html_parts.append(raw)
+            else:
+                text_parts.append(raw)
     
-    # Check if body is in parts (multipart email)
-    if 'parts' in payload:
-        for part in payload['parts']:
-            mime_type = part.get('mimeType', '')
-            
-            # Recursively check nested parts
-            if 'parts' in part:
-                nested_result = decode_email_body(part)
-                if '<html' in nested_result.lower() or '<table' in nested_result.lower():
-                    html_body += nested_result
-                else:
-                    text_body += nested_result
-            
-            # Get text/html (preferred for OTP extraction)
-            elif mime_type == 'text/html':
-                if 'data' in part['body']:
-                    part_data = part['body']['data']
-                    decoded = base64.urlsafe_b64decode(part_data).decode('utf-8', errors='ignore')
-                    html_body += decoded + "\n"
-            
-            # Get text/plain (fallback)
-            elif mime_type == 'text/plain':
-                if 'data' in part['body']:
-                    part_data = part['body']['data']
-                    decoded = base64.urlsafe_b64decode(part_data).decode('utf-8', errors='ignore')
-                    text_body += decoded + "\n"
+    # Return HTML if available, otherwise plain text (decoded once, at the end)
+    chosen = html_parts if html_parts else text_parts
+    return b'\n'.join(chosen).decode('utf-8', errors='ignore')
+
+
+def fetch_gmail_messages_batch(service, message_ids, **get_kwargs):
+    """
+    Fetch several Gmail messages in one batch HTTP request per GMAIL_BATCH_LIMIT messages
+
+    Args:
+        service: Gmail API service object
+        message_ids: List of message IDs to fetch
+        **get_kwargs: Extra arguments for messages().get() (format, fields, ...)
+
+    Returns:
+        Dict of message_id -> message resource (failed entries are omitted)
+    """
+    fetched = {}
+
+    def _collect(request_id, response, exception):
+        if exception is not None:
+            print(f"    [WARNING] Batch fetch failed for message {request_id}: {exception}")
+            return
+        fetched[request_id] = response
+
+    if not message_ids:
+        return fetched
+
+    # The batch endpoint rejects more than GMAIL_BATCH_LIMIT calls per request
+    for start in range(0, len(message_ids), GMAIL_BATCH_LIMIT):
+        try:
+            batch = service.new_batch_http_request(callback=_collect)
+            for message_id in message_ids[start:start + GMAIL_BATCH_LIMIT]:
+                batch.add(
+                    service.users().messages().get(userId='me', id=message_id, **get_kwargs),
+                    request_id=message_id
+                )
+            batch.execute()
+        except HttpError as e:
+            # Callers fall back to single GETs for anything missing
+            print(f"    [WARNING] Gmail batch request failed: {e}")
+
+    return fetched
+
+
+def prewarm_gmail_service():
+    """
+    Authenticate with Gmail ahead of time so the OTP step finds a fresh token
+    
+    Returns:
+        True if authentication succeeded, False otherwise
+    """
+    try:
+        get_gmail_service()
+        return True
+    except Exception as e:
+        print(f"[WARNING] Gmail pre-authentication failed (will retry at OTP step): {e}")
+        return False
+
+
+def load_gmail_history_id():
+    """
+    Load the historyId saved by the previous run
+    
+    Returns:
+        historyId as string, or None if no usable state file exists
+    """
+    if not GMAIL_STATE_FILE.exists():
+        return None
+    try:
+        return json.loads(GMAIL_STATE_FILE.read_text(encoding='utf-8')).get('historyId')
+    except Exception as e:
+        print(f"[WARNING] Ignoring invalid Gmail state file '{GMAIL_STATE_FILE}': {e}")
+        return None
+
+
+def save_gmail_history_id(history_id):
+    """
+    Save the OTP mail's historyId so the next run never re-reads this run's mail
+    
+    Args:
+        history_id: historyId of the message the OTP was read from (already
+            fetched with it, so no extra Gmail request on the login path)
+    """
+    if not history_id:
+        return
+    try:
+        GMAIL_STATE_FILE.write_text(json.dumps({'historyId': history_id}), encoding='utf-8')
+    except Exception as e:
+        print(f"[WARNING] Could not save Gmail history ID: {e}")
+
+
+def get_gmail_history_id():
+    """
+    Snapshot the mailbox's current historyId so later polls only see new mail
+    
+    Falls back to the historyId saved by the previous run if the profile
+    cannot be read, so polling still uses deltas instead of a search.
+    
+    Returns:
+        historyId as string, or None if it could not be read
+    """
+    try:
+        service = get_gmail_service()
+        return service.users().getProfile(userId='me').execute().get('historyId')
+    except Exception as e:
+        print(f"[WARNING] Could not read Gmail history ID: {e}")
+        saved_history_id = load_gmail_history_id()
+        if saved_history_id:
+            print(f"[INFO] Using history ID saved by the previous run: {saved_history_id}")
+        return saved_history_id
+
+
+def list_new_gmail_message_ids(service, start_history_id):
+    """
+    List INBOX messages added since start_history_id via history.list (deltas only)
+    
+    Args:
+        service: Gmail API service object
+        start_history_id: historyId snapshot taken before the OTP mail was sent
+    
+    Returns:
+        List of message IDs, newest first
+    """
+    message_ids = []
+    page_token = None
+    while True:
+        request_args = {
+            'userId': 'me',
+            'startHistoryId': start_history_id,
+            'historyTypes': ['messageAdded'],
+            'labelId': 'INBOX',
+        }
+        if page_token:
+            request_args['pageToken'] = page_token
+        response = service.users().history().list(**request_args).execute()
+        
+        for record in response.get('history', []):
+            for added in record.get('messagesAdded', []):
+                message_id = added['message']['id']
+                if message_id not in message_ids:
+                    message_ids.append(message_id)
+        
+        page_token = response.get('nextPageToken')
+        if not page_token:
+            break
     
-    # Return HTML if available, otherwise plain text
-    return html_body if html_body else text_body
+    # History is chronological; check the newest mail first
+    message_ids.reverse()
+    return message_ids
 
 
-def get_amazon_otp_from_gmail(max_age_minutes=5, max_retries=12, retry_delay=5):
+def poll_adaptive(fn, initial=0.5, factor=1.6, max_interval=8, deadline=120,
+                  busy_window=2, busy_interval=0.25, stop_event=None):
+    """
+    Call fn until it returns a truthy value or the deadline passes
+    
+    Polls every busy_interval seconds for the first busy_window seconds, then
+    sleeps initial, initial*factor, ... capped at max_interval (0.5, 0.8, 1.3,
+    2.0, 3.2, 5.0, 8.0 with the defaults). Sleeps never overrun the deadline.
+    Setting stop_event (a threading.Event) ends the polling early.
+    
+    Returns:
+        (result, number_of_calls, elapsed_seconds); result is None on timeout
+    """
+    start = time.monotonic()
+    interval = initial
+    calls = 0
+    while True:
+        calls += 1
+        result = fn()
+        elapsed = time.monotonic() - start
+        if result:
+            return result, calls, elapsed
+        remaining = deadline - elapsed
+        if remaining <= 0 or (stop_event is not None and stop_event.is_set()):
+            return None, calls, elapsed
+        if elapsed < busy_window:
+            delay = busy_interval
+        else:
+            delay = interval
+            interval = min(max_interval, interval * factor)
+        if delay >= 1:
+            print(f"[INFO] Not ready yet ({elapsed:.0f}s elapsed), checking again in {delay:.1f}s...")
+        if stop_event is not None:
+            stop_event.wait(min(delay, remaining))
+        else:
+            time.sleep(min(delay, remaining))
+
+
+def get_amazon_otp_from_gmail(max_age_minutes=5, timeout_seconds=OTP_POLL_DEADLINE_SECONDS, start_history_id=None,
+                              stop_event=None):
     """
     Get latest Amazon OTP code from Gmail
     
+    Polls via poll_adaptive: tight polling first (the mail often lands within
+    a second or two), then growing intervals until timeout_seconds.
+    
     Args:
         max_age_minutes: Only check emails from last N minutes (default: 5)
-        max_retries: Maximum number of retry attempts (default: 12)
-        retry_delay: Seconds to wait between retries (default: 5)
+        timeout_seconds: Give up after this many seconds (default: OTP_POLL_DEADLINE_SECONDS)
+        start_history_id: Gmail historyId taken before sign-in; when given, only
+            mail added after it is checked (falls back to a search if expired)
+        stop_event: Optional threading.Event; set it to stop polling (e.g. when
+            the login turned out not to need an OTP)
     
     Returns:
         6-digit OTP code as string, or None if not found
@@ -416,97 +789,152 @@ def get_amazon_otp_from_gmail(max_age_minutes=5, max_retries=12, retry_delay=5):
     # Calculate timestamp for search query (Unix timestamp)
     since_time = int((datetime.now() - timedelta(minutes=max_age_minutes)).timestamp())
     
-    # Search query for Amazon verification emails - keep it broad.
-    # Amazon can send from various addresses and subjects can vary.
-    query = (
-        f'(from:amazon.co.jp OR from:account-update@amazon.co.jp OR from:no-reply@amazon.co.jp '
-        f'OR from:auto-confirm@amazon.co.jp) after:{since_time}'
-    )
+    # Search query for Amazon verification emails - sender and subject are
+    # filtered by Gmail so usually only the OTP mail itself comes back.
+    # (after: takes epoch seconds; newer_than: has no minute granularity)
+    query = f'{GMAIL_OTP_QUERY} after:{since_time}'
     
     print(f"\n[INFO] Searching for Amazon verification emails from last {max_age_minutes} minutes...")
-    print(f"[INFO] Query: {query}\n")
+    if start_history_id:
+        print(f"[INFO] Watching mailbox changes since history ID {start_history_id}\n")
+    else:
+        print(f"[INFO] Query: {query}\n")
     
-    for attempt in range(1, max_retries + 1):
+    def check_mailbox():
+        """One Gmail check; returns the OTP or None (poll again)"""
+        nonlocal start_history_id
         try:
-            # Search for messages (newest first)
-            results = service.users().messages().list(
-                userId='me',
-                q=query,
-                maxResults=10  # Get last 10 messages
-            ).execute()
+            messages = None
+            if start_history_id:
+                # Only mail added since the snapshot (tiny response when nothing changed)
+                try:
+                    messages = [{'id': message_id} for message_id in
+                                list_new_gmail_message_ids(service, start_history_id)]
+                except HttpError as e:
+                    if e.resp.status != 404:
+                        raise
+                    print("[WARNING] Gmail history ID expired - falling back to search query")
+                    start_history_id = None
             
-            messages = results.get('messages', [])
+            if messages is None:
+                # Search for messages (newest first)
+                results = service.users().messages().list(
+                    userId='me',
+                    q=query,
+                    maxResults=GMAIL_OTP_MAX_RESULTS
+                ).execute()
+                
+                messages = results.get('messages', [])
             
             if not messages:
-                if attempt < max_retries:
-                    print(f"[Attempt {attempt}/{max_retries}] No email found yet, waiting {retry_delay}s...")
-                    time.sleep(retry_delay)
-                    continue
-                else:
-                    print(f"\n[WARNING] No Amazon email found after {max_retries} attempts")
-                    return None
-            
-            print(f"[SUCCESS] Found {len(messages)} email(s) from Amazon")
+                return None
             
-            # Check each message for OTP (newest first)
-            for idx, message in enumerate(messages, 1):
+            print(f"[SUCCESS] Found {len(messages)} new email(s)")
+
+            message_ids = [m['id'] for m in messages]
+
+            # Pass 1: fetch only From/Subject headers and internalDate for every message
+            metadata = fetch_gmail_messages_batch(
+                service, message_ids, format='metadata',
+                metadataHeaders=['From', 'Subject'], fields=GMAIL_METADATA_FIELDS
+            )
+
+            candidates = []
+            for idx, message_id in enumerate(message_ids, 1):
+                meta = metadata.get(message_id)
+                if meta is None:
+                    # Metadata unavailable - let the body pass decide
+                    candidates.append((idx, message_id))
+                    continue
+
+                # Get subject and from
+                headers = meta.get('payload', {}).get('headers', [])
+                subject = next((h['value'] for h in headers if h['name'].lower() == 'subject'), 'No Subject')
+                from_email = next((h['value'] for h in headers if h['name'].lower() == 'from'), 'Unknown')
+
+                print(f"\n  Checking Email {idx}:")
+                print(f"    From: {from_email[:50]}")
+                print(f"    Subject: {subject[:60]}...")
+
+                # History deltas include every new INBOX mail, not just Amazon's
+                if 'amazon' not in from_email.lower():
+                    print("    [INFO] Skipping (not from Amazon)")
+                    continue
+
+                # Optional: reject old emails by internalDate if present
                 try:
-                    # Get full message
-                    msg = service.users().messages().get(
-                        userId='me',
-                        id=message['id'],
-                        format='full'
-                    ).execute()
-                    
-                    # Get subject and from
-                    headers = msg['payload'].get('headers', [])
-                    subject = next((h['value'] for h in headers if h['name'].lower() == 'subject'), 'No Subject')
-                    from_email = next((h['value'] for h in headers if h['name'].lower() == 'from'), 'Unknown')
-                    
-                    print(f"\n  Checking Email {idx}:")
-                    print(f"    From: {from_email[:50]}")
-                    print(f"    Subject: {subject[:60]}...")
-                    
-                    # Optional: reject old emails by internalDate if present
-                    try:
-                        internal_ms = int(msg.get("internalDate", "0"))
-                        if internal_ms:
-                            age_seconds = (time.time() - (internal_ms / 1000.0))
-                            if age_seconds > (max_age_minutes * 60):
-                                print("    [INFO] Skipping (too old)")
-                                continue
-                    except Exception:
-                        pass
+                    internal_ms = int(meta.get("internalDate", "0"))
+                    if internal_ms:
+                        age_seconds = (time.time() - (internal_ms / 1000.0))
+                        if age_seconds > (max_age_minutes * 60):
+                            print("    [INFO] Skipping (too old)")
+                            continue
+                except Exception:
+                    pass
+
+                # Amazon's snippet usually contains the code itself: no body fetch needed
+                snippet_otp = extract_otp_from_snippet(meta.get('snippet', ''))
+                if snippet_otp:
+                    print(f"    [SUCCESS] Found OTP in email {idx} snippet: {snippet_otp}")
+                    print("\n" + "="*60)
+                    save_gmail_history_id(meta.get('historyId'))
+                    return snippet_otp
+
+                candidates.append((idx, message_id))
+
+            # Pass 2: fetch only the body parts of the remaining candidates
+            bodies = fetch_gmail_messages_batch(
+                service, [message_id for _, message_id in candidates],
+                format='full', fields=GMAIL_BODY_FIELDS
+            )
+
+            # Check each candidate for OTP (newest first)
+            for idx, message_id in candidates:
+                try:
+                    msg = bodies.get(message_id)
+                    if msg is None:
+                        # Batch entry failed - fall back to a single GET
+                        msg = service.users().messages().get(
+                            userId='me',
+                            id=message_id,
+                            format='full',
+                            fields=GMAIL_BODY_FIELDS
+                        ).execute()
 
                     # Decode email body (HTML preferred)
-                    body_text = decode_email_body(msg['payload'])
+                    body_text = decode_email_body(msg.get('payload', {}))
                     
                     # Extract OTP
                     otp = extract_otp_from_text(body_text)
                     
                     if otp:
-                        print(f"    [SUCCESS] Found OTP: {otp}")
+                        print(f"    [SUCCESS] Found OTP in email {idx}: {otp}")
                         print("\n" + "="*60)
+                        save_gmail_history_id(msg.get('historyId'))
                         return otp
                     else:
-                        print(f"    [INFO] No OTP in this email")
+                        print(f"    [INFO] No OTP in email {idx}")
                 
                 except HttpError as e:
-                    print(f"    [ERROR] Failed to read email: {e}")
+                    print(f"    [ERROR] Failed to read email {idx}: {e}")
                     continue
             
-            # If we checked all messages and no OTP found, wait and retry
-            if attempt < max_retries:
-                print(f"\n[Attempt {attempt}/{max_retries}] OTP not found in existing emails, waiting {retry_delay}s for new email...")
-                time.sleep(retry_delay)
+            # Checked all messages and no OTP found - poll again for new email
+            return None
             
         except HttpError as e:
             print(f"[ERROR] Gmail API error: {e}")
-            if attempt < max_retries:
-                time.sleep(retry_delay)
-            continue
+            return None
+    
+    otp, polls, elapsed = poll_adaptive(check_mailbox, deadline=timeout_seconds, stop_event=stop_event)
+    if otp:
+        print(f"[INFO] OTP retrieved after {polls} Gmail check(s) in {elapsed:.1f}s")
+        return otp
+    if stop_event is not None and stop_event.is_set():
+        print("[INFO] Gmail OTP polling stopped")
+        return None
     
-    print(f"\n[WARNING] Could not find OTP after {max_retries} attempts")
+    print(f"\n[WARNING] Could not find OTP after {polls} Gmail checks in {elapsed:.0f}s")
     print("="*60)
     return None
 
@@ -519,9 +947,20 @@ def get_sheets_service():
     """
     Authenticate and return Google Sheets API service using gspread
     
+    Uses the service-account key if SHEETS_SERVICE_ACCOUNT_FILE exists (no
+    browser consent or user token to refresh), otherwise the OAuth flow.
+    
     Returns:
         gspread client object
     """
+    if SHEETS_SERVICE_ACCOUNT_FILE.exists():
+        try:
+            gc = gspread.service_account(filename=str(SHEETS_SERVICE_ACCOUNT_FILE))
+            print(f"[INFO] Using Sheets service account: {SHEETS_SERVICE_ACCOUNT_FILE}")
+            return gc
+        except Exception as e:
+            print(f"[WARNING] Service account login failed, falling back to OAuth: {e}")
+    
     creds = None
     
     # Load existing token if available
@@ -549,16 +988,17 @@ def get_sheets_service():
                     "Please download OAuth credentials from Google Cloud Console."
                 )
             
-            print("\n" + "="*60)
-            print("GOOGLE SHEETS API AUTHORIZATION REQUIRED")
-            print("="*60)
-            print("A browser window will open for Google authorization.")
-            print("="*60 + "\n")
-            
-            flow = InstalledAppFlow.from_client_secrets_file(
-                str(SHEETS_CREDENTIALS_FILE), SHEETS_SCOPES
-            )
-            creds = flow.run_local_server(port=0)
+            with _oauth_consent_lock:
+                print("\n" + "="*60)
+                print("GOOGLE SHEETS API AUTHORIZATION REQUIRED")
+                print("="*60)
+                print("A browser window will open for Google authorization.")
+                print("="*60 + "\n")
+                
+                flow = InstalledAppFlow.from_client_secrets_file(
+                    str(SHEETS_CREDENTIALS_FILE), SHEETS_SCOPES
+                )
+                creds = flow.run_local_server(port=0)
             
             # Save credentials for future use
             SHEETS_TOKEN_FILE.write_text(creds.to_json())
@@ -568,10 +1008,54 @@ def get_sheets_service():
     return gspread.authorize(creds)
 
 
+def load_sheet_state_cache():
+    """
+    Load the next product number saved within SHEETS_STATE_CACHE_TTL_SECONDS
+    
+    Returns:
+        Next product number as int, or None if there is no fresh cache for SPREADSHEET_ID
+    """
+    try:
+        state = json.loads(SHEETS_STATE_CACHE_FILE.read_text(encoding='utf-8'))
+        if (state.get('spreadsheet_id') == SPREADSHEET_ID
+                and time.time() - state.get('saved_at', 0) < SHEETS_STATE_CACHE_TTL_SECONDS):
+            return int(state['next_number'])
+    except (OSError, ValueError, KeyError, TypeError):
+        pass
+    return None
+
+
+def save_sheet_state_cache(next_number):
+    """Remember the next product number (the header row is known to be in place)"""
+    try:
+        SHEETS_STATE_CACHE_FILE.parent.mkdir(parents=True, exist_ok=True)
+        SHEETS_STATE_CACHE_FILE.write_text(json.dumps({
+            'spreadsheet_id': SPREADSHEET_ID,
+            'next_number': next_number,
+            'saved_at': time.time(),
+        }), encoding='utf-8')
+    except OSError as e:
+        print(f"    [WARNING] Could not save sheet state cache: {e}")
+
+
+def invalidate_sheet_state_cache():
+    """Forget the cached sheet state (after a failed write the sheet must be re-read)"""
+    try:
+        SHEETS_STATE_CACHE_FILE.unlink()
+    except FileNotFoundError:
+        pass
+    except OSError as e:
+        print(f"    [WARNING] Could not remove sheet state cache: {e}")
+
+
 def initialize_google_sheets():
     """
     Initialize Google Sheets connection and ensure headers are present
     
+    A run started within SHEETS_STATE_CACHE_TTL_SECONDS of the previous
+    successful write trusts the cached next number and header state and
+    skips reading the sheet.
+    
     Returns:
         Tuple of (gspread_client, worksheet, current_row_number) or (None, None, None) if failed
     """
@@ -583,8 +1067,16 @@ def initialize_google_sheets():
         spreadsheet = gc.open_by_key(SPREADSHEET_ID)
         worksheet = spreadsheet.sheet1  # Use first sheet
         
-        # Read existing data to find the last row number
-        existing_data = worksheet.get_all_values()
+        cached_number = load_sheet_state_cache()
+        if cached_number is not None:
+            print(f"[INFO] Using cached sheet state (next No: {cached_number}) - skipping sheet read")
+            atexit.register(flush_sheets, worksheet)
+            return gc, worksheet, cached_number
+        
+        # Read only the header row and the number column instead of the whole sheet
+        header_rows = worksheet.get('A1:I1')
+        existing_header = list(header_rows[0]) if header_rows else []
+        number_column = worksheet.col_values(1)
         
         # Prepare header row (Japanese to match existing spreadsheet)
         headers = [
@@ -599,46 +1091,239 @@ def initialize_google_sheets():
             "割引額（円）"
         ]
         
-        # Determine starting row number
-        if len(existing_data) == 0:
-            # No data at all - write headers and start from 1
+        # Write headers if missing or if they don't match
+        if existing_header != headers:
             worksheet.update('A1', [headers])
-            current_number = 1
-        elif len(existing_data) == 1:
-            # Only headers exist - start from 1
-            # Update headers if they don't match
-            if existing_data[0] != headers:
-                worksheet.update('A1', [headers])
+        
+        # Determine starting row number
+        if len(number_column) <= 1:
+            # No data (or only headers) - start from 1
             current_number = 1
         else:
-            # Data exists - find the last number and continue from there
-            # Update headers if they don't match
-            if existing_data[0] != headers:
-                worksheet.update('A1', [headers])
-            
-            # Find the last row number
-            last_row_data = existing_data[-1]
+            # Data exists - continue from the last number in column A
+            # (col_values drops trailing blanks, so tier rows without a number are skipped)
             try:
-                # Try to get the number from the first column
-                last_number = int(last_row_data[0]) if last_row_data[0] else 0
+                last_number = int(number_column[-1]) if number_column[-1] else 0
             except (ValueError, IndexError):
-                # If we can't parse it, count the rows
-                last_number = len(existing_data) - 1
+                # If we can't parse it, count the numbered rows
+                last_number = len(number_column) - 1
             
             current_number = last_number + 1
+        save_sheet_state_cache(current_number)
+        
+        # Last-resort flush for rows still buffered when the process exits
+        # (e.g. sys.exit outside scrape_all_products' own final flush)
+        atexit.register(flush_sheets, worksheet)
         
         return gc, worksheet, current_number
         
     except Exception as e:
         print(f"\n[ERROR] Failed to initialize Google Sheets: {e}")
-        import traceback
         traceback.print_exc()
         return None, None, None
 
 
+# Rows waiting to be sent to Google Sheets (see flush_sheets)
+_pending_rows = []
+
+# time.monotonic() when the oldest row in _pending_rows was queued
+_pending_since = None
+
+# First empty sheet row, learned from the first append; later flushes write there directly
+_next_row = None
+
+# Background Sheets writes: one worker keeps them in order while the browser keeps scraping
+_sheets_executor = ThreadPoolExecutor(max_workers=1)
+_sheets_write = None  # (future, rows) of the write in flight, if any
+
+
+def wait_for_sheets_setup(sheets_future):
+    """
+    Wait for the background initialize_google_sheets() call
+    
+    Gives up after SHEETS_INIT_TIMEOUT_SECONDS, but the clock restarts while
+    a browser OAuth consent is in progress, since that waits on the user.
+    
+    Returns:
+        Result of initialize_google_sheets(), or (None, None, None) on timeout
+    """
+    deadline = time.monotonic() + SHEETS_INIT_TIMEOUT_SECONDS
+    while True:
+        try:
+            return sheets_future.result(timeout=1)
+        except FutureTimeoutError:
+            if _oauth_consent_lock.locked():
+                deadline = time.monotonic() + SHEETS_INIT_TIMEOUT_SECONDS
+            elif time.monotonic() >= deadline:
+                print(f"[ERROR] Google Sheets setup did not finish within {SHEETS_INIT_TIMEOUT_SECONDS}s")
+                return None, None, None
+
+
+def _updated_range_end_row(append_response):
+    """Return the last row number of an append response's updatedRange, or None"""
+    try:
+        updated_range = append_response['updates']['updatedRange']  # e.g. "Sheet1!A12:I15"
+        match = re.search(r'(\d+)$', updated_range)
+        return int(match.group(1)) if match else None
+    except (KeyError, TypeError):
+        return None
+
+
+def _write_sheet_rows(worksheet, rows):
+    """
+    Write rows to Google Sheets in one API call (raises on failure)
+    
+    The first write uses append_rows so Sheets finds the end of the table;
+    after that rows are written to the known next range with values_batch_update,
+    which skips the server-side search for the first empty row.
+    """
+    global _next_row
+    
+    try:
+        if _next_row is None:
+            response = worksheet.append_rows(rows)
+            end_row = _updated_range_end_row(response)
+            _next_row = end_row + 1 if end_row else None
+        else:
+            last_row = _next_row + len(rows) - 1
+            # Unlike append, a range write cannot grow the grid
+            if last_row > worksheet.row_count:
+                worksheet.add_rows(max(last_row - worksheet.row_count, 1000))
+            # A1 sheet names are single-quoted, with quotes inside doubled
+            sheet_name = worksheet.title.replace("'", "''")
+            worksheet.spreadsheet.values_batch_update(body={
+                'valueInputOption': 'RAW',
+                'data': [{
+                    'range': f"'{sheet_name}'!A{_next_row}:I{last_row}",
+                    'values': rows,
+                }],
+            })
+            _next_row = last_row + 1
+    except Exception:
+        # The sheet is in an unknown state now; make the next run read it again
+        invalidate_sheet_state_cache()
+        raise
+    
+    # The last numbered row tells the next run where to continue
+    last_number = next((row[0] for row in reversed(rows) if row and row[0] != ''), None)
+    if isinstance(last_number, int):
+        save_sheet_state_cache(last_number + 1)
+    
+    # Only rows that reached the sheet count as scraped for a restarted run
+    record_written_asins(rows)
+
+
+# File that successfully written ASINs are appended to (set by scrape_all_products)
+_asin_cache_path = None
+
+
+def get_asin_cache_path(listing_url):
+    """Return today's scraped-ASIN cache file for a listing URL"""
+    url_hash = hashlib.sha1(listing_url.encode('utf-8')).hexdigest()
+    return ASIN_CACHE_DIR / f"asins_{datetime.now().strftime('%Y%m%d')}_{url_hash}.txt"
+
+
+def load_scraped_asins(cache_path):
+    """
+    Load ASINs recorded by an earlier run today
+    
+    Returns:
+        Set of ASINs (empty if there is no cache file yet)
+    """
+    try:
+        if cache_path.exists():
+            return {line.strip() for line in cache_path.read_text(encoding='utf-8').splitlines() if line.strip()}
+    except Exception as e:
+        print(f"[WARNING] Could not read ASIN cache '{cache_path}': {e}")
+    return set()
+
+
+def record_written_asins(rows):
+    """Append the ASINs of rows just written to Google Sheets to the ASIN cache"""
+    if _asin_cache_path is None:
+        return
+    asins = [row[2] for row in rows if len(row) > 2 and row[2]]
+    if not asins:
+        return
+    try:
+        _asin_cache_path.parent.mkdir(parents=True, exist_ok=True)
+        with _asin_cache_path.open('a', encoding='utf-8') as cache_file:
+            cache_file.write('\n'.join(asins) + '\n')
+    except Exception as e:
+        print(f"    [WARNING] Could not update ASIN cache: {e}")
+
+
+def _wait_for_sheets_write():
+    """
+    Wait for the background write in flight (if any)
+    
+    Returns:
+        True if it succeeded or nothing was in flight; False if it failed
+        (its rows are put back at the front of the buffer for a retry)
+    """
+    global _sheets_write
+    
+    if _sheets_write is None:
+        return True
+    
+    future, rows = _sheets_write
+    _sheets_write = None
+    try:
+        future.result()
+        print(f"    [INFO] Sent {len(rows)} buffered rows to Google Sheets")
+        return True
+    except Exception as e:
+        print(f"    [ERROR] Failed to append {len(rows)} rows to Google Sheets: {e}")
+        _pending_rows[:0] = rows
+        return False
+
+
+def flush_sheets(worksheet, background=False):
+    """
+    Send all buffered rows to Google Sheets in one API call
+    
+    Any earlier background write is finished first, so rows stay in order.
+    
+    Args:
+        worksheet: gspread worksheet object
+        background: Hand the write to a worker thread and return immediately
+            (the browser can keep scrolling while the HTTP call runs)
+        
+    Returns:
+        True if the buffer is empty afterwards, False if the write failed
+        (rows are kept so the next flush can retry them)
+    """
+    global _sheets_write
+    
+    previous_ok = _wait_for_sheets_write()
+    if not _pending_rows:
+        return previous_ok
+    
+    rows = list(_pending_rows)
+    _pending_rows.clear()
+    
+    if background:
+        _sheets_write = (_sheets_executor.submit(_write_sheet_rows, worksheet, rows), rows)
+        return True
+    
+    try:
+        _write_sheet_rows(worksheet, rows)
+        print(f"    [INFO] Sent {len(rows)} buffered rows to Google Sheets")
+        return True
+    except Exception as e:
+        print(f"    [ERROR] Failed to append {len(rows)} rows to Google Sheets: {e}")
+        _pending_rows[:0] = rows
+        return False
+
+
 def append_product_to_sheets(worksheet, product_rows, current_number):
     """
-    Append a single product (with all its quantity tiers) to Google Sheets immediately
+    Queue a single product (with all its quantity tiers) for Google Sheets
+    
+    Rows are buffered and sent in the background in batches of
+    SHEETS_BATCH_ROWS, or sooner once the oldest buffered row has waited
+    SHEETS_FLUSH_SECONDS (so the sheet keeps up on slow pages); call
+    flush_sheets() once scraping ends to send the remainder and wait.
     
     Args:
         worksheet: gspread worksheet object
@@ -648,6 +1333,8 @@ def append_product_to_sheets(worksheet, product_rows, current_number):
     Returns:
         Next product number to use, or None if failed
     """
+    global _pending_since
+    
     try:
         rows = []
         
@@ -668,14 +1355,19 @@ def append_product_to_sheets(worksheet, product_rows, current_number):
             ]
             rows.append(row)
         
-        # Append rows for this product
-        worksheet.append_rows(rows)
+        # Buffer rows for this product and send once the batch is full
+        if not _pending_rows:
+            _pending_since = time.monotonic()
+        _pending_rows.extend(rows)
+        if (len(_pending_rows) >= SHEETS_BATCH_ROWS
+                or time.monotonic() - _pending_since >= SHEETS_FLUSH_SECONDS):
+            flush_sheets(worksheet, background=True)
         
         # Return next number (increment only once per product, not per tier)
         return current_number + 1
         
     except Exception as e:
-        print(f"    [ERROR] Failed to append to Google Sheets: {e}")
+        print(f"    [ERROR] Failed to queue rows for Google Sheets: {e}")
         return None
 
 
@@ -683,42 +1375,108 @@ def append_product_to_sheets(worksheet, product_rows, current_number):
 # BROWSER AUTOMATION FUNCTIONS
 # ============================================================================
 
-def find_first_visible(page, selectors, timeout=5000):
-    """Find the first visible element from a list of selectors"""
-    for selector in selectors:
+def block_unneeded_resources(route):
+    """Abort BLOCKED_RESOURCE_TYPES and BLOCKED_URL_PATTERN requests, let the rest through"""
+    request = route.request
+    if request.resource_type in BLOCKED_RESOURCE_TYPES or BLOCKED_URL_PATTERN.match(request.url):
+        route.abort()
+    else:
+        route.continue_()
+
+
+# Index of the selector that matched last time, per selector list (tried first next call)
+_selector_winners = {}
+
+
+def find_first_visible(page, selectors, timeout=ACTION_TIMEOUT_MS):
+    """
+    Find the first visible element from a list of CSS selectors
+    
+    Waits up to timeout ms on one comma-joined union of the whole list, so
+    neither a miss nor a match late in the list costs one probe per selector.
+    The element is then picked in list priority order (the selector that
+    matched on the previous call for the same list is tried first).
+    
+    Returns:
+        Locator of the element, or None if nothing became visible in time
+    """
+    key = tuple(selectors)
+    union = page.locator(", ".join(key) + " >> visible=true").first
+    
+    # One auto-waiting query for the whole list
+    try:
+        union.wait_for(state="visible", timeout=timeout)
+    except PWTimeoutError:
+        return None
+    
+    winner = _selector_winners.get(key)
+    order = list(range(len(selectors)))
+    if winner is not None:
+        order.remove(winner)
+        order.insert(0, winner)
+    
+    for index in order:
         try:
-            locator = page.locator(selector)
+            locator = page.locator(selectors[index])
             if locator.count() > 0:
                 element = locator.first
-                if element.is_visible(timeout=timeout):
+                if element.is_visible():
+                    _selector_winners[key] = index
                     return element
         except Exception:
             continue
-    return None
+    # A visible match exists but lost a race with a re-render above; use the union's
+    return union
 
 
-def human_click(locator, delay_after=0.3):
+def human_click(locator, delay_after=0.3, fast=False):
     """
     Click with basic human-like mouse movement.
     Locator must resolve to exactly one element (use .first where needed).
+    With fast=True only the plain click is made (Playwright still scrolls the
+    element into view); use it where the caller already waits afterwards.
     """
+    if fast:
+        locator.click(timeout=ACTION_TIMEOUT_MS)
+        return
     try:
-        locator.scroll_into_view_if_needed(timeout=TIMEOUT_MS)
+        locator.scroll_into_view_if_needed(timeout=ACTION_TIMEOUT_MS)
     except Exception:
         pass
+    position = None
     try:
         box = locator.bounding_box()
         if box:
-            x = box["x"] + min(10, box["width"] / 2)
-            y = box["y"] + min(10, box["height"] / 2)
-            locator.page.mouse.move(x, y)
-            time.sleep(0.1)
+            position = {"x": min(10, box["width"] / 2), "y": min(10, box["height"] / 2)}
+            locator.page.mouse.move(box["x"] + position["x"], box["y"] + position["y"])
     except Exception:
         pass
-    locator.click()
+    # Click the same point through the locator, so Playwright's actionability and
+    # hit-target checks still catch overlays (passkey modal, sticky header)
+    if position:
+        locator.click(position=position, timeout=ACTION_TIMEOUT_MS)
+    else:
+        locator.click(timeout=ACTION_TIMEOUT_MS)
     time.sleep(delay_after)
 
 
+def wait_for_visible(page, selector, state="visible", timeout=ACTION_TIMEOUT_MS):
+    """
+    Wait until any element matching selector reaches state, instead of a fixed sleep
+    
+    Returns:
+        True if the state was reached, False on timeout (callers carry on as before)
+    """
+    try:
+        if state == "visible":
+            page.locator(f"{selector} >> visible=true").first.wait_for(state="visible", timeout=timeout)
+        else:
+            page.locator(selector).first.wait_for(state=state, timeout=timeout)
+        return True
+    except PWTimeoutError:
+        return False
+
+
 def wait_for_page_load(page, timeout=TIMEOUT_MS):
     """Wait for page to load"""
     try:
@@ -752,295 +1510,409 @@ def extract_number(text):
     """Extract numeric value from text (handles Japanese currency format)"""
     if not text:
         return None
-    # Remove currency symbols, commas, and extract number
-    cleaned = re.sub(r'[¥,円JPY\s]', '', text)
-    match = re.search(r'\d+(?:\.\d+)?', cleaned)
-    return match.group(0) if match else None
+    # Remove currency symbols, commas, and extract number
+    cleaned = CURRENCY_CHARS_PATTERN.sub('', text)
+    match = NUMBER_PATTERN.search(cleaned)
+    return match.group(0) if match else None
+
+
+# Highlights the card being scraped; parsed once, asin/name passed as arguments
+HIGHLIGHT_PRODUCT_JS = """
+(args) => {
+    const {asin, name} = args;
+    // Console logging for tracking
+    console.log('%c🔄 SCRAPING PRODUCT', 'background: #00FF00; color: #000; font-size: 16px; font-weight: bold; padding: 5px;');
+    console.log('ASIN: ' + asin);
+    console.log('Name: ' + name);
+    console.log('─'.repeat(60));
+    
+    // Remove previous highlights
+    document.querySelectorAll('.scraping-highlight').forEach(el => {
+        el.classList.remove('scraping-highlight');
+        el.style.border = '';
+        el.style.backgroundColor = '';
+    });
+    
+    // Find and highlight current product
+    const container = document.querySelector(`[data-asin="${CSS.escape(asin)}"]`)?.closest('.a-cardui, [data-a-card-type]');
+    if (container) {
+        container.classList.add('scraping-highlight');
+        container.style.border = '4px solid #00FF00';
+        container.style.backgroundColor = 'rgba(0, 255, 0, 0.1)';
+        container.style.transition = 'all 0.3s ease';
+        container.scrollIntoView({ behavior: 'smooth', block: 'center' });
+        
+        // Add label showing it's being scraped
+        const label = document.createElement('div');
+        label.style.cssText = 'position: absolute; top: 5px; left: 5px; background: #00FF00; color: black; padding: 8px 12px; font-weight: bold; z-index: 9999; border-radius: 6px; box-shadow: 0 2px 8px rgba(0,255,0,0.5); animation: pulse 1s infinite;';
+        label.innerHTML = '<span style="font-size: 14px;"></span>';
+        label.firstChild.textContent = '🔄 SCRAPING ASIN: ' + asin;
+        label.className = 'scraping-label';
+        
+        // Add pulse animation
+        if (!document.getElementById('scraping-animation-style')) {
+            const style = document.createElement('style');
+            style.id = 'scraping-animation-style';
+            style.textContent = `
+                @keyframes pulse {
+                    0%, 100% { transform: scale(1); }
+                    50% { transform: scale(1.05); }
+                }
+            `;
+            document.head.appendChild(style);
+        }
+        
+        // Remove old label if exists
+        const oldLabel = document.querySelector('.scraping-label');
+        if (oldLabel) oldLabel.remove();
+        
+        // Make container relative if not already
+        if (getComputedStyle(container).position === 'static') {
+            container.style.position = 'relative';
+        }
+        
+        container.appendChild(label);
+        
+        // Change to "COMPLETE" after scraping
+        setTimeout(() => {
+            if (label.parentNode) {
+                label.style.background = '#32CD32';
+                label.innerHTML = '<span style="font-size: 14px;">✅ COMPLETE</span>';
+            }
+            container.style.border = '2px solid #32CD32';
+            container.style.backgroundColor = 'rgba(50, 205, 50, 0.05)';
+        }, 1500);
+        
+        // Remove label after showing complete
+        setTimeout(() => {
+            if (label.parentNode) label.remove();
+        }, 3000);
+    }
+}
+"""
+
+
+def highlight_product_in_browser(page, asin, product_name=""):
+    """
+    Highlight the current product being scraped in the browser for visual feedback
+    Shows green highlight and "SCRAPING..." label on the product
+    
+    Args:
+        page: Playwright page object
+        asin: Product ASIN for identification (the card is found in-page by data-asin)
+        product_name: Product name for console logging (optional)
+    """
+    if not ENABLE_HIGHLIGHT:
+        return
+    
+    try:
+        # Inject JavaScript to highlight this product and log to console
+        page.evaluate(HIGHLIGHT_PRODUCT_JS, {"asin": asin, "name": (product_name or "Loading...")[:50]})
+    except Exception as e:
+        # Don't fail scraping if highlight fails
+        pass
+
+
+# Candidate selectors per field, tried in order inside LISTING_EXTRACT_JS
+LISTING_SELECTORS = {
+    'asin': '[data-asin]',
+    'name': [
+        'span.a-truncate-full.a-offscreen',
+        '.a-truncate-full',
+        'a[title]',  # Fallback: link title attribute
+        'h2 a span'
+    ],
+    'reference_price': [
+        '._dmFsd_retailPriceMobileInt_22uHn .a-offscreen',  # Mobile view
+        '._dmFsd_retailPriceInt_HVi7A .a-offscreen',  # Desktop view
+        'span.a-price.a-text-price[data-a-strike="true"] .a-offscreen',
+        '.a-text-price .a-offscreen',
+        'span[data-a-strike="true"] .a-offscreen'
+    ],
+    'discount': [
+        'span._dmFsd_savingsBadge_25xkz',  # Badge at top
+        'span._dmFsd_businessSavingsMobileInt_2V1aF',  # Mobile savings
+        'div._dmFsd_businessSavingsInt_2W0Iq'  # Desktop savings
+    ],
+    'discount_text_markers': ['OFF', '%'],  # Any span containing this text
+    'quantity_picker': 'div._dmFsd_quantityPicker_s7cKy',
+    'load_more': 'div._dmFsd_qpLoadMoreBtn_1uSIC',
+    'load_more_text': 'さらに読み込む',
+    'tier_item': 'ul._dmFsd_qpDropdown_2UuXs li._dmFsd_qpItem_3tHmj',
+    'tier_quantity': 'div._dmFsd_qpItemQuantity_3S1pu',
+    'base_price': [
+        'span.a-price._dmFsd_businessPriceMobileInt_3u3XJ .a-offscreen',  # Mobile business price
+        'span.a-price._dmFsd_businessPriceInt_oPUj8 .a-offscreen',  # Desktop business price
+        'span.a-price .a-offscreen:not([data-a-strike="true"])',  # Any non-strikethrough price
+        'span.a-price-whole'  # Price whole number
+    ],
+    # Amazon serves a mobile and a desktop card layout with different class names
+    'layout_markers': {
+        'mobile': '[class*="MobileInt_"]',
+        'desktop': '._dmFsd_retailPriceInt_HVi7A, ._dmFsd_businessPriceInt_oPUj8, ._dmFsd_businessSavingsInt_2W0Iq'
+    }
+}
+
+# Reads every field of one product card in a single in-page call.
+# Price/discount fields return the text of each candidate selector so Python
+# can keep the first one that contains a number (same order as before).
+LISTING_EXTRACT_JS = """
+(container, cfg) => {
+    const text = (el) => (el ? (el.innerText || el.textContent || '').trim() : '');
+    const firstText = (selectors) => {
+        for (const sel of selectors) {
+            const t = text(container.querySelector(sel));
+            if (t) return t;
+        }
+        return '';
+    };
+    const candidateTexts = (selectors) => selectors
+        .map(sel => container.querySelector(sel))
+        .filter(Boolean)
+        .map(text);
+    const isVisible = (el) => !!el && el.getClientRects().length > 0
+        && getComputedStyle(el).visibility !== 'hidden';
+
+    const asinElem = container.querySelector(cfg.asin);
+    let name = firstText(cfg.name);
+    if (!name) {
+        const titled = container.querySelector('a[title]');
+        name = titled ? (titled.getAttribute('title') || '') : '';
+    }
+
+    const discountTexts = candidateTexts(cfg.discount);
+    const spans = Array.from(container.querySelectorAll('span'));
+    for (const marker of cfg.discount_text_markers) {
+        const span = spans.find(s => (s.textContent || '').toUpperCase().includes(marker));
+        if (span) discountTexts.push(text(span));
+    }
+
+    let loadMore = container.querySelector(cfg.load_more);
+    if (!loadMore) {
+        loadMore = Array.from(container.querySelectorAll('button'))
+            .find(b => (b.textContent || '').includes(cfg.load_more_text)) || null;
+    }
+
+    const tiers = Array.from(container.querySelectorAll(cfg.tier_item)).map(li => {
+        const quantityDiv = li.querySelector(cfg.tier_quantity);
+        return {
+            // Visible text keeps the "+" suffix ("2+", "5+"); data attributes are fallbacks
+            quantity: text(quantityDiv ? quantityDiv.querySelector('span') : null)
+                || (quantityDiv ? quantityDiv.getAttribute('data-minimum-quantity') : '')
+                || li.getAttribute('data-minimum-quantity') || '',
+            price: li.getAttribute('data-numeric-value') || ''
+        };
+    });
+
+    let layout = '';
+    for (const [name, marker] of Object.entries(cfg.layout_markers)) {
+        if (container.querySelector(marker)) { layout = name; break; }
+    }
+
+    return {
+        layout: layout,
+        asin: asinElem ? (asinElem.getAttribute('data-asin') || '') : '',
+        name: name,
+        reference_price_texts: candidateTexts(cfg.reference_price),
+        discount_texts: discountTexts,
+        has_quantity_picker: !!container.querySelector(cfg.quantity_picker),
+        load_more_visible: isVisible(loadMore),
+        tiers: tiers,
+        base_price_texts: candidateTexts(cfg.base_price)
+    };
+}
+"""
+
+# Same extractor applied to every product card on the page in one call.
+# Cards returned with a valid ASIN are marked, so later passes (lazy loading keeps
+# earlier cards in the DOM) only read and transfer the new ones.
+ALL_LISTINGS_EXTRACT_JS = f"""
+([selector, cfg]) => {{
+    const containers = Array.from(document.querySelectorAll(selector));
+    const listings = [];
+    for (const container of containers) {{
+        if (container.hasAttribute('data-auto-extracted')) continue;
+        const listing = ({LISTING_EXTRACT_JS})(container, cfg);
+        if (listing.asin && listing.asin.length === 10) container.setAttribute('data-auto-extracted', '1');
+        listings.push(listing);
+    }}
+    return {{total: containers.length, listings: listings}};
+}}
+"""
+
+
+# ASIN of every product card on the page (None for cards without one)
+LISTING_ASINS_JS = """
+([selector, asinSelector]) => Array.from(document.querySelectorAll(selector))
+    .map(container => {
+        const asinElem = container.querySelector(asinSelector);
+        return asinElem ? asinElem.getAttribute('data-asin') : null;
+    })
+"""
+
+
+# Resolves as soon as more product cards than `previous` exist, or after timeoutMs
+WAIT_FOR_MORE_LISTINGS_JS = """
+([selector, previous, timeoutMs]) => new Promise(resolve => {
+    if (document.querySelectorAll(selector).length > previous) return resolve(true);
+    const observer = new MutationObserver(() => {
+        if (document.querySelectorAll(selector).length > previous) {
+            observer.disconnect();
+            resolve(true);
+        }
+    });
+    observer.observe(document.body, {childList: true, subtree: true});
+    setTimeout(() => { observer.disconnect(); resolve(false); }, timeoutMs);
+})
+"""
+
+
+def wait_for_more_listings(page, selector, previous_count, timeout_ms):
+    """
+    Wait until lazy loading adds product cards, up to timeout_ms
+    
+    Returns:
+        True if new cards appeared, False if the wait timed out
+    """
+    try:
+        return page.evaluate(WAIT_FOR_MORE_LISTINGS_JS, [selector, previous_count, timeout_ms])
+    except Exception:
+        time.sleep(timeout_ms / 1000)
+        return False
+
+
+def specialize_listing_selectors(layout):
+    """
+    Return a copy of LISTING_SELECTORS ordered for one card layout
+    
+    Selectors specific to the detected layout are tried first and those of the
+    other layout last; nothing is removed, so a layout switch still matches.
+    
+    Args:
+        layout: 'mobile' or 'desktop' (as reported by LISTING_EXTRACT_JS)
+    """
+    def layout_of(selector):
+        if 'MobileInt_' in selector:
+            return 'mobile'
+        if '_dmFsd_' in selector and 'Int_' in selector:
+            return 'desktop'
+        return ''
+    
+    def rank(selector):
+        selector_layout = layout_of(selector)
+        if selector_layout == layout:
+            return 0
+        return 2 if selector_layout else 1
+    
+    specialized = dict(LISTING_SELECTORS)
+    for field in ('reference_price', 'discount', 'base_price'):
+        specialized[field] = sorted(LISTING_SELECTORS[field], key=rank)  # stable: keeps order within a rank
+    return specialized
+
+
+def parse_price(price_text):
+    """Parse a price such as "¥1,234" or "1234.5" to float, or None if empty/invalid"""
+    if not price_text:
+        return None
+    try:
+        return float(price_text.replace('¥', '').replace(',', ''))
+    except ValueError:
+        return None
+
+
+def first_number(texts):
+    """Return the first number found in a list of candidate texts, or ''"""
+    for text in texts:
+        number = extract_number(text)
+        if number:
+            return number
+    return ''
 
 
-def highlight_product_in_browser(page, container, asin, product_name=""):
+def extract_listing(container):
     """
-    Highlight the current product being scraped in the browser for visual feedback
-    Shows green highlight and "SCRAPING..." label on the product
+    Read one product card with a single in-page call, expanding hidden tiers first
     
     Args:
-        page: Playwright page object
-        container: Product container element
-        asin: Product ASIN for identification
-        product_name: Product name for console logging (optional)
+        container: Playwright locator for product card container
+        
+    Returns:
+        Dictionary of raw listing fields (see LISTING_EXTRACT_JS)
     """
-    try:
-        # Inject JavaScript to highlight this product and log to console
-        page.evaluate(f"""
-            (function() {{
-                // Console logging for tracking
-                console.log('%c🔄 SCRAPING PRODUCT', 'background: #00FF00; color: #000; font-size: 16px; font-weight: bold; padding: 5px;');
-                console.log('ASIN: {asin}');
-                console.log('Name: {product_name[:50] if product_name else "Loading..."}');
-                console.log('─'.repeat(60));
-                
-                // Remove previous highlights
-                document.querySelectorAll('.scraping-highlight').forEach(el => {{
-                    el.classList.remove('scraping-highlight');
-                    el.style.border = '';
-                    el.style.backgroundColor = '';
-                }});
-                
-                // Find and highlight current product
-                const container = document.querySelector('[data-asin="{asin}"]')?.closest('.a-cardui, [data-a-card-type]');
-                if (container) {{
-                    container.classList.add('scraping-highlight');
-                    container.style.border = '4px solid #00FF00';
-                    container.style.backgroundColor = 'rgba(0, 255, 0, 0.1)';
-                    container.style.transition = 'all 0.3s ease';
-                    container.scrollIntoView({{ behavior: 'smooth', block: 'center' }});
-                    
-                    // Add label showing it's being scraped
-                    const label = document.createElement('div');
-                    label.style.cssText = 'position: absolute; top: 5px; left: 5px; background: #00FF00; color: black; padding: 8px 12px; font-weight: bold; z-index: 9999; border-radius: 6px; box-shadow: 0 2px 8px rgba(0,255,0,0.5); animation: pulse 1s infinite;';
-                    label.innerHTML = '<span style="font-size: 14px;">🔄 SCRAPING ASIN: {asin}</span>';
-                    label.className = 'scraping-label';
-                    
-                    // Add pulse animation
-                    if (!document.getElementById('scraping-animation-style')) {{
-                        const style = document.createElement('style');
-                        style.id = 'scraping-animation-style';
-                        style.textContent = `
-                            @keyframes pulse {{
-                                0%, 100% {{ transform: scale(1); }}
-                                50% {{ transform: scale(1.05); }}
-                            }}
-                        `;
-                        document.head.appendChild(style);
-                    }}
-                    
-                    // Remove old label if exists
-                    const oldLabel = document.querySelector('.scraping-label');
-                    if (oldLabel) oldLabel.remove();
-                    
-                    // Make container relative if not already
-                    if (getComputedStyle(container).position === 'static') {{
-                        container.style.position = 'relative';
-                    }}
-                    
-                    container.appendChild(label);
-                    
-                    // Change to "COMPLETE" after scraping
-                    setTimeout(() => {{
-                        if (label.parentNode) {{
-                            label.style.background = '#32CD32';
-                            label.innerHTML = '<span style="font-size: 14px;">✅ COMPLETE</span>';
-                        }}
-                        container.style.border = '2px solid #32CD32';
-                        container.style.backgroundColor = 'rgba(50, 205, 50, 0.05)';
-                    }}, 1500);
-                    
-                    // Remove label after showing complete
-                    setTimeout(() => {{
-                        if (label.parentNode) label.remove();
-                    }}, 3000);
-                }}
-            }})();
-        """)
-        time.sleep(0.3)  # Brief pause to show highlight
-    except Exception as e:
-        # Don't fail scraping if highlight fails
-        pass
+    listing = container.evaluate(LISTING_EXTRACT_JS, LISTING_SELECTORS, timeout=ACTION_TIMEOUT_MS)
+    
+    # IMPORTANT: "Load More" (さらに読み込む) hides extra quantity tiers until clicked
+    if listing.get('load_more_visible'):
+        try:
+            asin = listing.get('asin', '')
+            print(f"    [INFO] Found 'Load More' button - clicking to reveal all quantity tiers for ASIN {asin}")
+            load_more_button = container.locator(
+                f'{LISTING_SELECTORS["load_more"]}, button:has-text("{LISTING_SELECTORS["load_more_text"]}")'
+            ).first
+            load_more_button.scroll_into_view_if_needed(timeout=2000)
+            load_more_button.click(timeout=2000)
+            time.sleep(0.8)  # Wait for additional tiers to load
+            print(f"    [SUCCESS] Loaded additional quantity tiers")
+            listing = container.evaluate(LISTING_EXTRACT_JS, LISTING_SELECTORS, timeout=ACTION_TIMEOUT_MS)
+        except Exception as e:
+            print(f"    [DEBUG] Load More button not clickable or not visible: {e}")
+    
+    return listing
 
 
-def scrape_product_from_listing(container):
+def scrape_product_from_listing(container, listing=None):
     """
     Scrape product details directly from listing page container
     Creates multiple rows for quantity-based pricing tiers
-    Uses robust selectors with fallbacks
+    Uses robust selectors with fallbacks (see LISTING_SELECTORS)
     
     Args:
         container: Playwright locator for product card container
+        listing: Fields already read by ALL_LISTINGS_EXTRACT_JS (optional); the
+            card is re-read only if it has a "Load More" button to expand
         
     Returns:
         List of dictionaries (one per quantity tier), or empty list if failed
     """
     try:
+        if listing is None or listing.get('load_more_visible'):
+            listing = extract_listing(container)
+        
         products_data = []
         timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
         
-        # ===== Extract ASIN (CRITICAL) =====
-        asin = ''
-        try:
-            # Try multiple ways to get ASIN
-            asin_selectors = [
-                '[data-asin]',
-                '[data-asin]:not([data-asin=""])',
-                'div[data-asin]',
-                'section[data-asin]'
-            ]
-            for selector in asin_selectors:
-                asin_elem = container.locator(selector).first
-                if asin_elem.count() > 0:
-                    asin = asin_elem.get_attribute('data-asin')
-                    if asin and len(asin) == 10:  # ASIN is always 10 characters
-                        break
-        except Exception as e:
-            print(f"    [DEBUG] ASIN extraction error: {e}")
-        
+        # ===== ASIN (CRITICAL) =====
+        asin = listing.get('asin', '')
         if not asin:
             return []  # Can't proceed without ASIN
         
-        # ===== Extract Product Name (IMPORTANT) =====
-        name = ''
-        try:
-            # Try multiple selectors for product name
-            name_selectors = [
-                'span.a-truncate-full.a-offscreen',
-                '.a-truncate-full',
-                'a[title]',  # Fallback: link title attribute
-                'h2 a span'
-            ]
-            for selector in name_selectors:
-                name_elem = container.locator(selector).first
-                if name_elem.count() > 0:
-                    name = name_elem.inner_text().strip()
-                    if name:
-                        break
-            
-            # Fallback: try getting from title attribute
-            if not name:
-                title_elem = container.locator('a[title]').first
-                if title_elem.count() > 0:
-                    name = title_elem.get_attribute('title')
-        except Exception as e:
-            print(f"    [DEBUG] Name extraction error: {e}")
-        
-        # ===== Extract Reference Price (Individual/Retail Price - 個人向け価格) =====
-        reference_price = ''
-        try:
-            # Comprehensive selectors for reference price (strikethrough price)
-            ref_selectors = [
-                '._dmFsd_retailPriceMobileInt_22uHn .a-offscreen',  # Mobile view
-                '._dmFsd_retailPriceInt_HVi7A .a-offscreen',  # Desktop view
-                'span.a-price.a-text-price[data-a-strike="true"] .a-offscreen',
-                '.a-text-price .a-offscreen',
-                'span[data-a-strike="true"] .a-offscreen'
-            ]
-            for selector in ref_selectors:
-                ref_elem = container.locator(selector).first
-                if ref_elem.count() > 0:
-                    ref_text = ref_elem.inner_text().strip()
-                    reference_price = extract_number(ref_text)
-                    if reference_price:
-                        break
-        except Exception as e:
-            print(f"    [DEBUG] Reference price extraction error: {e}")
+        # ===== Product Name, Reference Price (個人向け価格), Base Discount Rate =====
+        name = listing.get('name', '')
+        reference_price = first_number(listing.get('reference_price_texts', []))
+        discount_rate_base = first_number(listing.get('discount_texts', []))
         
-        # ===== Extract Base Discount Rate (from badge or savings text) =====
-        discount_rate_base = ''
-        try:
-            discount_selectors = [
-                'span._dmFsd_savingsBadge_25xkz',  # Badge at top
-                'span._dmFsd_businessSavingsMobileInt_2V1aF',  # Mobile savings
-                'div._dmFsd_businessSavingsInt_2W0Iq',  # Desktop savings
-                'span:has-text("OFF")',  # Any span with "OFF" text
-                'span:has-text("%")'  # Any span with percentage
-            ]
-            for selector in discount_selectors:
-                discount_elem = container.locator(selector).first
-                if discount_elem.count() > 0:
-                    discount_text = discount_elem.inner_text().strip()
-                    discount_rate_base = extract_number(discount_text)
-                    if discount_rate_base:
-                        break
-        except Exception as e:
-            print(f"    [DEBUG] Discount rate extraction error: {e}")
+        # ===== Quantity Tiers (KEY FEATURE) =====
+        if not listing.get('has_quantity_picker'):
+            print(f"    [DEBUG] No quantity picker found for ASIN {asin}")
         
-        # ===== Extract Quantity Tiers (KEY FEATURE) =====
         quantity_tiers = []
-        try:
-            # First, try to ensure the quantity dropdown is accessible
-            # Some dropdowns might need to be expanded first
-            quantity_picker = container.locator('div._dmFsd_quantityPicker_s7cKy').first
-            if quantity_picker.count() == 0:
-                print(f"    [DEBUG] No quantity picker found for ASIN {asin}")
-            
-            # IMPORTANT: Check for "Load More" button (さらに読み込む) and click it to reveal all tiers
-            # The button appears when there are more quantity tiers to load
-            load_more_button = container.locator('div._dmFsd_qpLoadMoreBtn_1uSIC, button:has-text("さらに読み込む")').first
-            if load_more_button.count() > 0:
-                try:
-                    # Check if button is visible and clickable (not display:none)
-                    if load_more_button.is_visible(timeout=500):
-                        print(f"    [INFO] Found 'Load More' button - clicking to reveal all quantity tiers for ASIN {asin}")
-                        load_more_button.scroll_into_view_if_needed(timeout=2000)
-                        load_more_button.click(timeout=2000)
-                        time.sleep(0.8)  # Wait for additional tiers to load
-                        print(f"    [SUCCESS] Loaded additional quantity tiers")
-                except Exception as e:
-                    print(f"    [DEBUG] Load More button not clickable or not visible: {e}")
-            
-            # Find quantity picker items (hidden dropdown with data attributes)
-            tier_items = container.locator('ul._dmFsd_qpDropdown_2UuXs li._dmFsd_qpItem_3tHmj').all()
-            
-            for tier_item in tier_items:
-                try:
-                    # Extract quantity (minimum quantity for this tier)
-                    # IMPORTANT: Read from nested div FIRST (the <li> element always has "1")
-                    quantity = None
-                    
-                    # Primary method: Get from visible text to preserve "+" symbol
-                    # This captures "1", "2+", "5+", "10+", "15+", "20+" exactly as displayed
-                    quantity_text = tier_item.locator('div._dmFsd_qpItemQuantity_3S1pu span').first
-                    if quantity_text.count() > 0:
-                        text = quantity_text.inner_text().strip()
-                        # Keep the text as-is to preserve "+" symbol (e.g., "2+", "5+", "10+")
-                        quantity = text
-                    
-                    # Fallback: Get from data attribute (but this loses the "+" symbol)
-                    if not quantity:
-                        quantity_div = tier_item.locator('div._dmFsd_qpItemQuantity_3S1pu').first
-                        if quantity_div.count() > 0:
-                            quantity = quantity_div.get_attribute('data-minimum-quantity')
-                    
-                    # Fallback 2: Try from <li> element (though this is usually wrong)
-                    if not quantity:
-                        quantity = tier_item.get_attribute('data-minimum-quantity')
-                    
-                    # Extract price for this tier (numeric value without formatting)
-                    tier_price = tier_item.get_attribute('data-numeric-value')
-                    
-                    if quantity and tier_price:
-                        # Clean up the price value and add ¥ symbol
-                        tier_price_clean = tier_price.replace(',', '').replace('.00', '')
-                        tier_price_with_yen = f"¥{tier_price_clean}"
-                        
-                        quantity_tiers.append({
-                            'quantity': quantity,
-                            'unit_price': tier_price_with_yen
-                        })
-                        print(f"      [DEBUG] Tier found: Qty={quantity}, Price={tier_price_with_yen}")
-                except Exception as e:
-                    print(f"      [DEBUG] Error extracting tier: {e}")
-                    continue
-        except Exception as e:
-            print(f"    [DEBUG] Quantity tiers extraction error: {e}")
+        for tier in listing.get('tiers', []):
+            quantity = tier.get('quantity')
+            tier_price = tier.get('price')
+            if quantity and tier_price:
+                # Clean up the price value and add ¥ symbol
+                tier_price_clean = tier_price.replace(',', '').replace('.00', '')
+                tier_price_with_yen = f"¥{tier_price_clean}"
+                
+                quantity_tiers.append({
+                    'quantity': quantity,
+                    'unit_price': tier_price_with_yen
+                })
+                print(f"      [DEBUG] Tier found: Qty={quantity}, Price={tier_price_with_yen}")
         
-        # ===== Fallback: If no quantity tiers found, get base price =====
+        # ===== Fallback: If no quantity tiers found, use base price =====
         if not quantity_tiers:
-            base_price = ''
-            try:
-                base_price_selectors = [
-                    'span.a-price._dmFsd_businessPriceMobileInt_3u3XJ .a-offscreen',  # Mobile business price
-                    'span.a-price._dmFsd_businessPriceInt_oPUj8 .a-offscreen',  # Desktop business price
-                    'span.a-price .a-offscreen:not([data-a-strike="true"])',  # Any non-strikethrough price
-                    'span.a-price-whole'  # Price whole number
-                ]
-                for selector in base_price_selectors:
-                    price_elem = container.locator(selector).first
-                    if price_elem.count() > 0:
-                        price_text = price_elem.inner_text().strip()
-                        base_price = extract_number(price_text)
-                        if base_price:
-                            break
-            except Exception as e:
-                print(f"    [DEBUG] Base price extraction error: {e}")
+            base_price = first_number(listing.get('base_price_texts', []))
             
             # Create single tier with quantity 1
             if base_price:
@@ -1055,13 +1927,15 @@ def scrape_product_from_listing(container):
         else:
             print(f"    [INFO] Found {len(quantity_tiers)} quantity tiers for ASIN {asin}")
         
+        # Product-level values shared by every tier (parsed/formatted once)
+        reference_price_with_yen = f"¥{reference_price}" if reference_price else ''
+        base_discount_text = f"{discount_rate_base}%" if discount_rate_base else ''
+        ref = parse_price(reference_price)
+        
         for idx, tier in enumerate(quantity_tiers):
             # Debug: Show what's in each tier
             print(f"      Tier {idx+1}: Qty={tier.get('quantity', 'MISSING')}, Price={tier.get('unit_price', 'MISSING')}")
             
-            # Add ¥ symbol to reference price if it exists
-            reference_price_with_yen = f"¥{reference_price}" if reference_price else ''
-            
             # Only fill product info (timestamp, ASIN, name) for the FIRST tier
             # Subsequent tiers have these fields blank
             product_data = {
@@ -1077,22 +1951,14 @@ def scrape_product_from_listing(container):
             }
             
             # Calculate discount rate and amount for this tier
-            tier_unit_price = tier.get('unit_price', '')
-            if reference_price and tier_unit_price:
-                try:
-                    ref = float(reference_price)
-                    # Remove ¥ symbol from unit price for calculation
-                    curr = float(tier_unit_price.replace('¥', '').replace(',', ''))
-                    discount_amount = ref - curr
-                    discount_rate = (discount_amount / ref) * 100 if ref > 0 else 0
-                    product_data['discount_rate'] = f"{discount_rate:.1f}%"
-                    product_data['discount_amount'] = f"¥{discount_amount:.0f}"
-                except Exception as e:
-                    print(f"      [DEBUG] Discount calculation error: {e}")
-                    product_data['discount_rate'] = f"{discount_rate_base}%" if discount_rate_base else ''
-                    product_data['discount_amount'] = ''
+            curr = parse_price(tier.get('unit_price', ''))
+            if ref is not None and curr is not None:
+                discount_amount = ref - curr
+                discount_rate = (discount_amount / ref) * 100 if ref > 0 else 0
+                product_data['discount_rate'] = f"{discount_rate:.1f}%"
+                product_data['discount_amount'] = f"¥{discount_amount:.0f}"
             else:
-                product_data['discount_rate'] = f"{discount_rate_base}%" if discount_rate_base else ''
+                product_data['discount_rate'] = base_discount_text
                 product_data['discount_amount'] = ''
             
             products_data.append(product_data)
@@ -1100,58 +1966,87 @@ def scrape_product_from_listing(container):
         return products_data
         
     except Exception as e:
-        print(f"    [ERROR] Failed to scrape product from listing: {e}")
-        import traceback
-        traceback.print_exc()
+        print(f"    [ERROR] Failed to scrape product from listing: {type(e).__name__}: {e}")
+        if DEBUG_TRACEBACKS:
+            traceback.print_exc()
         return []
 
 
+# Enabled "next page" link of the results pagination
+NEXT_PAGE_SELECTOR = 'a.s-pagination-next:not(.s-pagination-disabled), li.a-last:not(.a-disabled) a'
+
+
 def scrape_all_products(page, worksheet, current_number):
     """
     Scrape all products directly from the filtered results page
-    Sends each product to Google Sheets IMMEDIATELY after scraping (real-time)
+    Queues each product for Google Sheets after scraping (sent in batches)
     Scrolls gradually and scrapes products as they appear (NO separate page opens)
     Creates multiple rows for products with quantity-based pricing tiers
     
     Args:
         page: Playwright page object
-        worksheet: gspread worksheet object for real-time updates
+        worksheet: gspread worksheet object for batched updates
         current_number: Starting product number for sequential numbering
         
     Returns:
-        Number of unique products scraped
+        Number of unique products sent by this run (ASINs cached from an
+        earlier run today are not counted)
     """
+    global _asin_cache_path
+    
     print("\n" + "="*60)
-    print("STEP 4: SCRAPING & SENDING TO SHEETS (REAL-TIME)")
+    print("STEP 4: SCRAPING & SENDING TO SHEETS (BATCHED)")
     print("="*60)
     
+    products_sent = 0  # Products queued for the sheet by this run (cached ASINs excluded)
+    
     try:
-        scraped_asins = set()  # Track already scraped ASINs
+        # Track already scraped ASINs (including those a restarted run sent earlier today)
+        _asin_cache_path = get_asin_cache_path(page.url)
+        scraped_asins = load_scraped_asins(_asin_cache_path)
+        cached_asin_count = len(scraped_asins)
+        if cached_asin_count:
+            print(f"[INFO] Skipping {cached_asin_count} products already sent earlier today ({_asin_cache_path})")
         total_rows_sent = 0  # Track total rows sent
         scroll_count = 0
         no_new_products_count = 0  # Counter for consecutive scrolls with no new products
         max_consecutive_no_products = 5  # Stop after 5 scrolls with no new products
         
-        print("\n[INFO] Starting real-time scrape-and-send process...")
-        print("[INFO] Each product sent to Google Sheets immediately after scraping")
+        print("\n[INFO] Starting scrape-and-send process...")
+        print(f"[INFO] Rows sent to Google Sheets in batches of {SHEETS_BATCH_ROWS}")
         print("[INFO] Products scraped directly from listing (no page opens)")
         print("[INFO] Multiple rows created for quantity-based pricing")
         print("[INFO] Will continue until no more products are found")
         print("="*60 + "\n")
         
+        listing_selectors = LISTING_SELECTORS  # Re-ordered once the card layout is known
+        
         while True:  # Scrape until no more products found
-            # Find currently visible product containers
+            # Read every visible product card in one in-page call
             # Robust selector: try multiple patterns
-            product_containers = page.locator("div.a-cardui._dmFsd_cardItem_1LFgv[data-a-card-type='basic']").all()
+            # (cards already read on an earlier pass are skipped in-page, before any extraction)
+            container_selector = "div.a-cardui._dmFsd_cardItem_1LFgv[data-a-card-type='basic']"
+            extracted = page.evaluate(ALL_LISTINGS_EXTRACT_JS, [container_selector, listing_selectors])
             
             # Fallback selector if primary doesn't work
-            if len(product_containers) == 0:
-                product_containers = page.locator("div.a-cardui._dmFsd_cardItem_1LFgv").all()
+            if extracted['total'] == 0:
+                container_selector = "div.a-cardui._dmFsd_cardItem_1LFgv"
+                extracted = page.evaluate(ALL_LISTINGS_EXTRACT_JS, [container_selector, listing_selectors])
+            
+            card_count = extracted['total']
+            listings = extracted['listings']
+            
+            # Specialize the selector order for this session's layout (first card that shows one)
+            if listing_selectors is LISTING_SELECTORS:
+                layout = next((item['layout'] for item in listings if item.get('layout')), '')
+                if layout:
+                    listing_selectors = specialize_listing_selectors(layout)
+                    print(f"[INFO] Detected {layout} card layout - trying its selectors first")
             
-            if len(product_containers) == 0:
+            if card_count == 0:
                 print(f"[Scroll {scroll_count + 1}] No product containers found yet, scrolling...")
                 page.mouse.wheel(0, 500)
-                time.sleep(1.5)
+                wait_for_more_listings(page, "div.a-cardui._dmFsd_cardItem_1LFgv", 0, 1500)
                 scroll_count += 1
                 
                 # Safeguard: don't scroll infinitely if page structure changed
@@ -1164,22 +2059,22 @@ def scrape_all_products(page, worksheet, current_number):
             # Scrape new products from visible containers
             new_products_found = 0
             
-            for container in product_containers:
+            for listing in listings:
                 try:
-                    # Check if this container has an ASIN (to verify it's a product)
-                    asin_elem = container.locator('[data-asin]').first
-                    if asin_elem.count() == 0:
-                        continue
-                    
-                    asin = asin_elem.get_attribute('data-asin')
+                    # Check if this container has an ASIN (to verify it's a product);
+                    # ASINs sent by an earlier run today are filtered here in Python
+                    asin = listing.get('asin')
                     if not asin or asin in scraped_asins or len(asin) != 10:
                         continue
                     
                     # Mark as scraped
                     scraped_asins.add(asin)
                     
-                    # Scrape product data first (to get name for highlight)
-                    product_rows = scrape_product_from_listing(container)
+                    # Build rows from the batch read (the card is only re-read to expand tiers)
+                    container = page.locator(container_selector).filter(
+                        has=page.locator(f'[data-asin="{asin}"]')
+                    ).first
+                    product_rows = scrape_product_from_listing(container, listing)
                     
                     if product_rows:
                         # Get product name from first row
@@ -1187,23 +2082,24 @@ def scrape_all_products(page, worksheet, current_number):
                         product_name = first_row.get('name', 'Unknown')
                         
                         # Highlight this product in the browser (visual feedback)
-                        highlight_product_in_browser(page, container, asin, product_name)
+                        highlight_product_in_browser(page, asin, product_name)
                         
-                        # Send to Google Sheets IMMEDIATELY
+                        # Queue for Google Sheets (flushed in batches)
                         new_number = append_product_to_sheets(worksheet, product_rows, current_number)
                         
                         if new_number:
                             # Success!
                             new_products_found += 1
+                            products_sent += 1
                             total_rows_sent += len(product_rows)
                             current_number = new_number
                             
                             # Show progress in terminal with quantity details
                             quantities = [row.get('quantity', '?') for row in product_rows]
                             print(f"  ✓ [{current_number - 1}] {asin} - {product_name[:50]}...")
-                            print(f"     Quantities: {', '.join(quantities)} → {len(product_rows)} rows SENT")
+                            print(f"     Quantities: {', '.join(quantities)} → {len(product_rows)} rows queued")
                         else:
-                            print(f"  ✗ Failed to send ASIN {asin} to sheets")
+                            print(f"  ✗ Failed to queue ASIN {asin} for sheets")
                     else:
                         print(f"  ⚠ No data extracted for ASIN {asin}")
                     
@@ -1215,7 +2111,7 @@ def scrape_all_products(page, worksheet, current_number):
             if new_products_found > 0:
                 no_new_products_count = 0  # Reset counter
                 print(f"\n[Scroll {scroll_count + 1}] Processed {new_products_found} new products")
-                print(f"[INFO] Total: {len(scraped_asins)} products | {total_rows_sent} rows sent to sheets\n")
+                print(f"[INFO] Total: {products_sent} products | {total_rows_sent} rows sent to sheets\n")
             else:
                 no_new_products_count += 1
                 print(f"[Scroll {scroll_count + 1}] No new products found")
@@ -1230,13 +2126,29 @@ def scrape_all_products(page, worksheet, current_number):
                         break
                     
                     # Check for pagination - if there's a "Next" button, click it
-                    next_button = page.locator('a.s-pagination-next:not(.s-pagination-disabled), li.a-last:not(.a-disabled) a').first
+                    next_button = page.locator(NEXT_PAGE_SELECTOR).first
                     if next_button.count() > 0 and next_button.is_visible(timeout=1000):
-                        print("\n[INFO] Found 'Next Page' button - clicking to load more products...")
-                        next_button.click()
-                        time.sleep(3)  # Wait for next page to load
+                        next_href = next_button.get_attribute('href', timeout=ACTION_TIMEOUT_MS)
+                        if next_href:
+                            # Open the next page's URL directly instead of clicking and waiting
+                            print("\n[INFO] Found 'Next Page' link - opening it to load more products...")
+                            page.goto(urljoin(page.url, next_href), wait_until="domcontentloaded")
+                            wait_for_more_listings(page, container_selector, 0, 3000)
+                        else:
+                            print("\n[INFO] Found 'Next Page' button - clicking to load more products...")
+                            next_button.click(timeout=ACTION_TIMEOUT_MS)
+                            time.sleep(3)  # Wait for next page to load
                         no_new_products_count = 0  # Reset counter after loading new page
                         continue
+                    
+                    # Already at the bottom with nothing new twice in a row: lazy loading is
+                    # done, so go straight to the final verification instead of 3 more scrolls
+                    at_bottom = page.evaluate(
+                        "() => window.innerHeight + window.scrollY >= document.body.scrollHeight - 2"
+                    )
+                    if at_bottom and no_new_products_count >= 2:
+                        print("[INFO] Reached the bottom of the page with no new products")
+                        no_new_products_count = max_consecutive_no_products
                 except Exception:
                     pass
                 
@@ -1250,18 +2162,19 @@ def scrape_all_products(page, worksheet, current_number):
                     time.sleep(2)
                     
                     # Check one more time for new products
-                    final_check_containers = page.locator("div.a-cardui._dmFsd_cardItem_1LFgv[data-a-card-type='basic']").all()
+                    # (one in-page call for all ASINs instead of a lookup per container)
+                    try:
+                        final_check_asins = page.evaluate(
+                            LISTING_ASINS_JS,
+                            ["div.a-cardui._dmFsd_cardItem_1LFgv[data-a-card-type='basic']", LISTING_SELECTORS['asin']]
+                        )
+                    except Exception:
+                        final_check_asins = []
                     final_new_found = 0
-                    for container in final_check_containers:
-                        try:
-                            asin_elem = container.locator('[data-asin]').first
-                            if asin_elem.count() > 0:
-                                asin = asin_elem.get_attribute('data-asin')
-                                if asin and asin not in scraped_asins and len(asin) == 10:
-                                    final_new_found += 1
-                                    break
-                        except:
-                            continue
+                    for asin in final_check_asins:
+                        if asin and asin not in scraped_asins and len(asin) == 10:
+                            final_new_found += 1
+                            break
                     
                     if final_new_found > 0:
                         print(f"[INFO] Found {final_new_found} more products on final check - continuing...")
@@ -1273,24 +2186,34 @@ def scrape_all_products(page, worksheet, current_number):
             # Scroll down to load more products
             print(f"[INFO] Scrolling down to load more products...")
             page.mouse.wheel(0, 800)  # Increased scroll distance for faster loading
-            time.sleep(2)  # Increased wait time for lazy loading
+            # Continue as soon as lazy loading adds cards (2s ceiling when nothing loads)
+            wait_for_more_listings(page, container_selector, card_count, 2000)
             scroll_count += 1
         
+        # Send whatever is still buffered before reporting
+        if not flush_sheets(worksheet):
+            print(f"[WARNING] {len(_pending_rows)} rows could not be sent to Google Sheets")
+        
         print("\n" + "="*60)
         print(f"[SUCCESS] Scraping & sending completed!")
-        print(f"[INFO] Unique products: {len(scraped_asins)}")
+        print(f"[INFO] Unique products: {products_sent}")
+        if cached_asin_count:
+            print(f"[INFO] Skipped (sent by an earlier run today): {cached_asin_count}")
         print(f"[INFO] Total rows sent: {total_rows_sent}")
         print(f"[INFO] Total scrolls: {scroll_count}")
         print(f"[INFO] View at: {SPREADSHEET_URL}")
         print("="*60)
         
-        return len(scraped_asins)
+        return products_sent
         
     except Exception as e:
         print(f"\n[ERROR] Failed to scrape products: {e}")
-        import traceback
         traceback.print_exc()
-        return len(scraped_asins) if scraped_asins else 0
+        return products_sent
+    
+    finally:
+        # Make sure buffered rows are not lost on errors or Ctrl+C
+        flush_sheets(worksheet)
 
 
 def login_to_amazon(page, context):
@@ -1309,13 +2232,18 @@ def login_to_amazon(page, context):
     print("STEP 1: AMAZON LOGIN")
     print("="*60)
     
+    # Background Gmail OTP poll, started as soon as sign-in is submitted
+    otp_executor = ThreadPoolExecutor(max_workers=1)
+    otp_stop = threading.Event()
+    
     try:
         # Navigate to login page (Japanese site)
         print("\n[1/5] Navigating to Amazon Japan login page...")
         # Use the specific login URL provided in configuration
         login_url = AMAZON_LOGIN_URL
         page.goto(login_url, wait_until="domcontentloaded", timeout=TIMEOUT_MS)
-        time.sleep(2)
+        # Continue once the email field (or the passkey modal) is shown
+        wait_for_visible(page, f"{EMAIL_CSS}, {PASSKEY_CLOSE_CSS}")
         
         # Language check removed to respect the specific login URL parameters
         
@@ -1325,11 +2253,11 @@ def login_to_amazon(page, context):
         print("\n[INFO] Checking for Passkey modal...")
         try:
             # Look for "Close" button (閉じる) in modal
-            close_btn = page.locator('button:has-text("閉じる"), [aria-label="閉じる"], button:has-text("Close")').first
+            close_btn = page.locator(PASSKEY_CLOSE_CSS).first
             if close_btn.is_visible(timeout=3000):
                 print("[INFO] Passkey modal detected. Closing...")
                 human_click(close_btn)
-                time.sleep(1)
+                wait_for_visible(page, PASSKEY_CLOSE_CSS, state="hidden")
                 print("[SUCCESS] Closed Passkey modal")
                 
                 # After closing, look for "Login" button if needed (as per instructions)
@@ -1337,8 +2265,8 @@ def login_to_amazon(page, context):
                 login_btn = page.locator('a:has-text("ログイン"), button:has-text("ログイン"), a:has-text("Login"), button:has-text("Login")').first
                 if login_btn.is_visible(timeout=2000):
                     print("[INFO] Clicking Login button after modal close...")
-                    human_click(login_btn)
-                    time.sleep(2)
+                    human_click(login_btn, fast=True)
+                    wait_for_visible(page, EMAIL_CSS)
             else:
                 print("[INFO] No Passkey modal found")
         except Exception as e:
@@ -1351,7 +2279,6 @@ def login_to_amazon(page, context):
             raise RuntimeError("Could not find email input field")
         
         email_input.fill(AMAZON_EMAIL)
-        time.sleep(0.5)
         print(f"[SUCCESS] Entered email: {AMAZON_EMAIL}")
         
         # Set up dialog handler BEFORE clicking continue to handle passkey alert
@@ -1376,9 +2303,8 @@ def login_to_amazon(page, context):
         continue_btn = find_first_visible(page, CONTINUE_SELECTORS)
         if continue_btn:
             print("[INFO] Clicking continue button...")
-            human_click(continue_btn, delay_after=0.5)
-            wait_for_page_load(page)
-            time.sleep(1)  # Reduced wait time
+            human_click(continue_btn, fast=True)
+            wait_for_page_load(page)  # The password wait below auto-waits for the next page
             
         # Check if dialog was handled
         if dialog_handled:
@@ -1402,41 +2328,16 @@ def login_to_amazon(page, context):
         
         password_accessible = False
         max_wait_time = 120  # 2 minutes maximum wait
-        check_interval = 1   # Check every 1 second
-        elapsed_time = 0
+        wait_start = time.time()
         
-        while not password_accessible and elapsed_time < max_wait_time:
-            try:
-                # Try to find and interact with password field
-                password_test = find_first_visible(page, PASSWORD_SELECTORS, timeout=1000)
-                
-                if password_test:
-                    # Test if we can actually type in it (not just find it)
-                    try:
-                        # Try to focus and test typing
-                        password_test.focus(timeout=1000)
-                        password_test.press_sequentially("", timeout=1000)  # Test typing capability
-                        
-                        # If we got here, field is truly accessible
-                        password_accessible = True
-                        print(f"\n[SUCCESS] Password field is accessible after {elapsed_time} seconds!")
-                        break
-                        
-                    except Exception:
-                        # Field exists but can't interact (modal blocking)
-                        pass
-                
-                # Wait and check again
-                time.sleep(check_interval)
-                elapsed_time += check_interval
-                
-                # Print status every 5 seconds
-                if elapsed_time % 5 == 0 and elapsed_time > 0:
-                    print(f"[INFO] Still waiting... ({elapsed_time}s elapsed - please close any modals)")
-                    
-            except Exception as e:
-                time.sleep(check_interval)
-                elapsed_time += check_interval
+        try:
+            # One auto-waiting locator over all password selectors: returns the moment
+            # the field becomes visible instead of probing it every second
+            page.locator(f"{PASSWORD_CSS} >> visible=true").first.wait_for(state="visible", timeout=max_wait_time * 1000)
+            password_accessible = True
+            print(f"\n[SUCCESS] Password field is accessible after {time.time() - wait_start:.0f} seconds!")
+        except PWTimeoutError:
+            pass
         
         if password_accessible:
             print("[SUCCESS] Password field confirmed accessible - continuing automatically")
@@ -1451,26 +2352,14 @@ def login_to_amazon(page, context):
         
         # Enter password (with retry after modal close)
         print("\n[3/5] Entering password...")
-        password_input = None
-        for retry in range(5):  # Try up to 5 times
-            password_input = find_first_visible(page, PASSWORD_SELECTORS, timeout=3000)
-            if password_input:
-                print(f"[SUCCESS] Password field found (attempt {retry + 1}/5)")
-                break
-            else:
-                if retry < 4:
-                    print(f"[INFO] Password field not found yet, waiting 1 second... (attempt {retry + 1}/5)")
-                    time.sleep(1)
-                else:
-                    raise RuntimeError("Could not find password input field after closing modal")
-        
+        password_input = find_first_visible(page, PASSWORD_SELECTORS)
         if not password_input:
-            raise RuntimeError("Could not find password input field")
+            raise RuntimeError("Could not find password input field after closing modal")
+        print("[SUCCESS] Password field found")
         
         # Clear any existing text and enter password
         password_input.clear()
         password_input.fill(AMAZON_PASSWORD)
-        time.sleep(0.5)
         print("[SUCCESS] Entered password")
         
         
@@ -1479,13 +2368,27 @@ def login_to_amazon(page, context):
         if not signin_btn:
             raise RuntimeError("Could not find sign-in button")
         
+        # Snapshot Gmail history before Amazon sends the OTP mail
+        otp_history_id = get_gmail_history_id()
+        
+        def start_otp_polling():
+            """Start watching Gmail for the OTP in a background thread"""
+            return otp_executor.submit(get_amazon_otp_from_gmail, max_age_minutes=10,
+                                       start_history_id=otp_history_id, stop_event=otp_stop)
+        
         print("[INFO] Clicking sign-in button...")
-        human_click(signin_btn, delay_after=0.5)
+        human_click(signin_btn, delay_after=0)
+        # Amazon sends the OTP mail on submit: poll Gmail while the page loads
+        print("[INFO] Watching Gmail for the OTP in the background...")
+        otp_future = start_otp_polling()
         wait_for_page_load(page)
         
-        # Quick wait for page to process
+        # Wait until Amazon leaves the sign-in form (OTP, verification or home page)
         print("[INFO] Waiting for Amazon to process login...")
-        time.sleep(3)  # Reduced wait time for faster execution
+        try:
+            page.wait_for_url(lambda url: "/ap/signin" not in url, timeout=ACTION_TIMEOUT_MS)
+        except PWTimeoutError:
+            pass
         print("[SUCCESS] Sign-in button clicked")
         
         
@@ -1501,86 +2404,74 @@ def login_to_amazon(page, context):
             print("Amazon is asking for additional verification.")
             print("Waiting automatically for verification to complete...")
             print("="*60)
-            # Wait automatically for user to complete verification (up to 2 minutes)
-            print("[INFO] Waiting up to 2 minutes for verification...")
-            for wait_attempt in range(24):  # 24 * 5 seconds = 2 minutes
-                time.sleep(5)
-                current_url = page.url
-                if "cvf/approval" not in current_url and "cvf/verify" not in current_url:
-                    print(f"[SUCCESS] Verification completed (waited {wait_attempt * 5} seconds)")
-                    break
-                if wait_attempt % 6 == 0:  # Print every 30 seconds
-                    print(f"[INFO] Still waiting... ({wait_attempt * 5} seconds elapsed)")
-            else:
+            # Wait automatically for user to complete verification (up to 2 minutes),
+            # returning as soon as Amazon navigates away from the challenge
+            print(f"[INFO] Waiting up to {CVF_WAIT_TIMEOUT_MS // 60000} minutes for verification...")
+            wait_start = time.time()
+            try:
+                page.wait_for_url(lambda u: "cvf/" not in u, timeout=CVF_WAIT_TIMEOUT_MS)
+                page.wait_for_load_state("domcontentloaded", timeout=TIMEOUT_MS)
+                print(f"[SUCCESS] Verification completed (waited {int(time.time() - wait_start)} seconds)")
+            except PWTimeoutError:
                 print("[WARNING] Verification timeout - continuing anyway...")
-            time.sleep(2)
             current_url = page.url
+            # A long verification can outlast the background poll's deadline
+            if otp_future.done() and not otp_future.result():
+                otp_future = start_otp_polling()
         
         # Check for OTP page (quick check for faster execution)
         print("\n[4/5] Checking for two-factor authentication...")
-        print("[INFO] Waiting for OTP input field to appear (up to 10 seconds)...")
-        
-        otp_input = None
-        for retry in range(3):  # Try 3 times with 3 second intervals = 9 seconds total
-            otp_input = find_first_visible(page, OTP_SELECTORS, timeout=3000)
-            if otp_input:
-                print(f"[SUCCESS] OTP input field found (attempt {retry + 1}/3)")
-                break
-            else:
-                if retry < 2:
-                    print(f"[INFO] OTP field not found yet, waiting 3 seconds... (attempt {retry + 1}/3)")
-                    time.sleep(3)
-                else:
-                    print("[INFO] OTP input field not found after 10 seconds - assuming not required")
+        print(f"[INFO] Waiting for OTP input field to appear (up to {OTP_FIELD_TIMEOUT_MS // 1000} seconds)...")
+        
+        # One auto-waiting union over all candidates returns as soon as any is shown
+        otp_input = find_first_visible(page, OTP_SELECTORS, timeout=OTP_FIELD_TIMEOUT_MS)
+        
+        if otp_input:
+            print("[SUCCESS] OTP input field found")
+        else:
+            print(f"[INFO] OTP input field not found after {OTP_FIELD_TIMEOUT_MS // 1000} seconds - assuming not required")
         
         if otp_input:
             print("[INFO] Two-factor authentication required")
             
-            # Wait for email to arrive before searching
-            print("[INFO] Waiting 5 seconds for OTP email to arrive...")
-            time.sleep(5)
-            
-            # AUTOMATIC OTP RETRIEVAL with longer retry time and more attempts
-            print("[INFO] Starting automatic OTP retrieval from Gmail...")
-            otp_code = get_amazon_otp_from_gmail(max_age_minutes=10, max_retries=20, retry_delay=5)
+            # AUTOMATIC OTP RETRIEVAL - usually already found by the background poll
+            print("[INFO] Waiting for automatic OTP retrieval from Gmail...")
+            otp_code = otp_future.result(timeout=OTP_POLL_DEADLINE_SECONDS + 30)
             
             if not otp_code:
-                # Retry with longer wait time
-                print("\n[WARNING] OTP not found in first attempt")
-                print("[INFO] Waiting additional 30 seconds and retrying...")
-                time.sleep(30)
-                otp_code = get_amazon_otp_from_gmail(max_age_minutes=10, max_retries=10, retry_delay=5)
-                
-                if not otp_code:
-                    print("\n" + "="*60)
-                    print("[ERROR] AUTOMATIC OTP RETRIEVAL FAILED")
-                    print("="*60)
-                    print("Could not retrieve OTP code automatically.")
-                    print("Please check your Gmail inbox for the verification code.")
-                    print("="*60)
-                    raise RuntimeError("Failed to retrieve OTP code from Gmail")
+                print("\n" + "="*60)
+                print("[ERROR] AUTOMATIC OTP RETRIEVAL FAILED")
+                print("="*60)
+                print("Could not retrieve OTP code automatically.")
+                print("Please check your Gmail inbox for the verification code.")
+                print("="*60)
+                raise RuntimeError("Failed to retrieve OTP code from Gmail")
             
             print(f"\n[INFO] Entering OTP: {otp_code}")
             # Clear any existing text and enter OTP code
             otp_input.clear()
             otp_input.fill(otp_code)
-            time.sleep(0.5)
             print(f"[SUCCESS] OTP code entered: {otp_code}")
             
             # Submit OTP
             print("[INFO] Looking for OTP submit button...")
-            otp_submit = find_first_visible(page, OTP_SUBMIT_SELECTORS, timeout=5000)
+            otp_submit = find_first_visible(page, OTP_SUBMIT_SELECTORS)
             if otp_submit:
                 print("[INFO] Found OTP submit button. Clicking...")
                 human_click(otp_submit, delay_after=1.0)
                 wait_for_page_load(page)
-                time.sleep(3)
+                # Wait until Amazon leaves the /ap/ authentication pages
+                try:
+                    page.wait_for_url(lambda url: "/ap/" not in url, timeout=ACTION_TIMEOUT_MS)
+                except PWTimeoutError:
+                    pass
                 print("[SUCCESS] OTP submitted")
             else:
                 print("[WARNING] OTP submit button not found")
                 raise RuntimeError("Could not find OTP submit button")
         else:
             print("[INFO] No two-factor authentication required")
+            otp_stop.set()
         
         # Verify login success
         print("\n[5/5] Verifying login...")
@@ -1608,9 +2499,185 @@ def login_to_amazon(page, context):
         
     except Exception as e:
         print(f"\n[ERROR] Login failed: {e}")
-        import traceback
         traceback.print_exc()
         return False
+    
+    finally:
+        # Never leave the Gmail poll running past the login
+        otp_stop.set()
+        otp_executor.shutdown(wait=False)
+
+
+# True once the pre-click results card has been replaced or the page has moved on
+RESULTS_REPLACED_JS = "([card, url]) => !card.isConnected || location.href !== url"
+
+
+def snapshot_results(page):
+    """
+    Remember the current results before a filter/sort click
+    
+    Returns:
+        (first results card handle or None, page URL) for wait_for_results_refresh
+    """
+    try:
+        card = page.query_selector(RESULTS_CARD_SELECTOR)
+    except PWError:
+        card = None
+    return card, page.url
+
+
+def wait_for_results_refresh(page, modal_button_selector, snapshot, timeout=TIMEOUT_MS):
+    """
+    Wait for a filter/sort change to re-render the results, instead of a fixed sleep
+    
+    The old page already has cards and a loaded document, so the wait is for
+    the card taken in snapshot to detach (or the URL to change) first.
+    
+    Args:
+        page: Playwright page object
+        modal_button_selector: Selector of the button that was clicked (hidden once the modal closes)
+        snapshot: snapshot_results(page) taken before the click
+        timeout: Maximum wait in milliseconds
+    """
+    wait_for_visible(page, modal_button_selector, state="hidden", timeout=ACTION_TIMEOUT_MS)
+    card, previous_url = snapshot
+    # Without an old card, the card wait below cannot be satisfied by stale results
+    if card is not None:
+        try:
+            page.wait_for_function(RESULTS_REPLACED_JS, arg=[card, previous_url], timeout=timeout)
+        except PWTimeoutError:
+            print("[WARNING] Results were not replaced in time, continuing...")
+        except PWError:
+            pass  # A navigation destroyed the old document, which is the refresh itself
+        finally:
+            try:
+                card.dispose()
+            except PWError:
+                pass
+    try:
+        page.wait_for_load_state("domcontentloaded", timeout=timeout)
+    except PWTimeoutError:
+        print("[WARNING] Page load timeout, continuing...")
+    if not wait_for_visible(page, RESULTS_CARD_SELECTOR, timeout=timeout):
+        print("[WARNING] Results did not re-render in time, continuing...")
+
+
+# Scrolls a filter option into view and clicks its checkbox/radio (else label, else itself)
+# in the page; returns false if the input is still unchecked afterwards
+JS_CLICK_OPTION_JS = """
+(option) => {
+    option.scrollIntoView({ block: 'center', behavior: 'instant' });
+    const input = option.querySelector("input[type='checkbox'], input[type='radio']");
+    if (input && input.checked) return true;
+    (input || option.querySelector('label') || option).click();
+    return input ? input.checked : true;
+}
+"""
+
+
+def js_click(locator):
+    """
+    Scroll to and click a filter option in one evaluate call
+    
+    Returns:
+        True if the option is selected afterwards
+    """
+    return bool(locator.evaluate(JS_CLICK_OPTION_JS, timeout=ACTION_TIMEOUT_MS))
+
+
+def safe_click(page, selector, label, timeout=ACTION_TIMEOUT_MS, indent="    "):
+    """
+    Wait for a filter option and select it with js_click
+    
+    The visibility wait replaces the separate count() guard; the scroll and
+    click then happen in one round trip. A click that leaves the option
+    unchecked is reported instead of being masked by force=True.
+    
+    Returns:
+        True if the element was clicked, False otherwise
+    """
+    locator = page.locator(selector)
+    try:
+        locator.wait_for(state="visible", timeout=timeout)
+    except PWTimeoutError:
+        print(f"{indent}[WARNING] {label} not found")
+        return False
+    try:
+        if not js_click(locator):
+            print(f"{indent}[ERROR] {label} is still unselected after clicking")
+            return False
+        print(f"{indent}[SUCCESS] {label} selected")
+        return True
+    except Exception as e:
+        print(f"{indent}[ERROR] Failed to select {label}: {e}")
+        return False
+
+
+# Clicks every filter option (given as XPaths) in one evaluate call. The click goes to the
+# option's checkbox/radio input when there is one, else its label, else the div itself.
+# Returns the XPaths that were not found or did not end up checked.
+SELECT_FILTER_OPTIONS_JS = """
+(xpaths) => xpaths.filter(xpath => {
+    const option = document.evaluate(
+        xpath, document, null, XPathResult.FIRST_ORDERED_NODE_TYPE, null
+    ).singleNodeValue;
+    if (!option) return true;
+    const input = option.querySelector("input[type='checkbox'], input[type='radio']");
+    if (input && input.checked) return false;
+    (input || option.querySelector('label') || option).click();
+    return input ? !input.checked : false;
+})
+"""
+
+
+def select_filter_options(page, options, indent="    "):
+    """
+    Select several options of an open filter modal with one browser-side click pass
+    
+    Options the bulk pass misses (not rendered yet, or not checked after the
+    click) are retried one by one with safe_click.
+    
+    Args:
+        page: Playwright page object
+        options: List of (selector, label) with "xpath=" selectors
+        
+    Returns:
+        Number of options selected
+    """
+    # The modal renders its options together; wait for the first one only
+    wait_for_visible(page, options[0][0])
+    xpaths = [selector[len("xpath="):] if selector.startswith("xpath=") else selector
+              for selector, _ in options]
+    try:
+        missed = set(page.evaluate(SELECT_FILTER_OPTIONS_JS, xpaths))
+    except Exception as e:
+        print(f"{indent}[WARNING] Bulk selection failed, selecting one by one: {e}")
+        missed = set(xpaths)
+    
+    selected = 0
+    for (selector, label), xpath in zip(options, xpaths):
+        if xpath not in missed:
+            print(f"{indent}[SUCCESS] {label} selected")
+            selected += 1
+        elif safe_click(page, selector, label, indent=indent):
+            selected += 1
+    return selected
+
+
+def click_when_visible(page, selector, timeout=ACTION_TIMEOUT_MS):
+    """
+    Wait for a button and click it with human_click
+    
+    Returns:
+        True if the button was clicked, False if it never became visible
+    """
+    locator = page.locator(selector)
+    try:
+        locator.wait_for(state="visible", timeout=timeout)
+    except PWTimeoutError:
+        return False
+    human_click(locator, delay_after=0)
+    return True
 
 
 def apply_filters_and_sort(page):
@@ -1632,177 +2699,62 @@ def apply_filters_and_sort(page):
         # ========== STEP 1: SELECT CATEGORIES ==========
         print("\n[1/5] Opening category dropdown...")
         
-        category_dropdown = page.locator(CATEGORY_DROPDOWN_BUTTON)
-        if category_dropdown.count() > 0:
-            human_click(category_dropdown, delay_after=1.5)
+        if click_when_visible(page, CATEGORY_DROPDOWN_BUTTON):
             print("[SUCCESS] Category dropdown opened")
         else:
             print("[ERROR] Category dropdown not found")
             return False
         
-        # Scroll down in the modal to view all categories
-        print("\n[INFO] Scrolling within category modal to view all options...")
-        try:
-            # Wait a moment for modal to fully render
-            time.sleep(1)
-            
-            # Scroll down within the modal using mouse wheel
-            # Multiple scroll attempts to ensure we can see all categories
-            for i in range(5):
-                page.mouse.wheel(0, 200)  # Scroll down 200 pixels
-                time.sleep(0.3)
-            
-            print("[SUCCESS] Scrolled through category modal")
-            
-            # Scroll back up a bit to ensure all three target categories are visible
-            for i in range(2):
-                page.mouse.wheel(0, -100)  # Scroll up 100 pixels
-                time.sleep(0.2)
-            
-            time.sleep(0.5)
-            print("[INFO] Category modal ready for selection")
-            
-        except Exception as e:
-            print(f"[WARNING] Could not scroll modal: {e}")
-        
-        # Select the three categories using exact XPaths
+        # Select the three categories using exact XPaths, all in one browser-side pass
         print("\n[2/5] Selecting 3 categories...")
-        
-        # Category 1: IT関連機器 (IT-related equipment)
-        print("  [1/3] Selecting IT-related equipment...")
-        it_checkbox = page.locator(CATEGORY_IT_EQUIPMENT)
-        if it_checkbox.count() > 0:
-            try:
-                # Scroll element into view before clicking
-                it_checkbox.scroll_into_view_if_needed(timeout=3000)
-                time.sleep(0.3)
-                # Click the div container
-                it_checkbox.click(force=True, timeout=3000)
-                time.sleep(0.5)
-                print("    [SUCCESS] IT-related equipment selected")
-            except Exception as e:
-                print(f"    [ERROR] Failed to select IT equipment: {e}")
-        else:
-            print("    [WARNING] IT-related equipment checkbox not found")
-        
-        # Category 2: 医療用品・消耗品 (Medical supplies and consumables)
-        print("  [2/3] Selecting Medical supplies and consumables...")
-        medical_checkbox = page.locator(CATEGORY_MEDICAL_SUPPLIES)
-        if medical_checkbox.count() > 0:
-            try:
-                # Scroll element into view before clicking
-                medical_checkbox.scroll_into_view_if_needed(timeout=3000)
-                time.sleep(0.3)
-                # Click the div container
-                medical_checkbox.click(force=True, timeout=3000)
-                time.sleep(0.5)
-                print("    [SUCCESS] Medical supplies selected")
-            except Exception as e:
-                print(f"    [ERROR] Failed to select medical supplies: {e}")
-        else:
-            print("    [WARNING] Medical supplies checkbox not found")
-        
-        # Category 3: 日用品・食品・飲料 (Daily necessities, food, and beverages)
-        print("  [3/3] Selecting Daily necessities, food, and beverages...")
-        daily_checkbox = page.locator(CATEGORY_DAILY_NECESSITIES)
-        if daily_checkbox.count() > 0:
-            try:
-                # Scroll element into view before clicking
-                daily_checkbox.scroll_into_view_if_needed(timeout=3000)
-                time.sleep(0.3)
-                # Click the div container
-                daily_checkbox.click(force=True, timeout=3000)
-                time.sleep(0.5)
-                print("    [SUCCESS] Daily necessities selected")
-            except Exception as e:
-                print(f"    [ERROR] Failed to select daily necessities: {e}")
-        else:
-            print("    [WARNING] Daily necessities checkbox not found")
+        select_filter_options(page, [
+            (CATEGORY_IT_EQUIPMENT, "IT-related equipment"),           # IT関連機器
+            (CATEGORY_MEDICAL_SUPPLIES, "Medical supplies"),           # 医療用品・消耗品
+            (CATEGORY_DAILY_NECESSITIES, "Daily necessities"),         # 日用品・食品・飲料
+        ])
         
         # Click "Show Results" button for categories
         print("\n[INFO] Clicking 'Show Results' button for categories...")
-        category_show_results = page.locator(CATEGORY_SHOW_RESULTS_BUTTON)
-        if category_show_results.count() > 0:
-            try:
-                category_show_results.scroll_into_view_if_needed(timeout=3000)
-                time.sleep(0.3)
-            except:
-                pass
-            human_click(category_show_results, delay_after=2.0)
+        results_before = snapshot_results(page)
+        if click_when_visible(page, CATEGORY_SHOW_RESULTS_BUTTON):
             print("[SUCCESS] Categories applied - waiting for page to reload...")
-            time.sleep(2)  # Wait for page to process category filter
+            wait_for_results_refresh(page, CATEGORY_SHOW_RESULTS_BUTTON, results_before)
         else:
             print("[ERROR] Category 'Show Results' button not found")
             return False
         
         # ========== STEP 2: SELECT DISCOUNT FILTER ==========
         print("\n[3/5] Opening discount dropdown...")
-        discount_dropdown = page.locator(DISCOUNT_DROPDOWN_BUTTON)
-        if discount_dropdown.count() > 0:
-            human_click(discount_dropdown, delay_after=1.5)
+        if click_when_visible(page, DISCOUNT_DROPDOWN_BUTTON):
             print("[SUCCESS] Discount dropdown opened")
         else:
             print("[ERROR] Discount dropdown not found")
             return False
         
-        # No need to scroll for 5% option as it's at the top
-        print("\n[INFO] Discount modal opened, 5% option should be visible...")
-        try:
-            # Wait a moment for modal to fully render
-            time.sleep(1)
-            print("[SUCCESS] Discount modal ready")
-            
-        except Exception as e:
-            print(f"[WARNING] Could not prepare discount modal: {e}")
-        
         # Select 5% discount radio button
         print("\n[4/5] Selecting 5% discount filter...")
-        discount_5_radio = page.locator(DISCOUNT_5_PERCENT_RADIO)
-        if discount_5_radio.count() > 0:
-            try:
-                # Scroll element into view before clicking
-                discount_5_radio.scroll_into_view_if_needed(timeout=3000)
-                time.sleep(0.3)
-                # Click the div container for 5% discount
-                discount_5_radio.click(force=True, timeout=3000)
-                time.sleep(0.5)
-                print("[SUCCESS] 5% discount filter selected")
-            except Exception as e:
-                print(f"[ERROR] Failed to select 5% discount: {e}")
-        else:
-            print("[WARNING] 5% discount radio button not found")
+        safe_click(page, DISCOUNT_5_PERCENT_RADIO, "5% discount filter", indent="")
         
         # Click "Show Results" button for discount
         print("\n[INFO] Clicking 'Show Results' button for discount...")
-        discount_show_results = page.locator(DISCOUNT_SHOW_RESULTS_BUTTON)
-        if discount_show_results.count() > 0:
-            try:
-                discount_show_results.scroll_into_view_if_needed(timeout=3000)
-                time.sleep(0.3)
-            except:
-                pass
-            human_click(discount_show_results, delay_after=2.0)
+        results_before = snapshot_results(page)
+        if click_when_visible(page, DISCOUNT_SHOW_RESULTS_BUTTON):
             print("[SUCCESS] Discount filter applied - waiting for page to reload...")
-            time.sleep(2)  # Wait for page to process discount filter
+            wait_for_results_refresh(page, DISCOUNT_SHOW_RESULTS_BUTTON, results_before)
         else:
             print("[ERROR] Discount 'Show Results' button not found")
             return False
         
         # ========== STEP 3: APPLY SORT ORDER ==========
         print("\n[5/5] Applying sort order (Business Discount: Descending)...")
-        sort_button = page.locator(SORT_DROPDOWN_BUTTON)
-        if sort_button.count() > 0:
-            human_click(sort_button, delay_after=1.5)
+        if click_when_visible(page, SORT_DROPDOWN_BUTTON):
             print("[SUCCESS] Sort dropdown opened")
             
-            # Wait for sort menu to fully appear
-            time.sleep(0.5)
-            
-            # Click "Business Discount: Descending" option
-            sort_option = page.locator(SORT_BUSINESS_DISCOUNT_DESC)
-            if sort_option.count() > 0:
-                human_click(sort_option, delay_after=1.5)
+            # Click "Business Discount: Descending" option once the menu shows it
+            results_before = snapshot_results(page)
+            if click_when_visible(page, SORT_BUSINESS_DISCOUNT_DESC):
                 print("[SUCCESS] Sort order applied (Business Discount: Descending)")
+                wait_for_results_refresh(page, SORT_BUSINESS_DISCOUNT_DESC, results_before)
             else:
                 print("[WARNING] Business Discount: Descending option not found")
         else:
@@ -1821,24 +2773,46 @@ def apply_filters_and_sort(page):
         
     except Exception as e:
         print(f"\n[ERROR] Failed to apply filters: {e}")
-        import traceback
         traceback.print_exc()
         return False
 
 
-def check_session_valid(page):
+def session_cookies_valid(storage_state, margin_seconds=60):
+    """
+    Check offline whether a saved storage state still holds an Amazon sign-in cookie
+    
+    Args:
+        storage_state: Parsed storage state dict (Playwright format)
+        margin_seconds: Treat cookies expiring this soon as already expired
+        
+    Returns:
+        True if at least one SESSION_AUTH_COOKIES cookie is unexpired
+    """
+    now = time.time()
+    for cookie in storage_state.get('cookies', []):
+        if cookie.get('name') not in SESSION_AUTH_COOKIES:
+            continue
+        expires = cookie.get('expires', -1)
+        # -1 marks a session cookie (no expiry of its own)
+        if expires == -1 or expires > now + margin_seconds:
+            return True
+    return False
+
+
+def check_session_valid(page, check_url="https://www.amazon.co.jp/"):
     """
     Check if saved session is still valid
     
     Args:
         page: Playwright page object
+        check_url: Page to open for the check (a sign-in-only page redirects to ap/signin)
         
     Returns:
         True if session is valid, False otherwise
     """
     try:
-        page.goto("https://www.amazon.co.jp/", wait_until="domcontentloaded", timeout=10000)
-        time.sleep(2)
+        # Sign-in redirects are server-side, so the URL is final once the DOM has loaded
+        page.goto(check_url, wait_until="domcontentloaded", timeout=10000)
         
         current_url = page.url
         # If we're not on sign-in page, session is likely valid
@@ -1878,18 +2852,22 @@ def run_automation():
     print(" "*10 + "AMAZON BUSINESS DISCOUNT AUTOMATION")
     print("="*70 + "\n")
 
+    # Google auth/network setup does not depend on the browser, so run it in the
+    # background while Chrome launches and logs in. Each call builds its own client;
+    # the Gmail call only refreshes token.json ahead of the OTP step. A first-run
+    # browser consent is taken one at a time (_oauth_consent_lock).
+    executor = ThreadPoolExecutor(max_workers=2)
+    sheets_future = executor.submit(initialize_google_sheets)
+    executor.submit(prewarm_gmail_service)
+    executor.shutdown(wait=False)
+
     with sync_playwright() as p:
         try:
-            print("[INIT] Launching Chrome browser (Japanese locale)...")
+            print(f"[INIT] Launching Chrome browser (Japanese locale, {'headless' if HEADLESS else 'visible'})...")
             browser = p.chromium.launch(
                 channel="chrome",
-                headless=False,
-                args=[
-                    "--disable-blink-features=AutomationControlled",
-                    "--no-sandbox",
-                    "--start-maximized",
-                    "--lang=ja-JP",
-                ],
+                headless=HEADLESS,
+                args=CHROME_LAUNCH_ARGS + (CHROME_HEADLESS_ARGS if HEADLESS else []),
             )
 
             session_path = Path(SESSION_FILE)
@@ -1900,8 +2878,11 @@ def run_automation():
                     raw = session_path.read_text(encoding="utf-8", errors="ignore").strip()
                     if not raw:
                         raise ValueError("session file is empty")
-                    json.loads(raw)  # validate JSON
-                    storage_state = str(session_path)
+                    # Parsed once here and handed over as a dict, so Playwright does not re-read the file
+                    storage_state = json.loads(raw)
+                    if not isinstance(storage_state, dict):
+                        storage_state = None
+                        raise ValueError("session file is not a storage state object")
                     print(f"[INFO] Loaded saved session: {SESSION_FILE}")
                 except Exception as e:
                     print(f"[WARNING] Ignoring invalid session file '{SESSION_FILE}': {e}")
@@ -1912,19 +2893,37 @@ def run_automation():
                     except Exception:
                         pass
 
+            # Headless has no window to maximize, so give it a fixed desktop viewport
+            viewport_options = {"viewport": {"width": 1280, "height": 800}} if HEADLESS else {"no_viewport": True}
             context = browser.new_context(
-                no_viewport=True,
+                **viewport_options,
+                reduced_motion="reduce",  # Skip CSS animations/transitions where the site honors it
                 locale="ja-JP",
                 timezone_id="Asia/Tokyo",
                 user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
                 storage_state=storage_state,
             )
+            # Skip images/media/fonts and ad/analytics hosts on every page of this context
+            context.route("**/*", block_unneeded_resources)
             page = context.new_page()
             print("[SUCCESS] Browser launched\n")
 
-            if storage_state and check_session_valid(page):
+            # Validate the saved session on the discounts page itself, so a warm
+            # session lands where the automation starts without a second navigation
+            on_discounts_page = False
+            if storage_state and not session_cookies_valid(storage_state):
+                # Expired sign-in cookies cannot pass the online check; don't spend a page load on it
+                print("[INFO] Saved session's sign-in cookies have expired.")
+                storage_state = None
+            if storage_state and check_session_valid(page, BUSINESS_DISCOUNTS_URL):
                 print("[SUCCESS] Using saved Amazon session.")
                 login_success = True
+                on_discounts_page = True
+                try:
+                    # Keep rotated cookies so the session stays valid for the next run
+                    context.storage_state(path=SESSION_FILE)
+                except Exception as e:
+                    print(f"[WARNING] Could not refresh session file: {e}")
             else:
                 if session_path.exists():
                     print("[INFO] Saved session is missing/expired; logging in again.")
@@ -1941,18 +2940,32 @@ def run_automation():
             print("\n" + "="*60)
             print("STEP: NAVIGATING TO BUSINESS DISCOUNTS")
             print("="*60)
-            page.goto(BUSINESS_DISCOUNTS_URL, wait_until="domcontentloaded", timeout=TIMEOUT_MS)
-            time.sleep(3)
+            if on_discounts_page:
+                print("[INFO] Already on Business Discounts (opened during session check)")
+            else:
+                page.goto(BUSINESS_DISCOUNTS_URL, wait_until="domcontentloaded", timeout=TIMEOUT_MS)
+            # Continue as soon as the filter bar is usable instead of a fixed sleep
+            if not wait_for_visible(page, CATEGORY_DROPDOWN_BUTTON, timeout=TIMEOUT_MS):
+                print("[WARNING] Filter controls not visible yet, continuing...")
             print("[SUCCESS] Business Discounts page loaded")
 
+            # Sheets setup runs in the background; if it has already failed, stop
+            # before spending time on filters and scraping rows nobody can receive
+            if sheets_future.done() and not sheets_future.result()[1]:
+                print("\n[ERROR] Failed to initialize Google Sheets.")
+                print("[INFO] Closing browser...")
+                browser.close()
+                return False
+
             apply_filters_and_sort(page)
 
-            # MILESTONE 2: Initialize Google Sheets and scrape products (real-time sending)
+            # MILESTONE 2: Initialize Google Sheets and scrape products (batched sending)
             print("\n" + "="*60)
             print("STEP: INITIALIZING GOOGLE SHEETS")
             print("="*60)
             
-            gc, worksheet, current_number = initialize_google_sheets()
+            # Started in the background at launch; usually already finished here
+            gc, worksheet, current_number = wait_for_sheets_setup(sheets_future)
             
             if not worksheet:
                 print("\n[ERROR] Failed to initialize Google Sheets.")
@@ -1964,7 +2977,7 @@ def run_automation():
             print(f"[INFO] Starting product number: {current_number}")
             print(f"[INFO] Spreadsheet: {SPREADSHEET_URL}")
             
-            # Scrape products and send to sheets in real-time
+            # Scrape products and send to sheets in batches
             print("\n" + "="*60)
             print("STEP: SCRAPING PRODUCTS (MILESTONE 2)")
             print("="*60)
@@ -1982,7 +2995,7 @@ def run_automation():
             print(" "*15 + "✓ ALL MILESTONES COMPLETED ✓")
             print("="*70)
             print(f"[SUCCESS] Scraped and sent {unique_products} products to Google Sheets")
-            print(f"[INFO] Data sent in real-time (row by row)")
+            print(f"[INFO] Data sent in batches of up to {SHEETS_BATCH_ROWS} rows")
             print(f"[INFO] View at: {SPREADSHEET_URL}")
             print("="*70)
 
@@ -1995,7 +3008,6 @@ def run_automation():
 
         except Exception as e:
             print(f"\n[ERROR] Automation failed: {e}")
-            import traceback
             traceback.print_exc()
             return False
 
@@ -2026,8 +3038,8 @@ def main():
     print("    6. Display product list")
     print("  Milestone 2:")
     print("    7. Initialize Google Sheets connection")
-    print("    8. Scrape products and send to Sheets IMMEDIATELY (real-time)")
-    print("    9. Each product sent row-by-row as it's scraped")
+    print("    8. Scrape products and queue them for Sheets")
+    print(f"    9. Rows sent in batches of {SHEETS_BATCH_ROWS} (remainder flushed at the end)")
     print("    10. Continue until no more products found")
     print("="*70 + "\n")
     
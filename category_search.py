@@ -9,13 +9,18 @@ import re
 import base64
 import time
 import sys
-import json
+import queue
+import threading
+import traceback
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
 
 # Check and import required packages
 try:
-    from playwright.sync_api import sync_playwright, TimeoutError as PWTimeoutError
+    from playwright.sync_api import sync_playwright, expect, Error as PWError, TimeoutError as PWTimeoutError
 except ImportError as e:
     print("\n" + "="*70)
     print("[ERROR] Playwright is not installed!")
@@ -69,6 +74,18 @@ except ImportError as e:
     print("="*70 + "\n")
     sys.exit(1)
 
+# Optional: C-backed HTML parser for OTP mails (regex scan is used without it)
+try:
+    from selectolax.parser import HTMLParser as SelectolaxHTMLParser
+except ImportError:
+    SelectolaxHTMLParser = None
+
+# Optional: linear-time RE2 engine for the OTP mail HTML scan (stdlib re is used without it)
+try:
+    import re2 as html_re
+except ImportError:
+    html_re = re
+
 # ============================================================================
 # CONFIGURATION
 # ============================================================================
@@ -94,6 +111,50 @@ if not AMAZON_PASSWORD:
 GMAIL_SCOPES = ['https://www.googleapis.com/auth/gmail.readonly']
 GMAIL_CREDENTIALS_FILE = Path('data/client_secret_446842116198-nke8rjis6iaeuagepsp9p5gvbsu2cte4.apps.googleusercontent.com.json')
 GMAIL_TOKEN_FILE = Path('token.json')
+GMAIL_TOKEN_REFRESH_MARGIN = timedelta(minutes=5)  # Refresh tokens this close to expiry (they live 60 min)
+GMAIL_BATCH_LIMIT = 100  # Maximum calls per Gmail batch HTTP request
+
+# Gmail search filter for Amazon sign-in verification mails (evaluated server-side;
+# from:amazon.co.jp covers account-update@, no-reply@, auto-confirm@, ...)
+GMAIL_OTP_QUERY = (
+    'from:amazon.co.jp subject:(確認コード OR 認証 OR サインイン OR "verification code" OR OTP) '
+    '-category:promotions'
+)
+GMAIL_OTP_MAX_RESULTS = 3
+
+# Subjects of Amazon sign-in code mails; anything else (orders, shipping, ...) is
+# rejected from its headers without downloading the body
+OTP_SUBJECT_PATTERN = re.compile(r'確認コード|認証|サインイン|verification|security|OTP', re.IGNORECASE)
+
+# OTP pattern for HTML mails (compiled once): a span whose whole text is 6 digits
+# (inline (?i) flag: RE2 and stdlib re both accept it)
+OTP_SPAN_PATTERN = html_re.compile(r'(?i)<span[^>]*>(\d{6})</span>')
+OTP_SPAN_BYTES_PATTERN = html_re.compile(rb'(?i)<span[^>]*>(\d{6})</span>')  # Same, on undecoded bodies
+OTP_SPAN_CONTEXT_CHARS = 500  # Markup before the span checked for the mail's table layout
+
+# Plain-text OTP patterns (compiled once): every keyword anchor in one
+# alternation so the body is walked once, then the bare-number fallback
+OTP_KEYWORD_PATTERN = re.compile(
+    r'(?:確認コード(?:は|:|：)?(?:次のとおりです)?\s*[:：]?\s*'
+    r'|verification\s+code(?:\s+is)?\s*[:：]?\s*'
+    r'|コード\s*[:：]\s*)(\d{6})',
+    re.IGNORECASE
+)
+OTP_STANDALONE_PATTERN = re.compile(r'(?:^|\s)(\d{6})(?:\s|$)', re.MULTILINE)  # Standalone 6-digit number
+
+# Cheap pre-check: a body without any 6-digit run cannot contain the OTP
+SIX_DIGIT_PATTERN = re.compile(r'\d{6}')
+SIX_DIGIT_BYTES_PATTERN = re.compile(rb'\d{6}')
+
+# Price/percentage parsing used by extract_number (compiled once)
+CURRENCY_CHARS_PATTERN = re.compile(r'[¥,円JPY\s]')
+NUMBER_PATTERN = re.compile(r'\d+(?:\.\d+)?')
+
+# Detects HTML in bodies of unknown type (single-part mail without a usable
+# mimeType) without lowercasing a copy; only the head of the body is searched
+HTML_MARKER_PATTERN = re.compile(r'<(?:html|body|table)', re.IGNORECASE)
+HTML_MARKER_BYTES_PATTERN = re.compile(rb'<(?:html|body|table)', re.IGNORECASE)
+HTML_SNIFF_CHARS = 2048
 
 # Google Sheets API settings
 SHEETS_SCOPES = [
@@ -107,6 +168,8 @@ SPREADSHEET_ID = "15GGtWSP1sdKXLUl9w0IB2fSfUHQoui5W3kWxG57-eEA"  # Extracted fro
 
 # Session file
 SESSION_FILE = "amazon_session.json"
+SESSION_CHECK_URL = "https://www.amazon.co.jp/gp/css/homepage.html"  # Redirects to ap/signin when logged out
+SESSION_VALID_TTL_SECONDS = 600  # Reuse a positive session check for this long
 
 # Amazon URLs (Japanese site)
 AMAZON_LOGIN_URL = "https://www.amazon.co.jp/ap/signin?openid.pape.max_auth_age=900&openid.return_to=https%3A%2F%2Fwww.amazon.co.jp%2Fgp%2Fyourstore%2Fhome%3Fpath%3D%252Fgp%252Fyourstore%252Fhome%26signIn%3D1%26useRedirectOnSuccess%3D1%26action%3Dsign-out%26ref_%3Dabn_yadd_sign_out&openid.assoc_handle=jpflex&openid.mode=checkid_setup&openid.ns=http%3A%2F%2Fspecs.openid.net%2Fauth%2F2.0"
@@ -122,6 +185,43 @@ SEARCH_KEYWORDS = [
 # Timeouts and delays
 TIMEOUT_MS = 30000
 DELAY_AFTER_CLICK = 2
+CVF_WAIT_TIMEOUT_MS = 120000  # Manual security verification (cvf/approval, cvf/verify)
+
+# Parallel keyword search: each worker searches in its own browser, seeded with the
+# logged-in storage state. Kept low so Amazon does not flag the traffic as a bot.
+KEYWORD_WORKERS = 3
+KEYWORD_START_STAGGER_SECONDS = 0.3  # Offset between the first workers' start times
+
+# Browser mode: visible by default because the passkey dialog is closed by hand.
+# Set HEADLESS=true in .env for unattended runs with a valid saved session.
+HEADLESS = os.getenv('HEADLESS', 'false').strip().lower() in ('1', 'true', 'yes')
+# Green "SCRAPING..." highlight per product; nobody sees it headless, so off there by default
+ENABLE_HIGHLIGHT = os.getenv('ENABLE_HIGHLIGHT', '0' if HEADLESS else '1').strip().lower() in ('1', 'true', 'yes')
+# Jump straight to the bottom of result pages instead of the visible step-by-step
+# scrolling (lazy loading only needs the bottom reached); on by default headless
+FAST_MODE = os.getenv('FAST_MODE', '1' if HEADLESS else '0').strip().lower() in ('1', 'true', 'yes')
+
+# Chrome launch flags and context options shared by the login and search browsers
+CHROME_LAUNCH_ARGS = [
+    "--disable-blink-features=AutomationControlled",
+    "--no-sandbox",
+    "--lang=ja-JP",
+]
+CHROME_WINDOW_ARGS = ["--start-maximized"]  # Visible runs only
+# Nothing is painted for a person headless, so the GPU process is only overhead there
+CHROME_HEADLESS_ARGS = ["--disable-gpu", "--disable-dev-shm-usage"]
+HEADLESS_VIEWPORT = {"width": 1280, "height": 800}  # Headless has no window to maximize
+CHROME_USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
+
+# Resource types aborted by every browser context (never read by the automation).
+# Stylesheets are kept: visibility checks, lazy loading and the manual passkey
+# dialog close all depend on the page layout.
+BLOCKED_RESOURCE_TYPES = {'image', 'media', 'font'}
+# Third-party ad/analytics hosts aborted regardless of type (Amazon's own scripts are
+# left alone: sign-in fraud checks load from them)
+BLOCKED_URL_PATTERN = re.compile(
+    r'^https?://[^/]*(?:amazon-adsystem\.com|doubleclick\.net|google-analytics\.com|googletagmanager\.com)[/:]'
+)
 
 # Selectors for Amazon login (Japanese site)
 EMAIL_SELECTORS = [
@@ -169,46 +269,132 @@ OTP_SUBMIT_SELECTORS = [
     "input#auth-signin-button"
 ]
 
+
+def css_union(selectors):
+    """Join the CSS entries of a selector list into one comma-separated selector"""
+    return ", ".join(s for s in selectors if not s.startswith("xpath="))
+
+
+# Precompiled CSS unions so each lookup is a single locator query; the
+# xpath= entries are only tried as a fallback when the union finds nothing
+EMAIL_SELECTOR_CSS = css_union(EMAIL_SELECTORS)
+CONTINUE_SELECTOR_CSS = css_union(CONTINUE_SELECTORS)
+PASSWORD_SELECTOR_CSS = css_union(PASSWORD_SELECTORS)
+SIGNIN_SELECTOR_CSS = css_union(SIGNIN_SELECTORS)
+OTP_SELECTOR_CSS = css_union(OTP_SELECTORS)
+OTP_SUBMIT_SELECTOR_CSS = css_union(OTP_SUBMIT_SELECTORS)
+SELECTOR_CSS_UNIONS = {
+    tuple(EMAIL_SELECTORS): EMAIL_SELECTOR_CSS,
+    tuple(CONTINUE_SELECTORS): CONTINUE_SELECTOR_CSS,
+    tuple(PASSWORD_SELECTORS): PASSWORD_SELECTOR_CSS,
+    tuple(SIGNIN_SELECTORS): SIGNIN_SELECTOR_CSS,
+    tuple(OTP_SELECTORS): OTP_SELECTOR_CSS,
+    tuple(OTP_SUBMIT_SELECTORS): OTP_SUBMIT_SELECTOR_CSS,
+}
+
+# Passkey modal close button and the login link shown after closing it
+PASSKEY_CLOSE_SELECTOR = 'button:has-text("閉じる"), [aria-label="閉じる"], button:has-text("Close")'
+LOGIN_LINK_SELECTOR = 'a:has-text("ログイン"), button:has-text("ログイン"), a:has-text("Login"), button:has-text("Login")'
+
 # Selectors for search functionality
 SEARCH_INPUT = "xpath=/html/body/div[1]/header/div/div[1]/div[2]/div[1]/form/div[2]/div[1]/input"
 SEARCH_BUTTON = "xpath=/html/body/div[1]/header/div/div[1]/div[2]/div[1]/form/div[3]/div/span/input"
 
+# Builds the URL the header search form would submit for a keyword (its action plus
+# all of its fields, hidden filters included), so a search is one page.goto().
+# Returns null when the form is not a plain GET form; the caller then types and clicks.
+SEARCH_FORM_URL_JS = """
+(input, keyword) => {
+  const form = input.form;
+  if (!form || !input.name || form.method.toLowerCase() !== 'get') return null;
+  const params = new URLSearchParams();
+  for (const [name, value] of new FormData(form)) {
+    if (typeof value === 'string') params.append(name, value);
+  }
+  params.set(input.name, keyword);
+  const url = new URL(form.action, location.href);
+  url.search = params.toString();
+  return url.href;
+}
+"""
+
 # Pagination selector
 NEXT_PAGE_BUTTON = ".s-pagination-next, a.s-pagination-item.s-pagination-next, .a-pagination .a-last a"
 
+# Product cards on the search results; waited on instead of fixed sleeps after searching/scrolling
+PRODUCT_CARD_SELECTOR = "div.a-cardui._dmFsd_cardItem_1LFgv"
+SCROLL_LOAD_TIMEOUT_MS = 2000  # Upper bound for lazy-loaded cards to appear after a scroll
+FAST_SCROLL_IDLE_TIMEOUT_MS = 5000  # FAST_MODE: network-idle wait after jumping to the bottom
+SCROLL_TO_BOTTOM_JS = "window.scrollTo(0, document.body.scrollHeight)"
+
+# Numbered pagination entries (the last one is the last page) and how many later
+# result pages are loaded in background tabs at once. The process-wide cap keeps the
+# keyword workers' page loads together close to KEYWORD_WORKERS (bot detection).
+PAGINATION_PAGE_ITEM_SELECTOR = ".s-pagination-item:not(.s-pagination-next):not(.s-pagination-previous)"
+PREFETCH_RESULT_TABS_PER_WORKER = 1
+MAX_PREFETCH_RESULT_TABS = 2
+_result_tab_slots = threading.BoundedSemaphore(MAX_PREFETCH_RESULT_TABS)
+
+# Whole slow-scroll loop run inside the page (one evaluate instead of a wheel call and
+# a wait per step): scroll a step, then re-check every 50 ms until the page has loaded
+# and no result placeholder is pending, at most maxWaitMs per step (timers, unlike
+# animation frames, keep running in a background window)
+SCROLL_PAGE_JS = """
+async ([steps, stepPixels, maxWaitMs, behavior]) => {
+    const settled = () => document.readyState === 'complete'
+        && !document.querySelector('.s-result-list-placeholder');
+    for (let i = 0; i < steps; i++) {
+        window.scrollBy({ top: stepPixels, behavior });
+        const start = performance.now();
+        do {
+            await new Promise(resolve => setTimeout(resolve, 50));
+        } while (!settled() && performance.now() - start < maxWaitMs);
+    }
+}
+"""
+
 
 # ============================================================================
 # GMAIL API FUNCTIONS
 # ============================================================================
 
-def get_gmail_service():
-    """
-    Authenticate and return Gmail API service
-    
-    Returns:
-        Gmail API service object
-    """
-    creds = None
+# Credentials and Gmail service reused by every OTP poll in this process
+_gmail_creds = None
+_gmail_service = None
+
+
+def _gmail_token_fresh(creds):
+    """True if creds are valid and not within GMAIL_TOKEN_REFRESH_MARGIN of expiring"""
+    if not creds or not creds.valid:
+        return False
+    if creds.expiry is None:
+        return True
+    # google-auth keeps expiry as naive UTC
+    return creds.expiry - datetime.now(timezone.utc).replace(tzinfo=None) > GMAIL_TOKEN_REFRESH_MARGIN
+
+
+def _load_gmail_credentials(creds=None):
+    """Load, refresh or (first time) authorize Gmail credentials and save the token"""
     
     # Load existing token if available
-    if GMAIL_TOKEN_FILE.exists():
+    if creds is None and GMAIL_TOKEN_FILE.exists():
         try:
             creds = Credentials.from_authorized_user_file(str(GMAIL_TOKEN_FILE), GMAIL_SCOPES)
         except Exception as e:
             print(f"[WARNING] Could not load token: {e}")
             creds = None
     
-    # If no valid credentials, do OAuth flow (one-time)
-    if not creds or not creds.valid:
-        if creds and creds.expired and creds.refresh_token:
-            print("[INFO] Refreshing expired token...")
+    # If no fresh credentials, refresh or do OAuth flow (one-time)
+    if not _gmail_token_fresh(creds):
+        if creds and creds.refresh_token:
+            print("[INFO] Refreshing Gmail token...")
             try:
                 creds.refresh(Request())
             except Exception as e:
                 print(f"[WARNING] Token refresh failed: {e}")
                 creds = None
         
-        if not creds:
+        if not creds or not creds.valid:
             if not GMAIL_CREDENTIALS_FILE.exists():
                 raise FileNotFoundError(
                     f"\n[ERROR] Gmail credentials file not found: {GMAIL_CREDENTIALS_FILE}\n"
@@ -232,7 +418,28 @@ def get_gmail_service():
             token.write(creds.to_json())
         print(f"[SUCCESS] Gmail authentication saved to {GMAIL_TOKEN_FILE}")
     
-    return build('gmail', 'v1', credentials=creds)
+    return creds
+
+
+def get_gmail_service():
+    """
+    Authenticate and return Gmail API service
+    
+    The credentials and the built service are cached at module scope, so
+    repeated OTP polls skip the token file read and the client build. Both
+    are reloaded only when the token is about to expire.
+    
+    Returns:
+        Gmail API service object
+    """
+    global _gmail_creds, _gmail_service
+    if _gmail_service is not None and _gmail_token_fresh(_gmail_creds):
+        return _gmail_service
+    
+    _gmail_creds = _load_gmail_credentials(_gmail_creds)
+    # The Gmail discovery document ships with the client; skip the file cache lookup
+    _gmail_service = build('gmail', 'v1', credentials=_gmail_creds, cache_discovery=False)
+    return _gmail_service
 
 
 def extract_otp_from_html(html_text):
@@ -240,7 +447,7 @@ def extract_otp_from_html(html_text):
     Extract 6-digit OTP code from HTML email
     
     Args:
-        html_text: Email HTML body
+        html_text: Email HTML body (str, or the undecoded bytes from decode_email_body)
     
     Returns:
         6-digit OTP code as string, or None if not found
@@ -248,25 +455,35 @@ def extract_otp_from_html(html_text):
     if not html_text:
         return None
     
+    if SelectolaxHTMLParser is not None:
+        try:
+            # Real HTML tree: the OTP is a span inside the mail's table body
+            for node in SelectolaxHTMLParser(html_text).css('tbody span'):
+                text = node.text(strip=True)
+                if len(text) == 6 and text.isdigit():
+                    return text
+            return None
+        except Exception as e:
+            print(f"    [WARNING] selectolax parsing failed, using regex scan: {e}")
+    
     try:
-        # Method 1: Try to find the specific table structure
-        table_pattern = r'<table[^>]*>.*?<tbody[^>]*>.*?<tr[^>]*>.*?<tr[^>]*>.*?<tr[^>]*>.*?<tr[^>]*>.*?<td[^>]*>.*?<div[^>]*>.*?<span[^>]*>(\d{6})</span>'
-        match = re.search(table_pattern, html_text, re.DOTALL | re.IGNORECASE)
-        if match:
-            otp = match.group(1)
-            if len(otp) == 6 and otp.isdigit():
-                return otp
-        
-        # Method 2: Find all spans with 6-digit numbers
-        span_pattern = r'<span[^>]*>(\d{6})</span>'
-        spans = re.findall(span_pattern, html_text, re.IGNORECASE)
-        for span_text in spans:
-            if len(span_text) == 6 and span_text.isdigit():
-                span_index = html_text.find(f'<span>{span_text}</span>')
-                if span_index > 0:
-                    context = html_text[max(0, span_index-500):span_index+100]
-                    if 'table' in context.lower() and 'tbody' in context.lower():
-                        return span_text
+        # One linear pass over the 6-digit spans; the OTP span sits inside the
+        # mail's table layout, so look for table rows just before it
+        # (a bounded window instead of a backtracking table-structure regex)
+        if isinstance(html_text, bytes):
+            # Raw mail bytes: scan them directly instead of decoding the whole body
+            for match in OTP_SPAN_BYTES_PATTERN.finditer(html_text):
+                start = match.start()
+                context = html_text[max(0, start - OTP_SPAN_CONTEXT_CHARS):start].lower()
+                if b'tbody' in context and b'<tr' in context:
+                    return match.group(1).decode('ascii')
+            return None
+        
+        for match in OTP_SPAN_PATTERN.finditer(html_text):
+            start = match.start()
+            context = html_text[max(0, start - OTP_SPAN_CONTEXT_CHARS):start].lower()
+            if 'tbody' in context and '<tr' in context:
+                return match.group(1)
         
     except Exception as e:
         print(f"    [WARNING] HTML parsing error: {e}")
@@ -274,12 +491,17 @@ def extract_otp_from_html(html_text):
     return None
 
 
-def extract_otp_from_text(text):
+def extract_otp_from_text(text, is_html=None):
     """
     Extract 6-digit OTP code from email text
     
+    Bytes bodies (from decode_email_body) go through the HTML checks
+    undecoded; they are only decoded to str for the plain-text patterns.
+    
     Args:
-        text: Email body text
+        text: Email body text (str or bytes)
+        is_html: Whether the body is HTML (from decode_email_body); None
+            sniffs the first HTML_SNIFF_CHARS for an HTML tag
     
     Returns:
         6-digit OTP code as string, or None if not found
@@ -287,22 +509,28 @@ def extract_otp_from_text(text):
     if not text:
         return None
     
+    is_bytes = isinstance(text, bytes)
+    
+    # One scan rules out bodies with no 6-digit run before any HTML/pattern work
+    digits_pattern = SIX_DIGIT_BYTES_PATTERN if is_bytes else SIX_DIGIT_PATTERN
+    if not digits_pattern.search(text):
+        return None
+    
     # First try HTML extraction
-    if '<html' in text.lower() or '<body' in text.lower() or '<table' in text.lower():
+    if is_html is None:
+        marker_pattern = HTML_MARKER_BYTES_PATTERN if is_bytes else HTML_MARKER_PATTERN
+        is_html = bool(marker_pattern.search(text, 0, HTML_SNIFF_CHARS))
+    if is_html:
         html_otp = extract_otp_from_html(text)
         if html_otp:
             return html_otp
     
-    # Then try regex patterns for plain text
-    patterns = [
-        r'確認コード(?:は|:|：)(?:次のとおりです)?(?:\s*[:：]\s*)?(\d{6})',
-        r'verification\s+code(?:\s+is)?(?:\s*[:：]\s*)?(\d{6})',
-        r'コード(?:\s*[:：]\s*)(\d{6})',
-        r'(?:^|\s)(\d{6})(?:\s|$)',
-    ]
+    if is_bytes:
+        text = text.decode('utf-8', errors='ignore')
     
-    for pattern in patterns:
-        match = re.search(pattern, text, re.IGNORECASE | re.MULTILINE)
+    # Then the keyword-anchored patterns, and only then a bare 6-digit number
+    for pattern in (OTP_KEYWORD_PATTERN, OTP_STANDALONE_PATTERN):
+        match = pattern.search(text)
         if match:
             otp = match.group(1)
             if len(otp) == 6 and otp.isdigit():
@@ -314,58 +542,158 @@ def extract_otp_from_text(text):
 def decode_email_body(payload):
     """
     Decode email body from Gmail API message payload
+    Walks the MIME tree iteratively and classifies parts by their mimeType;
+    non-text parts are never base64-decoded, and the body is kept as bytes
+    so extract_otp_from_text only decodes it if the HTML checks fail
     
     Args:
         payload: Message payload from Gmail API
     
     Returns:
-        Decoded email body text
+        Tuple of (email body as UTF-8 bytes, True if it is HTML); HTML preferred
     """
-    html_body = ""
-    text_body = ""
-    
-    if 'body' in payload and 'data' in payload['body']:
-        body_data = payload['body']['data']
-        decoded = base64.urlsafe_b64decode(body_data).decode('utf-8', errors='ignore')
-        if '<html' in decoded.lower() or '<body' in decoded.lower() or '<table' in decoded.lower():
-            html_body = decoded
-        else:
-            text_body = decoded
+    html_parts = []
+    text_parts = []
     
-    if 'parts' in payload:
-        for part in payload['parts']:
-            mime_type = part.get('mimeType', '')
-            
-            if 'parts' in part:
-                nested_result = decode_email_body(part)
-                if '<html' in nested_result.lower() or '<table' in nested_result.lower():
-                    html_body += nested_result
-                else:
-                    text_body += nested_result
-            
-            elif mime_type == 'text/html':
-                if 'data' in part['body']:
-                    part_data = part['body']['data']
-                    decoded = base64.urlsafe_b64decode(part_data).decode('utf-8', errors='ignore')
-                    html_body += decoded + "\n"
-            
-            elif mime_type == 'text/plain':
-                if 'data' in part['body']:
-                    part_data = part['body']['data']
-                    decoded = base64.urlsafe_b64decode(part_data).decode('utf-8', errors='ignore')
-                    text_body += decoded + "\n"
+    # Depth-first walk in document order without recursion
+    stack = deque([payload])
+    while stack:
+        part = stack.popleft()
+        if 'parts' in part:
+            stack.extendleft(reversed(part['parts']))
+        
+        body_data = part.get('body', {}).get('data')
+        if not body_data:
+            continue
+        
+        mime_type = part.get('mimeType', '')
+        if part is not payload and not mime_type.startswith('text/'):
+            continue  # Inline images, calendar files, ... can never hold the OTP
+        
+        raw = base64.urlsafe_b64decode(body_data)
+        
+        if mime_type == 'text/html':
+            html_parts.append(raw)
+        elif mime_type == 'text/plain':
+            text_parts.append(raw)
+        elif part is payload:
+            # Single-part message without a usable mimeType: sniff for HTML (on the raw bytes)
+            if HTML_MARKER_BYTES_PATTERN.search(raw, 0, HTML_SNIFF_CHARS):
+                html_parts.append(raw)
+            else:
+                text_parts.append(raw)
     
-    return html_body if html_body else text_body
+    # Joined once at the end instead of growing a buffer part by part
+    if html_parts:
+        return b'\n'.join(html_parts), True
+    return b'\n'.join(text_parts), False
+
+
+def fetch_gmail_messages_batch(service, message_ids, **get_kwargs):
+    """
+    Fetch several Gmail messages in one batch HTTP request per GMAIL_BATCH_LIMIT messages
+
+    Args:
+        service: Gmail API service object
+        message_ids: List of message IDs to fetch
+        **get_kwargs: Extra arguments for messages().get() (format, fields, ...)
+
+    Returns:
+        Dict of message_id -> message resource (failed entries are omitted)
+    """
+    fetched = {}
+
+    def _collect(request_id, response, exception):
+        if exception is not None:
+            print(f"    [WARNING] Batch fetch failed for message {request_id}: {exception}")
+            return
+        fetched[request_id] = response
+
+    # The batch endpoint rejects more than GMAIL_BATCH_LIMIT calls per request
+    for start in range(0, len(message_ids), GMAIL_BATCH_LIMIT):
+        try:
+            batch = service.new_batch_http_request(callback=_collect)
+            for message_id in message_ids[start:start + GMAIL_BATCH_LIMIT]:
+                batch.add(
+                    service.users().messages().get(userId='me', id=message_id, **get_kwargs),
+                    request_id=message_id
+                )
+            batch.execute()
+        except HttpError as e:
+            # Callers fall back to single GETs for anything missing
+            print(f"    [WARNING] Gmail batch request failed: {e}")
+
+    return fetched
 
 
-def get_amazon_otp_from_gmail(max_age_minutes=5, max_retries=12, retry_delay=5):
+def get_gmail_history_id():
+    """
+    Snapshot the mailbox's current historyId so later polls only see new mail
+    
+    Returns:
+        historyId as string, or None if it could not be read
+    """
+    try:
+        service = get_gmail_service()
+        return service.users().getProfile(userId='me').execute().get('historyId')
+    except Exception as e:
+        print(f"[WARNING] Could not read Gmail history ID: {e}")
+        return None
+
+
+def list_new_gmail_message_ids(service, start_history_id):
+    """
+    List INBOX messages added since start_history_id via history.list (deltas only)
+    
+    Args:
+        service: Gmail API service object
+        start_history_id: historyId snapshot taken before the OTP mail was sent
+    
+    Returns:
+        List of message IDs, newest first
+    """
+    message_ids = []
+    page_token = None
+    while True:
+        request_args = {
+            'userId': 'me',
+            'startHistoryId': start_history_id,
+            'historyTypes': ['messageAdded'],
+            'labelId': 'INBOX',
+        }
+        if page_token:
+            request_args['pageToken'] = page_token
+        response = service.users().history().list(**request_args).execute()
+        
+        for record in response.get('history', []):
+            for added in record.get('messagesAdded', []):
+                message_id = added['message']['id']
+                if message_id not in message_ids:
+                    message_ids.append(message_id)
+        
+        page_token = response.get('nextPageToken')
+        if not page_token:
+            break
+    
+    # History is chronological; check the newest mail first
+    message_ids.reverse()
+    return message_ids
+
+
+def get_amazon_otp_from_gmail(max_age_minutes=5, max_retries=60, retry_delay=1, start_history_id=None):
     """
     Get latest Amazon OTP code from Gmail
     
+    With start_history_id each attempt asks history.list for the mail added
+    since that snapshot, which is a near-empty response until the OTP mail
+    lands, so polling every second is cheap. Without it (or once the
+    snapshot has expired) the search query is used instead.
+    
     Args:
         max_age_minutes: Only check emails from last N minutes
         max_retries: Maximum number of retry attempts
         retry_delay: Seconds to wait between retries
+        start_history_id: Gmail historyId taken before sign-in (see get_gmail_history_id)
     
     Returns:
         6-digit OTP code as string, or None if not found
@@ -382,74 +710,140 @@ def get_amazon_otp_from_gmail(max_age_minutes=5, max_retries=12, retry_delay=5):
         print(f"[ERROR] Failed to connect to Gmail: {e}")
         return None
     
-    since_time = int((datetime.now() - timedelta(minutes=max_age_minutes)).timestamp())
+    since_time = int(time.time()) - max_age_minutes * 60
+    # Same cutoff in internalDate units, so the per-message age check is one integer compare
+    age_cutoff_ms = since_time * 1000
     
-    query = (
-        f'(from:amazon.co.jp OR from:account-update@amazon.co.jp OR from:no-reply@amazon.co.jp '
-        f'OR from:auto-confirm@amazon.co.jp) after:{since_time}'
-    )
+    # (after: takes epoch seconds; newer_than: has no minute granularity)
+    query = f'{GMAIL_OTP_QUERY} after:{since_time}'
     
     print(f"\n[INFO] Searching for Amazon verification emails from last {max_age_minutes} minutes...")
+    if start_history_id:
+        print(f"[INFO] Watching mailbox changes since history ID {start_history_id}")
+    
+    # Messages already inspected and rejected; later attempts only look at new ones
+    rejected_ids = set()
+    # Hashes of bodies with no OTP, so duplicate copies of a mail are not scanned again
+    rejected_body_hashes = set()
     
     for attempt in range(1, max_retries + 1):
         try:
-            results = service.users().messages().list(
-                userId='me',
-                q=query,
-                maxResults=10
-            ).execute()
+            messages = None
+            if start_history_id:
+                try:
+                    messages = [{'id': message_id} for message_id in
+                                list_new_gmail_message_ids(service, start_history_id)]
+                except HttpError as e:
+                    if e.resp.status != 404:
+                        raise
+                    print("[WARNING] Gmail history ID expired - falling back to search query")
+                    start_history_id = None
             
-            messages = results.get('messages', [])
+            if messages is None:
+                results = service.users().messages().list(
+                    userId='me',
+                    q=query,
+                    maxResults=GMAIL_OTP_MAX_RESULTS
+                ).execute()
+                
+                messages = results.get('messages', [])
+            
+            messages = [m for m in messages if m['id'] not in rejected_ids]
             
             if not messages:
                 if attempt < max_retries:
-                    print(f"[Attempt {attempt}/{max_retries}] No email found yet, waiting {retry_delay}s...")
+                    if attempt % 5 == 0:
+                        print(f"[Attempt {attempt}/{max_retries}] No email found yet, waiting {retry_delay}s...")
                     time.sleep(retry_delay)
                     continue
                 else:
                     print(f"\n[WARNING] No Amazon email found after {max_retries} attempts")
                     return None
             
-            print(f"[SUCCESS] Found {len(messages)} email(s) from Amazon")
+            print(f"[SUCCESS] Found {len(messages)} new email(s)")
+            
+            message_ids = [m['id'] for m in messages]
             
-            for idx, message in enumerate(messages, 1):
+            # Pass 1: headers and internalDate only, all candidates in one batch round trip
+            metadata = fetch_gmail_messages_batch(
+                service, message_ids, format='metadata', metadataHeaders=['Subject', 'From', 'Date']
+            )
+            
+            candidates = []
+            for idx, message_id in enumerate(message_ids, 1):
+                meta = metadata.get(message_id)
+                if meta is None:
+                    # Metadata unavailable - let the body pass decide
+                    candidates.append((idx, message_id))
+                    continue
+                
+                # One pass over the headers instead of one scan per header looked up
+                headers = {h['name'].lower(): h['value'] for h in meta.get('payload', {}).get('headers', [])}
+                subject = headers.get('subject', 'No Subject')
+                from_email = headers.get('from', 'Unknown')
+                
+                print(f"\n  Checking Email {idx}:")
+                print(f"    From: {from_email[:50]}")
+                print(f"    Subject: {subject[:60]}...")
+                
+                # History deltas include every new INBOX mail, not just Amazon's
+                if 'amazon' not in from_email.lower():
+                    print("    [INFO] Skipping (not from Amazon)")
+                    rejected_ids.add(message_id)
+                    continue
+                
+                if not OTP_SUBJECT_PATTERN.search(subject):
+                    print("    [INFO] Skipping (not a verification code mail)")
+                    rejected_ids.add(message_id)
+                    continue
+                
                 try:
-                    msg = service.users().messages().get(
-                        userId='me',
-                        id=message['id'],
-                        format='full'
-                    ).execute()
-                    
-                    headers = msg['payload'].get('headers', [])
-                    subject = next((h['value'] for h in headers if h['name'].lower() == 'subject'), 'No Subject')
-                    from_email = next((h['value'] for h in headers if h['name'].lower() == 'from'), 'Unknown')
+                    internal_ms = int(meta.get("internalDate", "0"))
+                except (TypeError, ValueError):
+                    internal_ms = 0
+                if internal_ms and internal_ms < age_cutoff_ms:
+                    print("    [INFO] Skipping (too old)")
+                    rejected_ids.add(message_id)
+                    continue
+                
+                candidates.append((idx, message_id))
+            
+            # Pass 2: full bodies only for the mails that passed the header checks
+            bodies = fetch_gmail_messages_batch(
+                service, [message_id for _, message_id in candidates], format='full'
+            )
+            
+            for idx, message_id in candidates:
+                try:
+                    msg = bodies.get(message_id)
+                    if msg is None:
+                        # Batch entry failed - fall back to a single GET
+                        msg = service.users().messages().get(
+                            userId='me',
+                            id=message_id,
+                            format='full'
+                        ).execute()
                     
-                    print(f"\n  Checking Email {idx}:")
-                    print(f"    From: {from_email[:50]}")
-                    print(f"    Subject: {subject[:60]}...")
+                    body_bytes, body_is_html = decode_email_body(msg['payload'])
+                    body_hash = hash(body_bytes)
+                    if body_hash in rejected_body_hashes:
+                        print(f"    [INFO] Skipping email {idx} (same body as a mail already checked)")
+                        rejected_ids.add(message_id)
+                        continue
                     
-                    try:
-                        internal_ms = int(msg.get("internalDate", "0"))
-                        if internal_ms:
-                            age_seconds = (time.time() - (internal_ms / 1000.0))
-                            if age_seconds > (max_age_minutes * 60):
-                                print("    [INFO] Skipping (too old)")
-                                continue
-                    except Exception:
-                        pass
-
-                    body_text = decode_email_body(msg['payload'])
-                    otp = extract_otp_from_text(body_text)
+                    otp = extract_otp_from_text(body_bytes, is_html=body_is_html)
                     
                     if otp:
-                        print(f"    [SUCCESS] Found OTP: {otp}")
+                        print(f"    [SUCCESS] Found OTP in email {idx}: {otp}")
                         print("\n" + "="*60)
                         return otp
                     else:
-                        print(f"    [INFO] No OTP in this email")
+                        print(f"    [INFO] No OTP in email {idx}")
+                        rejected_ids.add(message_id)
+                        rejected_body_hashes.add(body_hash)
                 
                 except HttpError as e:
-                    print(f"    [ERROR] Failed to read email: {e}")
+                    print(f"    [ERROR] Failed to read email {idx}: {e}")
                     continue
             
             if attempt < max_retries:
@@ -588,7 +982,6 @@ def initialize_google_sheets():
         
     except Exception as e:
         print(f"\n[ERROR] Failed to initialize Google Sheets: {e}")
-        import traceback
         traceback.print_exc()
         return None, None, None
 
@@ -639,31 +1032,90 @@ def append_product_to_sheets(worksheet, product_rows, current_number, keyword=""
         return None
 
 
+class ProductSheetWriter:
+    """
+    Thread-safe front for append_product_to_sheets
+    
+    Parallel keyword searches share one worksheet and one sequential
+    product number; the lock keeps every number unique and each product's
+    tier rows together.
+    """
+    
+    def __init__(self, worksheet, next_number):
+        self.worksheet = worksheet
+        self.next_number = next_number
+        self._lock = threading.Lock()
+    
+    def append(self, product_rows, keyword=""):
+        """
+        Append one product (all its quantity tiers) with the next free number
+        
+        Returns:
+            The product number used, or None if the append failed
+        """
+        with self._lock:
+            number = self.next_number
+            new_number = append_product_to_sheets(self.worksheet, product_rows, number, keyword)
+            if new_number is None:
+                return None
+            self.next_number = new_number
+            return number
+
+
 # ============================================================================
 # BROWSER AUTOMATION FUNCTIONS
 # ============================================================================
 
+def block_unneeded_resources(route):
+    """Abort BLOCKED_RESOURCE_TYPES and BLOCKED_URL_PATTERN requests, let the rest through"""
+    request = route.request
+    if request.resource_type in BLOCKED_RESOURCE_TYPES or BLOCKED_URL_PATTERN.match(request.url):
+        route.abort()
+    else:
+        route.continue_()
+
+
 def find_first_visible(page, selectors, timeout=5000):
-    """Find the first visible element from a list of selectors"""
-    for selector in selectors:
-        try:
-            locator = page.locator(selector)
-            if locator.count() > 0:
-                element = locator.first
-                if element.is_visible(timeout=timeout):
-                    return element
-        except Exception:
-            continue
-    return None
+    """
+    Find the first visible element from a list of selectors
+    
+    The CSS entries are checked as one precompiled union and the xpath=
+    entries are OR-ed onto it with locator.or_(), so the whole list is a
+    single auto-waiting locator: one wait returns as soon as any candidate
+    is visible, instead of per-selector count()/is_visible() round trips.
+    
+    Returns:
+        Locator of the element, or None if nothing became visible in time
+    """
+    css = SELECTOR_CSS_UNIONS.get(tuple(selectors)) or css_union(selectors)
+    parts = [css] if css else []
+    parts += [s for s in selectors if s.startswith("xpath=")]
+    if not parts:
+        return None
+    
+    # Filter each part to visible matches so a hidden first match cannot mask a visible one
+    locator = page.locator(f"{parts[0]} >> visible=true")
+    for part in parts[1:]:
+        locator = locator.or_(page.locator(f"{part} >> visible=true"))
+    
+    element = locator.first
+    try:
+        element.wait_for(state="visible", timeout=timeout)
+        return element
+    except Exception:
+        return None
 
 
-def human_click(locator, delay_after=0.3):
+def human_click(locator, delay_after=0):
     """
-    Click with slow, visible, human-like mouse movement
+    Click with human-like mouse movement
+    
+    No fixed pauses: locator.click() already waits until the element is
+    visible, stable and enabled. Callers wait for the click's effect
+    (navigation, new content) themselves; delay_after is only slept if given.
     """
     try:
         locator.scroll_into_view_if_needed(timeout=TIMEOUT_MS)
-        time.sleep(0.3)  # Pause after scrolling into view
     except Exception:
         pass
     
@@ -674,16 +1126,13 @@ def human_click(locator, delay_after=0.3):
             x = box["x"] + box["width"] / 2
             y = box["y"] + box["height"] / 2
             
-            # Move mouse slowly and visibly
             locator.page.mouse.move(x, y)
-            time.sleep(0.5)  # Increased from 0.1 to 0.5 for visibility
     except Exception:
         pass
     
-    # Brief pause before clicking
-    time.sleep(0.3)
     locator.click()
-    time.sleep(delay_after)
+    if delay_after:
+        time.sleep(delay_after)
 
 
 def wait_for_page_load(page, timeout=TIMEOUT_MS):
@@ -694,36 +1143,91 @@ def wait_for_page_load(page, timeout=TIMEOUT_MS):
         print("[WARNING] Page load timeout, continuing...")
 
 
+def wait_for_new_results(page, previous_url, timeout=TIMEOUT_MS):
+    """
+    Wait until a search/pagination click has left previous_url and product cards are in the DOM
+    
+    Args:
+        page: Playwright page object
+        previous_url: page.url before the click
+        timeout: Maximum wait per step in milliseconds
+    """
+    try:
+        page.wait_for_url(lambda url: url != previous_url, timeout=timeout)
+    except PWTimeoutError:
+        print("[WARNING] URL did not change after click, continuing...")
+    try:
+        page.wait_for_selector(PRODUCT_CARD_SELECTOR, state="attached", timeout=timeout)
+    except PWTimeoutError:
+        print("[WARNING] No product cards appeared, continuing...")
+
+
+def wait_for_more_cards(page, previous_count, timeout=SCROLL_LOAD_TIMEOUT_MS):
+    """
+    Wait until more than previous_count product cards are in the DOM (e.g. after a scroll)
+    
+    Returns:
+        True if new cards appeared, False if the timeout passed first
+    """
+    try:
+        page.wait_for_function(
+            "([selector, count]) => document.querySelectorAll(selector).length > count",
+            arg=[PRODUCT_CARD_SELECTOR, previous_count],
+            timeout=timeout
+        )
+        return True
+    except PWTimeoutError:
+        return False
+
+
 def scroll_product_page_slowly(page, scroll_times=20, scroll_delay=2.0):
     """
     Slowly and smoothly scroll down the products page to display all products
     
+    Not called by the scrape flow (scrape_results_page scrolls with
+    scroll_for_more_products); kept for a slow, watched scroll.
+    
     Args:
         page: Playwright page object
         scroll_times: Number of times to scroll (default: 20 for smoother scrolling)
-        scroll_delay: Delay between scrolls in seconds (default: 2.0 for visible scrolling)
+        scroll_delay: Maximum wait per scroll in seconds for the page to settle (default: 2.0)
     """
-    print(f"\n[INFO] ゆっくりスクロール開始 ({scroll_times}回スクロール、各{scroll_delay}秒間隔)...")
+    if FAST_MODE:
+        # One jump to the bottom triggers any lazy loading; wait for it to finish
+        try:
+            page.evaluate(SCROLL_TO_BOTTOM_JS)
+            page.wait_for_load_state("networkidle", timeout=FAST_SCROLL_IDLE_TIMEOUT_MS)
+        except PWTimeoutError:
+            pass
+        except Exception as e:
+            print(f"[WARNING] スクロール中にエラー: {e}")
+        return
+    
+    print(f"\n[INFO] ゆっくりスクロール開始 ({scroll_times}回スクロール、最大{scroll_delay}秒待機)...")
     try:
-        for i in range(scroll_times):
-            # Smaller scroll amount for smoother, more visible scrolling
-            page.mouse.wheel(0, 300)  # Reduced from 500 to 300 pixels
-            time.sleep(scroll_delay)
-            
-            # Print progress more frequently
-            if (i + 1) % 3 == 0:
-                print(f"[INFO] スクロール進捗: {i + 1}/{scroll_times} 回")
-        
+        # 300 px steps, smooth only when someone is watching
+        page.evaluate(SCROLL_PAGE_JS, [scroll_times, 300, int(scroll_delay * 1000),
+                                       "instant" if HEADLESS else "smooth"])
         print("[SUCCESS] スクロール完了")
-        time.sleep(1)  # Brief pause after scrolling completes
     except Exception as e:
         print(f"[WARNING] スクロール中にエラー: {e}")
 
 
+def scroll_for_more_products(page):
+    """Scroll the results to load more product cards (straight to the bottom in FAST_MODE)"""
+    if FAST_MODE:
+        page.evaluate(SCROLL_TO_BOTTOM_JS)
+    else:
+        page.mouse.wheel(0, 800)
+
+
 def check_and_navigate_next_page(page):
     """
     Check if there's a next page and navigate to it with visible, slow actions
     
+    Not called by the scrape flow (scrape_results_page follows "Next" and
+    scrape_all_result_pages opens pages by URL); kept for a watched run.
+    
     Args:
         page: Playwright page object
     
@@ -732,7 +1236,6 @@ def check_and_navigate_next_page(page):
     """
     try:
         print("\n[INFO] 次のページを探しています...")
-        time.sleep(1)  # Pause before searching
         
         # Try multiple selectors for next page button
         next_selectors = [
@@ -752,7 +1255,6 @@ def check_and_navigate_next_page(page):
                     try:
                         next_button.scroll_into_view_if_needed(timeout=3000)
                         print("[INFO] ボタンまでスクロール完了")
-                        time.sleep(1)
                     except Exception:
                         pass
                     
@@ -764,20 +1266,18 @@ def check_and_navigate_next_page(page):
                             y = box["y"] + box["height"] / 2
                             page.mouse.move(x, y)
                             print("[INFO] 次のページボタンにマウスホバー中...")
-                            time.sleep(1.5)  # Hover for visibility
+                            if not HEADLESS:
+                                time.sleep(1.5)  # Hover for visibility
                     except Exception:
                         pass
                     
                     # Click the button slowly
                     print("[INFO] 次のページボタンをクリックします...")
-                    time.sleep(0.5)  # Brief pause before clicking
-                    human_click(next_button, delay_after=3.0)
+                    previous_url = page.url
+                    human_click(next_button)
                     
-                    # Wait longer for page to load
                     print("[INFO] 次のページの読み込み待機中...")
-                    time.sleep(4)  # Increased from 3 to 4 seconds
-                    wait_for_page_load(page)
-                    time.sleep(1)  # Additional pause after page load
+                    wait_for_new_results(page, previous_url)
                     
                     print("[SUCCESS] 次のページへ移動完了")
                     return True
@@ -798,8 +1298,8 @@ def extract_number(text):
     if not text:
         return None
     # Remove currency symbols, commas, and extract number
-    cleaned = re.sub(r'[¥,円JPY\s]', '', text)
-    match = re.search(r'\d+(?:\.\d+)?', cleaned)
+    cleaned = CURRENCY_CHARS_PATTERN.sub('', text)
+    match = NUMBER_PATTERN.search(cleaned)
     return match.group(0) if match else None
 
 
@@ -814,6 +1314,9 @@ def highlight_product_in_browser(page, container, asin, product_name=""):
         asin: Product ASIN for identification
         product_name: Product name for console logging (optional)
     """
+    if not ENABLE_HIGHLIGHT:
+        return
+    
     try:
         # Inject JavaScript to highlight this product and log to console
         page.evaluate(f"""
@@ -1146,12 +1649,295 @@ def scrape_product_from_listing(container):
         
     except Exception as e:
         print(f"    [ERROR] Failed to scrape product from listing: {e}")
-        import traceback
         traceback.print_exc()
         return []
 
 
-def search_and_scrape_products(page, keyword, worksheet, current_number):
+def scrape_results_page(page, keyword, sheet_writer, scraped_asins, follow_next=True):
+    """
+    Scrape the product cards of the current results page, scrolling until no new products appear
+    
+    Args:
+        page: Playwright page showing search results
+        keyword: Search keyword (written to the sheet)
+        sheet_writer: ProductSheetWriter for real-time, sequentially numbered updates
+        scraped_asins: Set of ASINs already scraped for this keyword (updated in place)
+        follow_next: Click the "Next" button to continue on the following pages
+    
+    Returns:
+        Tuple of (rows_sent, scroll_count)
+    """
+    total_rows_sent = 0  # Track total rows sent
+    scroll_count = 0
+    no_new_products_count = 0
+    max_consecutive_no_products = 5
+    
+    while True:  # Scrape until no more products found
+        # Find currently visible product containers
+        product_containers = page.locator("div.a-cardui._dmFsd_cardItem_1LFgv[data-a-card-type='basic']").all()
+        
+        # Fallback selector if primary doesn't work
+        if len(product_containers) == 0:
+            product_containers = page.locator("div.a-cardui._dmFsd_cardItem_1LFgv").all()
+        
+        if len(product_containers) == 0:
+            print(f"[Scroll {scroll_count + 1}] No product containers found yet, scrolling...")
+            scroll_for_more_products(page)
+            wait_for_more_cards(page, 0)
+            scroll_count += 1
+            
+            # Safeguard: don't scroll infinitely
+            if scroll_count > 50:
+                print("\n[WARNING] Scrolled 50 times without finding products. Stopping.")
+                break
+            continue
+        
+        # Scrape new products from visible containers
+        new_products_found = 0
+        
+        for container in product_containers:
+            try:
+                # Check if this container has an ASIN
+                asin_elem = container.locator('[data-asin]').first
+                if asin_elem.count() == 0:
+                    continue
+                
+                asin = asin_elem.get_attribute('data-asin')
+                if not asin or asin in scraped_asins or len(asin) != 10:
+                    continue
+                
+                # Mark as scraped
+                scraped_asins.add(asin)
+                
+                # Scrape product data (returns list of rows - one per quantity tier)
+                product_rows = scrape_product_from_listing(container)
+                
+                if product_rows:
+                    # Get product name from first row
+                    first_row = product_rows[0]
+                    product_name = first_row.get('name', 'Unknown')
+                    
+                    # Highlight this product in the browser (visual feedback)
+                    highlight_product_in_browser(page, container, asin, product_name)
+                    
+                    # Send to Google Sheets IMMEDIATELY with keyword
+                    product_number = sheet_writer.append(product_rows, keyword)
+                    
+                    if product_number:
+                        # Success!
+                        new_products_found += 1
+                        total_rows_sent += len(product_rows)
+                        
+                        # Show progress in terminal with quantity details
+                        quantities = [row.get('quantity', '?') for row in product_rows]
+                        print(f"  ✓ [{product_number}] {asin} - {product_name[:50]}...")
+                        print(f"     Quantities: {', '.join(quantities)} → {len(product_rows)} rows SENT")
+                    else:
+                        print(f"  ✗ Failed to send ASIN {asin} to sheets")
+                else:
+                    print(f"  ⚠ No data extracted for ASIN {asin}")
+                
+            except Exception as e:
+                print(f"  ✗ Error processing container: {e}")
+                continue
+        
+        # Check if we found new products in this scroll
+        if new_products_found > 0:
+            no_new_products_count = 0  # Reset counter
+            print(f"\n[Scroll {scroll_count + 1}] Processed {new_products_found} new products")
+            print(f"[INFO] Total: {len(scraped_asins)} products | {total_rows_sent} rows sent to sheets\n")
+        else:
+            no_new_products_count += 1
+            print(f"[Scroll {scroll_count + 1}] No new products found")
+            
+            # Check if we've reached the end of results
+            try:
+                # Check for pagination - if there's a "Next" button, click it
+                next_button = page.locator('a.s-pagination-next:not(.s-pagination-disabled), li.a-last:not(.a-disabled) a').first
+                if follow_next and next_button.count() > 0 and next_button.is_visible(timeout=1000):
+                    print("\n[INFO] Found 'Next Page' button - clicking to load more products...")
+                    previous_url = page.url
+                    next_button.click()
+                    wait_for_new_results(page, previous_url)
+                    no_new_products_count = 0  # Reset counter after loading new page
+                    continue
+            except Exception:
+                pass
+            
+            # If no new products found in consecutive scrolls, we've reached the end
+            if no_new_products_count >= max_consecutive_no_products:
+                print(f"\n[INFO] No new products found after {max_consecutive_no_products} consecutive scrolls")
+                
+                # Final verification scroll
+                print("[INFO] Performing final verification scroll...")
+                card_count = page.locator(PRODUCT_CARD_SELECTOR).count()
+                page.evaluate(SCROLL_TO_BOTTOM_JS)
+                wait_for_more_cards(page, card_count)
+                
+                # Check one more time
+                final_check_containers = page.locator("div.a-cardui._dmFsd_cardItem_1LFgv[data-a-card-type='basic']").all()
+                final_new_found = 0
+                for container in final_check_containers:
+                    try:
+                        asin_elem = container.locator('[data-asin]').first
+                        if asin_elem.count() > 0:
+                            asin = asin_elem.get_attribute('data-asin')
+                            if asin and asin not in scraped_asins and len(asin) == 10:
+                                final_new_found += 1
+                                break
+                    except:
+                        continue
+                
+                if final_new_found > 0:
+                    print(f"[INFO] Found {final_new_found} more products on final check - continuing...")
+                    no_new_products_count = 0
+                else:
+                    print("[SUCCESS] Confirmed - no more products for this keyword")
+                    break
+        
+        # Scroll down to load more products
+        print(f"[INFO] Scrolling down to load more products...")
+        card_count = page.locator(PRODUCT_CARD_SELECTOR).count()
+        scroll_for_more_products(page)
+        wait_for_more_cards(page, card_count)
+        scroll_count += 1
+    
+    return total_rows_sent, scroll_count
+
+
+def get_results_page_count(page):
+    """
+    Read the number of result pages from the pagination bar
+    
+    Returns:
+        Last page number shown, or 1 if there is no (readable) pagination
+    """
+    try:
+        items = page.locator(PAGINATION_PAGE_ITEM_SELECTOR)
+        if items.count() == 0:
+            return 1
+        text = items.last.inner_text(timeout=2000).strip()
+        return int(text) if text.isdigit() else 1
+    except Exception:
+        return 1
+
+
+def results_page_url(url, page_number):
+    """Return the results URL with its page= query parameter set to page_number"""
+    parts = urlsplit(url)
+    query = [(k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True) if k != 'page']
+    query.append(('page', str(page_number)))
+    return urlunsplit(parts._replace(query=urlencode(query)))
+
+
+def result_page_is_new(page, page_number, scraped_asins):
+    """
+    Check that a page opened by URL really shows result page page_number
+    
+    Amazon may ignore or drop the page= parameter; then the tab shows page 1
+    again, which has no ASIN that is not already in scraped_asins.
+    """
+    page_param = dict(parse_qsl(urlsplit(page.url).query)).get('page')
+    if page_param not in (None, str(page_number)):
+        return False
+    try:
+        asins = page.locator(f"{PRODUCT_CARD_SELECTOR} [data-asin]").evaluate_all(
+            "els => els.map(el => el.getAttribute('data-asin'))"
+        )
+    except Exception:
+        return False
+    return any(asin and asin not in scraped_asins for asin in asins)
+
+
+def scrape_all_result_pages(page, keyword, sheet_writer, scraped_asins, total_pages):
+    """
+    Scrape pages 1..total_pages, loading the next page in a background tab meanwhile
+    
+    Pages 2..total_pages are opened by URL (page=N). While one page is
+    scraped, the next one loads in a sibling tab of the same context, at
+    most PREFETCH_RESULT_TABS_PER_WORKER per worker and MAX_PREFETCH_RESULT_TABS
+    across all workers; without a free slot the page is opened in place.
+    If a page opened by URL turns out not to be that page, the rest is
+    followed with the "Next" button as before.
+    
+    Returns:
+        Tuple of (rows_sent, scroll_count)
+    """
+    context = page.context
+    base_url = page.url
+    next_number = 2
+    loading = deque()  # (page_number, tab) opened in the background, each holding a slot
+    follow_next = False  # Set once page= turns out to be ignored
+    
+    def open_next_tabs(front_page):
+        nonlocal next_number
+        while not follow_next and next_number <= total_pages and len(loading) < PREFETCH_RESULT_TABS_PER_WORKER:
+            if not _result_tab_slots.acquire(blocking=False):
+                break
+            page_number = next_number
+            next_number += 1
+            tab = None
+            try:
+                tab = context.new_page()
+                # Returns once the response starts; the load continues in the background
+                tab.goto(results_page_url(base_url, page_number), wait_until="commit", timeout=TIMEOUT_MS)
+                loading.append((page_number, tab))
+            except Exception as e:
+                print(f"[WARNING] Could not open result page {page_number}: {e}")
+                if tab is not None:
+                    tab.close()
+                _result_tab_slots.release()
+        # new_page() takes focus in a visible browser; keep the page being scraped in front
+        # so its timers and scroll-driven lazy loading are not throttled
+        front_page.bring_to_front()
+    
+    def close_tab(tab):
+        try:
+            tab.close()
+        finally:
+            _result_tab_slots.release()
+    
+    try:
+        open_next_tabs(page)
+        total_rows_sent, scroll_count = scrape_results_page(page, keyword, sheet_writer, scraped_asins,
+                                                            follow_next=False)
+        
+        while loading or next_number <= total_pages:
+            if loading:
+                page_number, current = loading.popleft()
+            else:
+                page_number, current = next_number, page
+                next_number += 1
+            try:
+                print(f"\n[INFO] Result page {page_number}/{total_pages}")
+                if current is page:
+                    # No free prefetch slot: open the page in place
+                    page.goto(results_page_url(base_url, page_number), wait_until="commit", timeout=TIMEOUT_MS)
+                open_next_tabs(current)
+                current.wait_for_selector(PRODUCT_CARD_SELECTOR, state="attached", timeout=TIMEOUT_MS)
+                if not result_page_is_new(current, page_number, scraped_asins):
+                    print(f"[WARNING] Result page {page_number} did not load by URL - following 'Next' instead")
+                    while loading:
+                        close_tab(loading.popleft()[1])
+                    next_number = total_pages + 1
+                    follow_next = True
+                rows_sent, scrolls = scrape_results_page(current, keyword, sheet_writer, scraped_asins,
+                                                         follow_next=follow_next)
+                total_rows_sent += rows_sent
+                scroll_count += scrolls
+            except Exception as e:
+                print(f"[WARNING] Failed to scrape result page {page_number}: {e}")
+            finally:
+                if current is not page:
+                    close_tab(current)
+        
+        return total_rows_sent, scroll_count
+    finally:
+        while loading:
+            close_tab(loading.popleft()[1])
+
+
+def search_and_scrape_products(page, keyword, sheet_writer):
     """
     Search for a keyword and scrape all products with real-time Google Sheets updates
     Uses EXACT same scraping methods as amazon_auto.py
@@ -1159,16 +1945,17 @@ def search_and_scrape_products(page, keyword, worksheet, current_number):
     Args:
         page: Playwright page object
         keyword: Search keyword
-        worksheet: gspread worksheet object for real-time updates
-        current_number: Starting product number for sequential numbering
+        sheet_writer: ProductSheetWriter for real-time, sequentially numbered updates
         
     Returns:
-        Tuple of (unique_products_count, next_product_number)
+        Number of unique products scraped
     """
     print("\n" + "="*70)
     print(f"SEARCHING & SCRAPING FOR: {keyword}")
     print("="*70)
     
+    scraped_asins = set()  # Track already scraped ASINs
+    
     try:
         # Find search input
         print("\n[1/3] Entering search keyword...")
@@ -1176,170 +1963,69 @@ def search_and_scrape_products(page, keyword, worksheet, current_number):
         
         if search_input.count() == 0:
             print("[ERROR] Search input field not found")
-            return 0, current_number
-        
-        # Clear existing text and enter keyword
-        search_input.clear()
-        search_input.fill(keyword)
-        time.sleep(0.5)
-        print(f"[SUCCESS] Entered keyword: {keyword}")
-        
-        # Click search button
-        print("\n[2/3] Clicking search button...")
-        search_button = page.locator(SEARCH_BUTTON).first
+            return 0
         
-        if search_button.count() == 0:
-            print("[ERROR] Search button not found")
-            return 0, current_number
+        # Open the search results URL directly (same query the form would submit)
+        search_url = None
+        try:
+            search_url = search_input.evaluate(SEARCH_FORM_URL_JS, keyword)
+        except Exception as e:
+            print(f"[WARNING] Could not build search URL from the form: {e}")
         
-        human_click(search_button, delay_after=2.0)
-        wait_for_page_load(page)
-        time.sleep(2)
-        print("[SUCCESS] Search executed")
+        searched = False
+        if search_url:
+            print("\n[2/3] Opening search results directly...")
+            try:
+                page.goto(search_url, wait_until="domcontentloaded", timeout=TIMEOUT_MS)
+                try:
+                    page.wait_for_selector(PRODUCT_CARD_SELECTOR, state="attached", timeout=TIMEOUT_MS)
+                except PWTimeoutError:
+                    print("[WARNING] No product cards appeared, continuing...")
+                searched = True
+                print(f"[SUCCESS] Search executed: {keyword}")
+            except Exception as e:
+                print(f"[WARNING] Direct search navigation failed, using the search form: {e}")
+                search_input = page.locator(SEARCH_INPUT).first
+                if search_input.count() == 0:
+                    print("[ERROR] Search input field not found")
+                    return 0
+        
+        if not searched:
+            # Clear existing text and enter keyword
+            search_input.clear()
+            search_input.fill(keyword)
+            print(f"[SUCCESS] Entered keyword: {keyword}")
+            
+            # Click search button
+            print("\n[2/3] Clicking search button...")
+            search_button = page.locator(SEARCH_BUTTON).first
+            
+            if search_button.count() == 0:
+                print("[ERROR] Search button not found")
+                return 0
+            
+            previous_url = page.url
+            human_click(search_button)
+            wait_for_new_results(page, previous_url)
+            print("[SUCCESS] Search executed")
         
         # Scrape all products with real-time sending to Google Sheets
         print("\n[3/3] SCRAPING & SENDING TO SHEETS (REAL-TIME)")
         print("="*70)
         
-        scraped_asins = set()  # Track already scraped ASINs
-        total_rows_sent = 0  # Track total rows sent
-        scroll_count = 0
-        no_new_products_count = 0
-        max_consecutive_no_products = 5
-        
         print(f"\n[INFO] Starting real-time scrape-and-send for keyword: '{keyword}'")
         print("[INFO] Products scraped directly from listing (no page opens)")
         print("[INFO] Multiple rows created for quantity-based pricing")
         print("[INFO] Will continue until no more products are found")
         print("="*70 + "\n")
         
-        while True:  # Scrape until no more products found
-            # Find currently visible product containers
-            product_containers = page.locator("div.a-cardui._dmFsd_cardItem_1LFgv[data-a-card-type='basic']").all()
-            
-            # Fallback selector if primary doesn't work
-            if len(product_containers) == 0:
-                product_containers = page.locator("div.a-cardui._dmFsd_cardItem_1LFgv").all()
-            
-            if len(product_containers) == 0:
-                print(f"[Scroll {scroll_count + 1}] No product containers found yet, scrolling...")
-                page.mouse.wheel(0, 800)
-                time.sleep(2)
-                scroll_count += 1
-                
-                # Safeguard: don't scroll infinitely
-                if scroll_count > 50:
-                    print("\n[WARNING] Scrolled 50 times without finding products. Stopping.")
-                    break
-                continue
-            
-            # Scrape new products from visible containers
-            new_products_found = 0
-            
-            for container in product_containers:
-                try:
-                    # Check if this container has an ASIN
-                    asin_elem = container.locator('[data-asin]').first
-                    if asin_elem.count() == 0:
-                        continue
-                    
-                    asin = asin_elem.get_attribute('data-asin')
-                    if not asin or asin in scraped_asins or len(asin) != 10:
-                        continue
-                    
-                    # Mark as scraped
-                    scraped_asins.add(asin)
-                    
-                    # Scrape product data (returns list of rows - one per quantity tier)
-                    product_rows = scrape_product_from_listing(container)
-                    
-                    if product_rows:
-                        # Get product name from first row
-                        first_row = product_rows[0]
-                        product_name = first_row.get('name', 'Unknown')
-                        
-                        # Highlight this product in the browser (visual feedback)
-                        highlight_product_in_browser(page, container, asin, product_name)
-                        
-                        # Send to Google Sheets IMMEDIATELY with keyword
-                        new_number = append_product_to_sheets(worksheet, product_rows, current_number, keyword)
-                        
-                        if new_number:
-                            # Success!
-                            new_products_found += 1
-                            total_rows_sent += len(product_rows)
-                            current_number = new_number
-                            
-                            # Show progress in terminal with quantity details
-                            quantities = [row.get('quantity', '?') for row in product_rows]
-                            print(f"  ✓ [{current_number - 1}] {asin} - {product_name[:50]}...")
-                            print(f"     Quantities: {', '.join(quantities)} → {len(product_rows)} rows SENT")
-                        else:
-                            print(f"  ✗ Failed to send ASIN {asin} to sheets")
-                    else:
-                        print(f"  ⚠ No data extracted for ASIN {asin}")
-                    
-                except Exception as e:
-                    print(f"  ✗ Error processing container: {e}")
-                    continue
-            
-            # Check if we found new products in this scroll
-            if new_products_found > 0:
-                no_new_products_count = 0  # Reset counter
-                print(f"\n[Scroll {scroll_count + 1}] Processed {new_products_found} new products")
-                print(f"[INFO] Total: {len(scraped_asins)} products | {total_rows_sent} rows sent to sheets\n")
-            else:
-                no_new_products_count += 1
-                print(f"[Scroll {scroll_count + 1}] No new products found")
-                
-                # Check if we've reached the end of results
-                try:
-                    # Check for pagination - if there's a "Next" button, click it
-                    next_button = page.locator('a.s-pagination-next:not(.s-pagination-disabled), li.a-last:not(.a-disabled) a').first
-                    if next_button.count() > 0 and next_button.is_visible(timeout=1000):
-                        print("\n[INFO] Found 'Next Page' button - clicking to load more products...")
-                        next_button.click()
-                        time.sleep(3)  # Wait for next page to load
-                        no_new_products_count = 0  # Reset counter after loading new page
-                        continue
-                except Exception:
-                    pass
-                
-                # If no new products found in consecutive scrolls, we've reached the end
-                if no_new_products_count >= max_consecutive_no_products:
-                    print(f"\n[INFO] No new products found after {max_consecutive_no_products} consecutive scrolls")
-                    
-                    # Final verification scroll
-                    print("[INFO] Performing final verification scroll...")
-                    page.evaluate("window.scrollTo(0, document.body.scrollHeight)")
-                    time.sleep(2)
-                    
-                    # Check one more time
-                    final_check_containers = page.locator("div.a-cardui._dmFsd_cardItem_1LFgv[data-a-card-type='basic']").all()
-                    final_new_found = 0
-                    for container in final_check_containers:
-                        try:
-                            asin_elem = container.locator('[data-asin]').first
-                            if asin_elem.count() > 0:
-                                asin = asin_elem.get_attribute('data-asin')
-                                if asin and asin not in scraped_asins and len(asin) == 10:
-                                    final_new_found += 1
-                                    break
-                        except:
-                            continue
-                    
-                    if final_new_found > 0:
-                        print(f"[INFO] Found {final_new_found} more products on final check - continuing...")
-                        no_new_products_count = 0
-                    else:
-                        print("[SUCCESS] Confirmed - no more products for this keyword")
-                        break
-            
-            # Scroll down to load more products
-            print(f"[INFO] Scrolling down to load more products...")
-            page.mouse.wheel(0, 800)
-            time.sleep(2)
-            scroll_count += 1
+        total_pages = get_results_page_count(page)
+        if total_pages > 1:
+            print(f"[INFO] {total_pages} result pages - loading the next pages in parallel tabs")
+            total_rows_sent, scroll_count = scrape_all_result_pages(page, keyword, sheet_writer,
+                                                                    scraped_asins, total_pages)
+        else:
+            total_rows_sent, scroll_count = scrape_results_page(page, keyword, sheet_writer, scraped_asins)
         
         print("\n" + "="*70)
         print(f"[SUCCESS] Completed scraping for keyword: '{keyword}'")
@@ -1348,13 +2034,12 @@ def search_and_scrape_products(page, keyword, worksheet, current_number):
         print(f"[INFO] Total scrolls: {scroll_count}")
         print("="*70)
         
-        return len(scraped_asins), current_number
+        return len(scraped_asins)
         
     except Exception as e:
         print(f"\n[ERROR] Failed to search and scrape '{keyword}': {e}")
-        import traceback
         traceback.print_exc()
-        return len(scraped_asins) if scraped_asins else 0, current_number
+        return len(scraped_asins)
 
 
 def login_to_amazon(page, context):
@@ -1382,14 +2067,14 @@ def login_to_amazon(page, context):
         # Check for Passkey modal and close it if present
         print("\n[INFO] Checking for Passkey modal...")
         try:
-            close_btn = page.locator('button:has-text("閉じる"), [aria-label="閉じる"], button:has-text("Close")').first
+            close_btn = page.locator(PASSKEY_CLOSE_SELECTOR).first
             if close_btn.is_visible(timeout=3000):
                 print("[INFO] Passkey modal detected. Closing...")
                 human_click(close_btn)
                 time.sleep(1)
                 print("[SUCCESS] Closed Passkey modal")
                 
-                login_btn = page.locator('a:has-text("ログイン"), button:has-text("ログイン"), a:has-text("Login"), button:has-text("Login")').first
+                login_btn = page.locator(LOGIN_LINK_SELECTOR).first
                 if login_btn.is_visible(timeout=2000):
                     print("[INFO] Clicking Login button after modal close...")
                     human_click(login_btn)
@@ -1452,32 +2137,19 @@ def login_to_amazon(page, context):
         print("\n[INFO] Waiting for password field to become accessible...")
         password_accessible = False
         max_wait_time = 120
-        check_interval = 1
-        elapsed_time = 0
+        wait_start = time.monotonic()
+        password_locator = page.locator(f"{PASSWORD_SELECTOR_CSS} >> visible=true").first
         
-        while not password_accessible and elapsed_time < max_wait_time:
-            try:
-                password_test = find_first_visible(page, PASSWORD_SELECTORS, timeout=1000)
-                
-                if password_test:
-                    try:
-                        password_test.focus(timeout=1000)
-                        password_test.press_sequentially("", timeout=1000)
-                        password_accessible = True
-                        print(f"\n[SUCCESS] Password field accessible after {elapsed_time}s!")
-                        break
-                    except Exception:
-                        pass
-                
-                time.sleep(check_interval)
-                elapsed_time += check_interval
-                
-                if elapsed_time % 5 == 0 and elapsed_time > 0:
-                    print(f"[INFO] Still waiting... ({elapsed_time}s elapsed)")
-                    
-            except Exception as e:
-                time.sleep(check_interval)
-                elapsed_time += check_interval
+        try:
+            # Playwright polls these itself; no Python round trip per check
+            expect(password_locator).to_be_visible(timeout=max_wait_time * 1000)
+            remaining_ms = max(1000, (max_wait_time - (time.monotonic() - wait_start)) * 1000)
+            expect(password_locator).to_be_enabled(timeout=remaining_ms)
+            password_locator.focus(timeout=remaining_ms)
+            password_accessible = True
+            print(f"\n[SUCCESS] Password field accessible after {time.monotonic() - wait_start:.0f}s!")
+        except Exception:
+            pass
         
         if password_accessible:
             print("[SUCCESS] Password field confirmed accessible")
@@ -1517,10 +2189,16 @@ def login_to_amazon(page, context):
         if not signin_btn:
             raise RuntimeError("Could not find sign-in button")
         
+        # Snapshot the mailbox first so the OTP poll only looks at mail sent after this click
+        otp_history_id = get_gmail_history_id()
+        
         print("[INFO] Clicking sign-in button...")
         human_click(signin_btn, delay_after=0.5)
-        wait_for_page_load(page)
-        time.sleep(3)
+        # Returns as soon as Amazon navigates off the sign-in form (OTP, CVF or home)
+        try:
+            page.wait_for_url(lambda u: "ap/signin" not in u, timeout=TIMEOUT_MS)
+        except PWTimeoutError:
+            pass
         print("[SUCCESS] Sign-in button clicked")
         
         current_url = page.url
@@ -1531,18 +2209,14 @@ def login_to_amazon(page, context):
             print("\n" + "="*60)
             print("[WARNING] AMAZON SECURITY VERIFICATION DETECTED")
             print("="*60)
-            print("Waiting for verification...")
-            for wait_attempt in range(24):
-                time.sleep(5)
-                current_url = page.url
-                if "cvf/approval" not in current_url and "cvf/verify" not in current_url:
-                    print(f"[SUCCESS] Verification completed")
-                    break
-                if wait_attempt % 6 == 0:
-                    print(f"[INFO] Still waiting... ({wait_attempt * 5}s)")
-            else:
+            print(f"Waiting up to {CVF_WAIT_TIMEOUT_MS // 60000} minutes for verification...")
+            wait_start = time.time()
+            try:
+                page.wait_for_url(lambda u: "cvf/approval" not in u and "cvf/verify" not in u,
+                                  timeout=CVF_WAIT_TIMEOUT_MS)
+                print(f"[SUCCESS] Verification completed (waited {int(time.time() - wait_start)} seconds)")
+            except PWTimeoutError:
                 print("[WARNING] Verification timeout - continuing...")
-            time.sleep(2)
             current_url = page.url
         
         # Check for OTP
@@ -1562,22 +2236,17 @@ def login_to_amazon(page, context):
         
         if otp_input:
             print("[INFO] Two-factor authentication required")
-            print("[INFO] Waiting 5 seconds for OTP email...")
-            time.sleep(5)
-            
             print("[INFO] Retrieving OTP from Gmail...")
-            otp_code = get_amazon_otp_from_gmail(max_age_minutes=10, max_retries=20, retry_delay=5)
+            # One continuous poll over the whole budget: history deltas are cheap, so a
+            # mail that arrives late is picked up within a second instead of after an idle pause
+            otp_code = get_amazon_otp_from_gmail(max_age_minutes=10, max_retries=180, retry_delay=1,
+                                                 start_history_id=otp_history_id)
             
             if not otp_code:
-                print("\n[WARNING] OTP not found, retrying...")
-                time.sleep(30)
-                otp_code = get_amazon_otp_from_gmail(max_age_minutes=10, max_retries=10, retry_delay=5)
-                
-                if not otp_code:
-                    print("\n" + "="*60)
-                    print("[ERROR] AUTOMATIC OTP RETRIEVAL FAILED")
-                    print("="*60)
-                    raise RuntimeError("Failed to retrieve OTP code")
+                print("\n" + "="*60)
+                print("[ERROR] AUTOMATIC OTP RETRIEVAL FAILED")
+                print("="*60)
+                raise RuntimeError("Failed to retrieve OTP code")
             
             print(f"\n[INFO] Entering OTP: {otp_code}")
             otp_input.clear()
@@ -1589,8 +2258,10 @@ def login_to_amazon(page, context):
             otp_submit = find_first_visible(page, OTP_SUBMIT_SELECTORS, timeout=5000)
             if otp_submit:
                 human_click(otp_submit, delay_after=1.0)
-                wait_for_page_load(page)
-                time.sleep(3)
+                try:
+                    page.wait_for_url(lambda u: "ap/mfa" not in u and "ap/cvf" not in u, timeout=TIMEOUT_MS)
+                except PWTimeoutError:
+                    print("[WARNING] Still on the verification page after submitting OTP")
                 print("[SUCCESS] OTP submitted")
             else:
                 raise RuntimeError("Could not find OTP submit button")
@@ -1608,6 +2279,7 @@ def login_to_amazon(page, context):
         
         print(f"[SUCCESS] Login successful!")
         print(f"[DEBUG] Current URL: {current_url}")
+        mark_session_valid()
         
         # Save session
         print(f"\n[INFO] Saving session to {SESSION_FILE}...")
@@ -1618,43 +2290,180 @@ def login_to_amazon(page, context):
         
     except Exception as e:
         print(f"\n[ERROR] Login failed: {e}")
-        import traceback
         traceback.print_exc()
         return False
 
 
+# time.monotonic() of the last successful login or session check in this process
+_session_valid_at = None
+
+
+def mark_session_valid(valid=True):
+    """Record (or with valid=False, forget) that the current session is logged in"""
+    global _session_valid_at
+    _session_valid_at = time.monotonic() if valid else None
+
+
 def check_session_valid(page):
     """
     Check if saved session is still valid
     
+    A positive result is reused for SESSION_VALID_TTL_SECONDS. Otherwise the
+    account page is requested through the context's API client (same cookies,
+    nothing rendered); a logged-out session is redirected to ap/signin.
+    
     Args:
         page: Playwright page object
         
     Returns:
         True if session is valid, False otherwise
     """
+    if _session_valid_at is not None and time.monotonic() - _session_valid_at < SESSION_VALID_TTL_SECONDS:
+        return True
+    
     try:
-        page.goto("https://www.amazon.co.jp/", wait_until="domcontentloaded", timeout=10000)
-        time.sleep(2)
-        
-        current_url = page.url
-        if "ap/signin" not in current_url and "ap/cvf" not in current_url:
-            try:
-                account_nav = page.locator("#nav-link-accountList")
-                if account_nav.count() > 0:
-                    return True
-            except:
-                pass
-            
-            if "amazon.co.jp" in current_url and "/ap/" not in current_url:
-                return True
-        
-        return False
+        response = page.request.get(SESSION_CHECK_URL, timeout=10000)
+        final_url = response.url
+        valid = response.ok and "amazon.co.jp" in final_url and "/ap/" not in final_url
+        mark_session_valid(valid)
+        return valid
     except Exception as e:
         print(f"[WARNING] Could not verify session: {e}")
+        mark_session_valid(False)
         return False
 
 
+class KeywordLogWriter:
+    """
+    sys.stdout wrapper that prefixes the lines printed by a keyword worker
+    
+    The workers print through the same functions, so their [Scroll N] lines
+    would otherwise interleave with no hint of the keyword. A thread that
+    called set_prefix() has its output buffered per line and written with
+    that prefix; other threads write straight through.
+    """
+    
+    def __init__(self, stream):
+        self._stream = stream
+        self._local = threading.local()
+        self._lock = threading.Lock()
+    
+    def set_prefix(self, prefix):
+        """Use prefix for this thread's lines from now on (None to stop)"""
+        self._flush_partial()
+        self._local.prefix = prefix
+        self._local.partial = ""
+    
+    def write(self, text):
+        prefix = getattr(self._local, 'prefix', None)
+        if not prefix:
+            with self._lock:
+                return self._stream.write(text)
+        lines = (self._local.partial + text).split("\n")
+        self._local.partial = lines.pop()
+        if lines:
+            with self._lock:
+                self._stream.write("".join(f"{prefix}{line}\n" if line else "\n" for line in lines))
+        return len(text)
+    
+    def _flush_partial(self):
+        partial = getattr(self._local, 'partial', "")
+        if partial:
+            self._local.partial = ""
+            with self._lock:
+                self._stream.write(f"{self._local.prefix}{partial}\n")
+    
+    def flush(self):
+        self._stream.flush()
+    
+    def __getattr__(self, name):
+        return getattr(self._stream, name)
+
+
+def set_log_prefix(prefix):
+    """Prefix this thread's printed lines with prefix, if KeywordLogWriter is installed"""
+    if isinstance(sys.stdout, KeywordLogWriter):
+        sys.stdout.set_prefix(prefix)
+
+
+def launch_chrome(p):
+    """Launch Chrome with the shared CHROME_LAUNCH_ARGS, headless when HEADLESS is set"""
+    return p.chromium.launch(
+        channel="chrome",
+        headless=HEADLESS,
+        args=CHROME_LAUNCH_ARGS + (CHROME_HEADLESS_ARGS if HEADLESS else CHROME_WINDOW_ARGS),
+    )
+
+
+def new_browser_context(browser, storage_state=None):
+    """Create a Japanese-locale browser context, optionally seeded with a saved session"""
+    viewport_options = {"viewport": HEADLESS_VIEWPORT} if HEADLESS else {"no_viewport": True}
+    context = browser.new_context(
+        **viewport_options,
+        locale="ja-JP",
+        timezone_id="Asia/Tokyo",
+        user_agent=CHROME_USER_AGENT,
+        storage_state=storage_state,
+    )
+    # Skip images/media/fonts and ad/analytics hosts on every page of this context
+    context.route("**/*", block_unneeded_resources)
+    return context
+
+
+def run_keyword_worker(worker_index, keyword_queue, storage_state, sheet_writer):
+    """
+    Search and scrape keywords from keyword_queue until it is empty (worker thread entry point)
+    
+    Playwright's sync API is bound to the thread that started it, so every
+    worker starts its own Playwright and browser once and reuses that browser
+    for all the keywords it takes; each keyword still gets a fresh context
+    seeded with the logged-in storage_state, so no login is repeated.
+    
+    Args:
+        worker_index: 0-based worker number (staggers the workers' start)
+        keyword_queue: queue.Queue of keywords shared by all workers
+        storage_state: Storage state dict of the logged-in context
+        sheet_writer: ProductSheetWriter shared by all workers
+    
+    Returns:
+        Dict of keyword -> number of unique products scraped
+    """
+    results = {}
+    time.sleep(worker_index * KEYWORD_START_STAGGER_SECONDS)
+    
+    with sync_playwright() as p:
+        browser = launch_chrome(p)
+        try:
+            while True:
+                try:
+                    keyword = keyword_queue.get_nowait()
+                except queue.Empty:
+                    break
+                
+                set_log_prefix(f"[{keyword}] ")
+                context = new_browser_context(browser, storage_state)
+                try:
+                    page = context.new_page()
+                    page.goto(BUSINESS_DISCOUNTS_URL, wait_until="domcontentloaded", timeout=TIMEOUT_MS)
+                    products_count = search_and_scrape_products(page, keyword, sheet_writer)
+                except Exception as e:
+                    print(f"\n[ERROR] Keyword '{keyword}' failed: {e}")
+                    products_count = 0
+                finally:
+                    context.close()
+                
+                results[keyword] = products_count
+                if products_count == 0:
+                    print(f"[WARNING] No products found for keyword: {keyword}")
+                else:
+                    print(f"\n[SUCCESS] Keyword '{keyword}' completed - {products_count} products scraped")
+        finally:
+            browser.close()
+            set_log_prefix(None)
+    
+    return results
+
+
 def run_category_search():
     """
     Main automation workflow for category search:
@@ -1669,43 +2478,28 @@ def run_category_search():
 
     with sync_playwright() as p:
         try:
-            print("[INIT] Launching Chrome browser (Japanese locale)...")
-            browser = p.chromium.launch(
-                channel="chrome",
-                headless=False,
-                args=[
-                    "--disable-blink-features=AutomationControlled",
-                    "--no-sandbox",
-                    "--start-maximized",
-                    "--lang=ja-JP",
-                ],
-            )
+            print(f"[INIT] Launching Chrome browser (Japanese locale, {'headless' if HEADLESS else 'visible'})...")
+            browser = launch_chrome(p)
 
+            # Playwright parses the session file itself; an unreadable one is dropped below
             session_path = Path(SESSION_FILE)
-            storage_state = None
-            if session_path.exists():
-                try:
-                    raw = session_path.read_text(encoding="utf-8", errors="ignore").strip()
-                    if not raw:
-                        raise ValueError("session file is empty")
-                    json.loads(raw)
-                    storage_state = str(session_path)
-                    print(f"[INFO] Loaded saved session: {SESSION_FILE}")
-                except Exception as e:
-                    print(f"[WARNING] Invalid session file: {e}")
-                    try:
-                        session_path.unlink()
-                        print(f"[INFO] Deleted invalid session file")
-                    except Exception:
-                        pass
+            storage_state = str(session_path) if session_path.exists() and session_path.stat().st_size > 0 else None
 
-            context = browser.new_context(
-                no_viewport=True,
-                locale="ja-JP",
-                timezone_id="Asia/Tokyo",
-                user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
-                storage_state=storage_state,
-            )
+            try:
+                context = new_browser_context(browser, storage_state)
+                if storage_state:
+                    print(f"[INFO] Loaded saved session: {SESSION_FILE}")
+            except (PWError, ValueError) as e:
+                if not storage_state:
+                    raise
+                print(f"[WARNING] Invalid session file: {e}")
+                try:
+                    session_path.unlink()
+                    print(f"[INFO] Deleted invalid session file")
+                except Exception:
+                    pass
+                storage_state = None
+                context = new_browser_context(browser, storage_state)
             page = context.new_page()
             print("[SUCCESS] Browser launched\n")
 
@@ -1722,17 +2516,15 @@ def run_category_search():
 
             if not login_success:
                 print("\n[ERROR] Login failed. Closing browser...")
-                time.sleep(5)
+                if not HEADLESS:
+                    time.sleep(5)
                 browser.close()
                 return False
 
-            # Navigate to Business Discounts page
-            print("\n" + "="*60)
-            print("STEP 2: NAVIGATING TO BUSINESS DISCOUNTS")
-            print("="*60)
-            page.goto(BUSINESS_DISCOUNTS_URL, wait_until="domcontentloaded", timeout=TIMEOUT_MS)
-            time.sleep(3)
-            print("[SUCCESS] Business Discounts page loaded")
+            # Logged-in cookies/storage for the keyword search contexts; the workers
+            # use their own browsers, so the login browser is not needed any more
+            logged_in_state = context.storage_state()
+            browser.close()
 
             # Initialize Google Sheets
             print("\n" + "="*60)
@@ -1743,14 +2535,14 @@ def run_category_search():
             
             if not worksheet:
                 print("\n[ERROR] Failed to initialize Google Sheets.")
-                print("[INFO] Closing browser...")
-                browser.close()
                 return False
             
             print(f"[SUCCESS] Google Sheets initialized")
             print(f"[INFO] Starting product number: {current_number}")
             print(f"[INFO] Spreadsheet: {SPREADSHEET_URL}")
             
+            sheet_writer = ProductSheetWriter(worksheet, current_number)
+            
             # Search and scrape each keyword
             print("\n" + "="*60)
             print("STEP 3: SEARCHING & SCRAPING CATEGORIES")
@@ -1761,26 +2553,32 @@ def run_category_search():
             print("="*60)
 
             total_products_all_keywords = 0
+            worker_count = min(KEYWORD_WORKERS, len(SEARCH_KEYWORDS))
+            print(f"[INFO] Searching with {worker_count} parallel browsers (reused across keywords)")
             
-            for keyword_index, keyword in enumerate(SEARCH_KEYWORDS, 1):
-                print(f"\n{'='*70}")
-                print(f"KEYWORD {keyword_index}/{len(SEARCH_KEYWORDS)}: {keyword}")
-                print(f"{'='*70}")
-                
-                # Search and scrape this keyword (returns count and next number)
-                products_count, current_number = search_and_scrape_products(page, keyword, worksheet, current_number)
-                
-                total_products_all_keywords += products_count
-                
-                if products_count == 0:
-                    print(f"[WARNING] No products found for keyword: {keyword}")
-                else:
-                    print(f"\n[SUCCESS] Keyword '{keyword}' completed - {products_count} products scraped")
-                
-                # Longer pause before next search for clarity
-                if keyword_index < len(SEARCH_KEYWORDS):
-                    print(f"\n[INFO] 次の検索まで5秒待機します...")
-                    time.sleep(5)  # Increased from 3 to 5 seconds
+            keyword_queue = queue.Queue()
+            for keyword in SEARCH_KEYWORDS:
+                keyword_queue.put(keyword)
+            
+            # Tag each worker's output with its keyword while they run side by side
+            stdout = sys.stdout
+            sys.stdout = KeywordLogWriter(stdout)
+            try:
+                with ThreadPoolExecutor(max_workers=worker_count) as executor:
+                    futures = [
+                        executor.submit(run_keyword_worker, worker_index, keyword_queue,
+                                        logged_in_state, sheet_writer)
+                        for worker_index in range(worker_count)
+                    ]
+                    
+                    for future in as_completed(futures):
+                        try:
+                            total_products_all_keywords += sum(future.result().values())
+                        except Exception as e:
+                            # Browser launch failed before it took a keyword; the other workers drain the queue
+                            print(f"\n[ERROR] Keyword worker failed: {e}")
+            finally:
+                sys.stdout = stdout
 
             # All searches completed
             print("\n" + "="*70)
@@ -1791,19 +2589,11 @@ def run_category_search():
             print(f"[SUCCESS] Data exported to Google Sheets in real-time")
             print(f"[INFO] View at: {SPREADSHEET_URL}")
             print("="*70)
-
-            print("\n[INFO] Browser will stay open for 10 seconds for verification...")
-            time.sleep(10)
-            
-            print("\n[INFO] Closing browser...")
-            browser.close()
-            print("[SUCCESS] Browser closed")
             
             return True
 
         except Exception as e:
             print(f"\n[ERROR] Automation failed: {e}")
-            import traceback
             traceback.print_exc()
             return False
 
@@ -1829,7 +2619,7 @@ def main():
     print("  1. Login to Amazon (or use saved session)")
     print("  2. Navigate to Business Discounts page")
     print("  3. Initialize Google Sheets connection")
-    print("  4. FOR EACH KEYWORD:")
+    print(f"  4. FOR EACH KEYWORD (up to {KEYWORD_WORKERS} in parallel):")
     print("     a. Search for keyword")
     print("     b. Scrape ALL products (with pagination)")
     print("     c. Extract quantity tiers (1, 2+, 5+, 10+, etc.)")
@@ -1860,6 +2650,5 @@ def main():
 
 
 if __name__ == "__main__":
-    import sys
     success = main()
     sys.exit(0 if success else 1)